@@ -1,5 +1,43 @@
-from .main import (
-    get_records_within_time_range,
-    get_mongo_group,
-    get_timedelta_from_group,
-)
+from importlib import import_module
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from .main import (
+        get_records_within_time_range,
+        get_metrics_within_time_range,
+        get_batch_records_within_time_range,
+        iter_records_within_time_range,
+    )
+    from .pipeline import (
+        get_mongo_group,
+        get_timedelta_from_group,
+    )
+
+# Exported names are imported on first access, so `python -m app` and `import app.types`
+# do not pay for the MongoDB driver until a query is run
+_EXPORTS = {
+    "get_records_within_time_range": ".main",
+    "get_metrics_within_time_range": ".main",
+    "get_batch_records_within_time_range": ".main",
+    "iter_records_within_time_range": ".main",
+    "get_mongo_group": ".pipeline",
+    "get_timedelta_from_group": ".pipeline",
+}
+
+__all__ = [
+    "get_records_within_time_range",
+    "get_metrics_within_time_range",
+    "get_batch_records_within_time_range",
+    "iter_records_within_time_range",
+    "get_mongo_group",
+    "get_timedelta_from_group",
+]
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
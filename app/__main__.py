@@ -0,0 +1,174 @@
+"""
+Runs aggregation queries without the bot.
+
+Queries are JSON documents as sent to the bot, given as arguments or one per line of a JSONL
+file (`-` for stdin, the default without arguments). Results are written to stdout as JSONL in
+the input order, `{"dataset": [...], "labels": [...]}` or `{"error": "..."}` per query.
+The MongoDB driver is only imported once the first query is run.
+
+Usage:
+    python -m app '{"dt_from": "2022-09-01T00:00:00", "dt_upto": "2022-12-31T23:59:00", "group_type": "month"}'
+    python -m app --input queries.jsonl --workers 8 > results.jsonl
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+from collections import deque
+from collections.abc import AsyncIterator, Iterable, Iterator
+from typing import Any, TextIO
+
+from .output import iter_json_fragments
+from .schemas import decode_query
+from .types import ExportFormat, GroupSpec, RangeSpec
+
+
+def parse_range_spec(source: str | bytes) -> RangeSpec:
+    """
+    Parses and validates an aggregation query with `app.schemas.decode_query`, as the bot does.
+
+    Args:
+    - source (str | bytes): JSON document.
+
+    Returns:
+    - RangeSpec: The query.
+
+    Raises:
+    - ValueError: If the query is not valid, including pydantic's `ValidationError`.
+    """
+    query = decode_query(source)
+    if query.format != ExportFormat.JSON:
+        raise ValueError("only the json format is written, see app.export")
+
+    return RangeSpec(query.dt_from, query.dt_upto, query.group_type, query.metrics)
+
+
+def iter_query_lines(queries: Iterable[str], fp: TextIO | None) -> Iterator[str]:
+    """Yield the argument queries, then non-empty lines of the file."""
+    yield from queries
+    if fp is not None:
+        for line in fp:
+            if line.strip():
+                yield line
+
+
+async def run_query(spec: RangeSpec, collection: Any, use_rollups: bool = False) -> str:
+    """Run the query, the result is encoded JSON."""
+    from .main import get_metrics_within_time_range, get_records_within_time_range
+
+    group_type = GroupSpec.parse(spec.group_type)
+    if spec.metrics is None:
+        result = await get_records_within_time_range(
+            collection,
+            spec.dt_from,
+            spec.dt_upto,
+            group_type,
+            use_rollups=use_rollups,
+        )
+    else:
+        result = await get_metrics_within_time_range(
+            collection, spec.dt_from, spec.dt_upto, group_type, spec.metrics
+        )
+
+    return "".join(iter_json_fragments(result))
+
+
+async def iter_results(
+    lines: Iterable[str],
+    collection_name: str = "salary",
+    workers: int = 4,
+    use_rollups: bool = False,
+) -> AsyncIterator[tuple[bool, str]]:
+    """
+    Runs queries concurrently, at most `workers` at once, and yields JSON results in the input order.
+
+    Lines are read lazily, so a long input is streamed rather than loaded.
+
+    Args:
+    - lines (Iterable[str]): JSON queries.
+    - collection_name (str): Name of the queried collection. Defaults to `salary`.
+    - workers (int): Maximum number of concurrently running queries. Defaults to 4.
+    - use_rollups (bool): Read whole periods from the rollup collections. Defaults to False.
+
+    Yields:
+    - tuple[bool, str]: Whether the next query succeeded and its JSON result or `{"error": "..."}`.
+    """
+    collection = None
+    pending: deque[asyncio.Future] = deque()
+    iterator = iter(lines)
+
+    async def run(line: str) -> tuple[bool, str]:
+        nonlocal collection
+        try:
+            spec = parse_range_spec(line)
+            if collection is None:
+                from .db import get_analytics_database
+
+                collection = get_analytics_database()[collection_name]
+            return True, await run_query(spec, collection, use_rollups)
+        except Exception as e:
+            error = {"error": str(e) or type(e).__name__}
+            return False, json.dumps(error, ensure_ascii=False)
+
+    try:
+        # Reading stdin must not block the queries in flight
+        while (line := await asyncio.to_thread(next, iterator, None)) is not None:
+            if len(pending) >= workers:
+                yield await pending.popleft()
+            pending.append(asyncio.ensure_future(run(line)))
+
+        while pending:
+            yield await pending.popleft()
+    finally:
+        for task in pending:
+            task.cancel()
+        if collection is not None:
+            from .db import close
+
+            close()
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m app", description="Run aggregation queries, JSONL to stdout"
+    )
+    parser.add_argument("queries", nargs="*", help="JSON queries")
+    parser.add_argument(
+        "--input",
+        default=None,
+        help="JSONL file of queries, - for stdin. Defaults to stdin without queries",
+    )
+    parser.add_argument("--collection", default="salary")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument(
+        "--rollups", action="store_true", help="Read whole periods from rollups"
+    )
+    return parser
+
+
+async def main(argv: list[str] | None = None) -> int:
+    args = get_parser().parse_args(argv)
+    path = args.input or (None if args.queries else "-")
+
+    fp = None if path is None else sys.stdin if path == "-" else open(path)
+    failed = False
+    try:
+        async for ok, line in iter_results(
+            iter_query_lines(args.queries, fp),
+            args.collection,
+            max(args.workers, 1),
+            args.rollups,
+        ):
+            failed |= not ok
+            sys.stdout.write(line + "\n")
+            sys.stdout.flush()
+    finally:
+        if fp is not None and fp is not sys.stdin:
+            fp.close()
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
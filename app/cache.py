@@ -0,0 +1,209 @@
+import asyncio
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from datetime import datetime, timedelta, timezone
+from typing import cast
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+from .types import GroupSpec, GroupType
+from .dateutils import iter_datetime_range, to_naive_utc, truncate_datetime
+from .pipeline import get_timedelta_from_group
+
+BucketKey = tuple[str, str, datetime]
+BucketsAggregator = Callable[
+    [AsyncIOMotorCollection, datetime, datetime, GroupType | GroupSpec],
+    Awaitable[dict[datetime, int | float]],
+]
+
+
+def get_collection_key(collection: AsyncIOMotorCollection) -> str:
+    """Get the full collection name (`db.collection`) the cached buckets are keyed by."""
+    # Motor stubs declare the `full_name` property as a method
+    return cast(str, collection.full_name)
+
+
+class BucketCache:
+    """
+    In-process LRU cache of sealed aggregation buckets.
+
+    A bucket is keyed by `(collection, group_type, bucket_start)` and is only stored once its
+    period has closed and it was aggregated over the whole period, so it never goes stale
+    unless the underlying documents are backfilled, see `invalidate`.
+    """
+
+    def __init__(self, max_size: int = 100_000) -> None:
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._buckets: OrderedDict[BucketKey, int | float] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def get(self, key: BucketKey) -> int | float | None:
+        """Get cached bucket value, counts a hit or a miss.
+
+        Args:
+        - key (BucketKey): `(collection, group_type, bucket_start)` key.
+
+        Returns:
+        - int | float | None: Cached value or None if the bucket is not cached.
+        """
+        value = self._buckets.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._buckets.move_to_end(key)
+        return value
+
+    def put(self, key: BucketKey, value: int | float) -> None:
+        """Cache bucket value, evicting the least recently used buckets if full.
+
+        Args:
+        - key (BucketKey): `(collection, group_type, bucket_start)` key.
+        - value (int | float): Bucket value.
+        """
+        if self.max_size <= 0:
+            return
+
+        self._buckets[key] = value
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_size:
+            self._buckets.popitem(last=False)
+
+    def invalidate(
+        self,
+        collection: str | None = None,
+        dt_from: datetime | None = None,
+        dt_upto: datetime | None = None,
+    ) -> int:
+        """Drop cached buckets overlapping the `[dt_from, dt_upto]` range.
+
+        Args:
+        - collection (str | None): Full collection name (`db.collection`). Defaults to all collections.
+        - dt_from (datetime | None): The start of the range, inclusive. Defaults to unbounded.
+        - dt_upto (datetime | None): The end of the range, inclusive. Defaults to unbounded.
+
+        Returns:
+        - int: Number of dropped buckets.
+        """
+        stale = [
+            key
+            for key in self._buckets
+            if (collection is None or key[0] == collection)
+            and (dt_upto is None or key[2] <= dt_upto)
+            and (
+                dt_from is None
+                or key[2] + get_timedelta_from_group(GroupSpec.parse(key[1])) > dt_from
+            )
+        ]
+        for key in stale:
+            del self._buckets[key]
+
+        return len(stale)
+
+    def clear(self) -> None:
+        """Drop all cached buckets and reset the counters."""
+        self._buckets.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict[str, int]:
+        """Get cache counters.
+
+        Returns:
+        - dict[str, int]: Number of cached buckets, hits and misses.
+        """
+        return {"size": len(self._buckets), "hits": self.hits, "misses": self.misses}
+
+
+async def aggregate_buckets_with_cache(
+    cache: BucketCache,
+    collection: AsyncIOMotorCollection,
+    dt_from: datetime,
+    dt_upto: datetime,
+    group_type: GroupType | GroupSpec,
+    aggregate: BucketsAggregator,
+    seal_delay: timedelta = timedelta(0),
+) -> dict[datetime, int | float]:
+    """
+    Aggregates the `[dt_from, dt_upto)` range serving sealed buckets from the cache.
+
+    Only contiguous spans of missing or still open buckets are passed to `aggregate`. Buckets are
+    aligned with `truncate_datetime`, so for an unaligned `dt_from` only the first bucket is partial:
+    it is aggregated over `[dt_from, next bucket start)` and never cached, the rest are cached.
+    Timezone-aware bounds are converted to naive UTC, so bucket labels are naive UTC datetimes.
+
+    Args:
+    - cache (BucketCache): The bucket cache.
+    - collection (AsyncIOMotorCollection): The MongoDB collection to query.
+    - dt_from (datetime): The start of the range, inclusive.
+    - dt_upto (datetime): The end of the range, exclusive.
+    - group_type (GroupType | GroupSpec): The type of grouping to perform, e.g. `day` or `6-hour`.
+    - aggregate (BucketsAggregator): Aggregates a single span of the range.
+    - seal_delay (timedelta): Buckets are only sealed once closed this long ago, e.g. the maximum
+      staleness of secondary reads, so a lagging secondary never caches a partial bucket. Defaults to 0.
+
+    Returns:
+    - dict[datetime, int | float]: Summed values keyed by bucket label.
+
+    Raises:
+    - InvlidGroupError: If the provided group type is not valid.
+    """
+    dt_from = to_naive_utc(dt_from)
+    dt_upto = to_naive_utc(dt_upto)
+    delta = get_timedelta_from_group(group_type)
+    group_key = str(GroupSpec.parse(group_type))
+    collection_key = get_collection_key(collection)
+    sealed_upto = datetime.now(timezone.utc).replace(tzinfo=None) - seal_delay
+
+    buckets: dict[datetime, int | float] = {}
+    cacheable: list[datetime] = []
+    spans: list[list[datetime]] = []
+
+    if dt_from >= dt_upto:
+        return buckets
+
+    start = truncate_datetime(dt_from, group_type)
+    for label in iter_datetime_range(start, dt_upto, delta):
+        if label >= dt_upto:
+            break
+
+        bucket_upto = label + delta
+        key = (collection_key, group_key, label)
+        sealed = (
+            label >= dt_from
+            and bucket_upto <= dt_upto
+            and bucket_upto <= sealed_upto
+            and truncate_datetime(label, group_type) == label
+        )
+        if sealed:
+            value = cache.get(key)
+            if value is not None:
+                buckets[label] = value
+                continue
+            cacheable.append(label)
+
+        span_from, span_upto = max(label, dt_from), min(bucket_upto, dt_upto)
+        if spans and spans[-1][1] == span_from:
+            spans[-1][1] = span_upto
+        else:
+            spans.append([span_from, span_upto])
+
+    partials = await asyncio.gather(
+        *(
+            aggregate(collection, span_from, span_upto, group_type)
+            for span_from, span_upto in spans
+        )
+    )
+    for partial in partials:
+        for label, value in partial.items():
+            buckets[label] = buckets.get(label, 0) + value
+
+    for label in cacheable:
+        cache.put((collection_key, group_key, label), buckets.get(label, 0))
+
+    return buckets
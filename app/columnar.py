@@ -0,0 +1,255 @@
+"""
+In-memory columnar backend.
+
+The `dt` and `value` fields of a collection are loaded into NumPy arrays sorted by time,
+buckets are found with `searchsorted` and summed with `add.reduceat`. Requires `numpy`.
+
+Usage:
+    store = await ColumnarStore.load(database.salary)
+    await get_records_within_time_range(..., backend=store.aggregate)
+"""
+
+from collections.abc import Mapping, Sequence
+from datetime import datetime, timedelta
+from typing import Any
+
+import numpy as np
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+from .types import GroupSpec, GroupType
+from .dateutils import iter_datetime_range, truncate_datetime
+from .pipeline import get_timedelta_from_group
+
+EPOCH = datetime(1970, 1, 1)
+DEFAULT_LOAD_BATCH_SIZE = 10_000
+
+
+def datetime_to_ms(source: datetime) -> int:
+    """Convert naive UTC datetime to epoch milliseconds, as BSON dates are stored."""
+    return (source.replace(tzinfo=None) - EPOCH) // timedelta(milliseconds=1)
+
+
+def get_numeric_value(document: Mapping[str, Any]) -> int | float:
+    """Get `value` of the document, non-numeric values are 0 as `$sum` ignores them."""
+    value = document.get("value")
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    return 0
+
+
+def ms_to_datetime(source: int) -> datetime:
+    """Convert epoch milliseconds to naive UTC datetime."""
+    return EPOCH + timedelta(milliseconds=int(source))
+
+
+class ColumnarStore:
+    """
+    Sorted `dt` (int64 epoch milliseconds) and `value` (float64) columns of a collection.
+
+    Results are equal to the MongoDB aggregation: empty buckets are omitted and sums
+    are ints if all loaded values are ints.
+    """
+
+    def __init__(self, dt: np.ndarray, value: np.ndarray, integer: bool = False):
+        """
+        Args:
+        - dt (np.ndarray): Epoch milliseconds, sorted ascending.
+        - value (np.ndarray): Values, in the `dt` order.
+        - integer (bool): All values are ints, sums are returned as ints. Defaults to False.
+        """
+        if len(dt) != len(value):
+            raise ValueError("dt and value columns differ in length")
+
+        self.dt = dt
+        self.value = value
+        self.integer = integer
+
+    def __len__(self) -> int:
+        return len(self.dt)
+
+    def search(self, values: list[int] | np.ndarray) -> np.ndarray:
+        """Find rows of the first `dt` not earlier than each of the epoch milliseconds.
+
+        Args:
+        - values (list[int] | np.ndarray): Epoch milliseconds, ascending.
+
+        Returns:
+        - np.ndarray: Row indexes.
+        """
+        return np.searchsorted(self.dt, values)
+
+    @classmethod
+    def empty(cls) -> "ColumnarStore":
+        """Build a store without rows."""
+        return cls(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64), True)
+
+    @classmethod
+    def from_documents(
+        cls, dt: list[datetime], value: list[int | float]
+    ) -> "ColumnarStore":
+        """Build a store from unsorted `dt` and `value` lists.
+
+        Args:
+        - dt (list[datetime]): Naive UTC datetimes.
+        - value (list[int | float]): Values, in the `dt` order.
+
+        Returns:
+        - ColumnarStore: The store.
+        """
+        dt_column = np.fromiter(
+            (datetime_to_ms(item) for item in dt), dtype=np.int64, count=len(dt)
+        )
+        value_column = np.asarray(value, dtype=np.float64)
+        order = np.argsort(dt_column, kind="stable")
+
+        return cls(
+            dt_column[order],
+            value_column[order],
+            integer=all(isinstance(item, int) for item in value),
+        )
+
+    @classmethod
+    async def load(
+        cls,
+        collection: AsyncIOMotorCollection,
+        batch_size: int = DEFAULT_LOAD_BATCH_SIZE,
+        query: dict | None = None,
+    ) -> "ColumnarStore":
+        """
+        Load `dt` and `value` of every document with a date `dt`.
+
+        Documents without a numeric `value` are loaded as 0, as `$sum` ignores such values.
+
+        Args:
+        - collection (AsyncIOMotorCollection): The MongoDB collection to load.
+        - batch_size (int): Number of documents per cursor batch. Defaults to `DEFAULT_LOAD_BATCH_SIZE`.
+        - query (dict | None): Additional filter of the loaded documents. Defaults to None.
+
+        Returns:
+        - ColumnarStore: The store.
+        """
+        dt: list[datetime] = []
+        value: list[int | float] = []
+        cursor = collection.find(
+            {"dt": {"$type": "date"}, **(query or {})},
+            {"_id": 0, "dt": 1, "value": 1},
+            sort=[("dt", 1)],
+            batch_size=batch_size,
+        )
+        async for document in cursor:
+            dt.append(document["dt"])
+            value.append(get_numeric_value(document))
+
+        return cls.from_documents(dt, value)
+
+    def apply(
+        self,
+        inserted: Sequence[tuple[datetime, int | float]] = (),
+        deleted: Sequence[tuple[datetime, int | float]] = (),
+    ) -> int:
+        """
+        Apply inserted and deleted documents, an update is a deletion of the old row and an insertion of the new one.
+
+        Rows are only identified by `(dt, value)`, any of the equal rows is deleted as sums do not depend on it.
+
+        Args:
+        - inserted (Sequence[tuple[datetime, int | float]]): `(dt, value)` of the inserted documents.
+        - deleted (Sequence[tuple[datetime, int | float]]): `(dt, value)` of the deleted documents.
+
+        Returns:
+        - int: Number of deleted documents missing in the store.
+        """
+        dt, value = self.dt, self.value
+        missing = 0
+
+        if deleted:
+            rows: set[int] = set()
+            for item_dt, item_value in deleted:
+                ms = datetime_to_ms(item_dt)
+                start, end = np.searchsorted(dt, [ms, ms + 1])
+                matches = start + np.flatnonzero(value[start:end] == item_value)
+                row = next((int(row) for row in matches if row not in rows), None)
+                if row is None:
+                    missing += 1
+                else:
+                    rows.add(row)
+            dt = np.delete(dt, sorted(rows))
+            value = np.delete(value, sorted(rows))
+
+        if inserted:
+            rows_dt, rows_value = zip(*inserted)
+            new = ColumnarStore.from_documents(list(rows_dt), list(rows_value))
+            positions = np.searchsorted(dt, new.dt, side="right")
+            dt = np.insert(dt, positions, new.dt)
+            value = np.insert(value, positions, new.value)
+            self.integer = self.integer and new.integer
+
+        self.dt, self.value = dt, value
+        return missing
+
+    def replace(self, other: "ColumnarStore") -> None:
+        """Replace the columns in place, so the bound `aggregate` keeps working.
+
+        Args:
+        - other (ColumnarStore): Store to take the columns from.
+        """
+        self.dt, self.value, self.integer = other.dt, other.value, other.integer
+
+    def close(self) -> None:
+        """Drop the columns, the store must not be used afterwards."""
+        self.dt = np.empty(0, dtype=np.int64)
+        self.value = np.empty(0, dtype=np.float64)
+
+    def aggregate_buckets(
+        self,
+        dt_from: datetime,
+        dt_upto: datetime,
+        group_type: GroupType | GroupSpec,
+    ) -> dict[datetime, int | float]:
+        """
+        Aggregates values within the `[dt_from, dt_upto)` range into sparse buckets.
+
+        Args:
+        - dt_from (datetime): The start of the range, inclusive.
+        - dt_upto (datetime): The end of the range, exclusive.
+        - group_type (GroupType | GroupSpec): The type of grouping to perform, e.g. `day` or `6-hour`.
+
+        Returns:
+        - dict[datetime, int | float]: Summed values keyed by bucket label, empty buckets are omitted.
+
+        Raises:
+        - InvlidGroupError: If the provided group type is not valid.
+        """
+        delta = get_timedelta_from_group(group_type)
+        labels = [
+            label
+            for label in iter_datetime_range(
+                truncate_datetime(dt_from, group_type), dt_upto, delta
+            )
+            if label < dt_upto
+        ]
+        start, end = self.search([datetime_to_ms(dt_from), datetime_to_ms(dt_upto)])
+        if not labels or start == end:
+            return {}
+
+        dt = self.dt[start:end]
+        edges = np.searchsorted(
+            dt, np.fromiter((datetime_to_ms(label) for label in labels), np.int64)
+        )
+        sizes = np.diff(edges, append=len(dt))
+        filled = np.flatnonzero(sizes)
+        # `reduceat` sums up to the next index, so empty buckets have to be skipped
+        sums = np.add.reduceat(self.value[start:end], edges[filled])
+
+        cast = int if self.integer else float
+        return {labels[index]: cast(total) for index, total in zip(filled, sums)}
+
+    async def aggregate(
+        self,
+        collection: AsyncIOMotorCollection,
+        dt_from: datetime,
+        dt_upto: datetime,
+        group_type: GroupType | GroupSpec,
+    ) -> dict[datetime, int | float]:
+        """`BucketsAggregator` reading the store instead of the collection, see `aggregate_buckets`."""
+        return self.aggregate_buckets(dt_from, dt_upto, group_type)
@@ -0,0 +1,268 @@
+"""
+Compact containers of aggregation results.
+
+`ValueArray` keeps bucket values in a typed array instead of a list of boxed numbers and
+`LabelGrid` keeps bucket labels as `(start, step, count)`, generating datetimes or ISO
+strings on demand. Both compare equal to the lists they replace.
+"""
+
+from array import array
+from collections.abc import Iterable, Iterator, Sequence
+from datetime import date, datetime, timedelta
+from itertools import islice
+from typing import overload
+
+from dateutil.relativedelta import relativedelta
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+class ValueArray(Sequence):
+    """
+    Read-only sequence of bucket values.
+
+    Values are stored as int64 if all of them are ints and as float64 if all of them are floats,
+    mixed values and None are kept in a list, so every value is returned exactly as given.
+    """
+
+    __slots__ = ("_items",)
+
+    def __init__(self, values: Iterable[int | float | None] = ()):
+        items = values if isinstance(values, list) else list(values)
+        self._items: array | list = items
+        if not items:
+            return
+
+        kinds = set(map(type, items))
+        try:
+            if kinds == {int}:
+                self._items = array("q", items)
+            elif kinds == {float}:
+                self._items = array("d", items)
+        except OverflowError:
+            pass
+
+    @property
+    def typecode(self) -> str | None:
+        """Get the array type code, `q` or `d`, None if the values are kept in a list."""
+        return self._items.typecode if isinstance(self._items, array) else None
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    @overload
+    def __getitem__(self, index: int) -> int | float | None: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> "ValueArray": ...
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return ValueArray(list(self._items[index]))
+        return self._items[index]
+
+    def __iter__(self) -> Iterator[int | float | None]:
+        return iter(self._items)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, ValueArray):
+            other = other._items
+        elif not isinstance(other, (list, tuple)):
+            return NotImplemented
+        return len(self._items) == len(other) and all(
+            left == right for left, right in zip(self._items, other)
+        )
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        return f"ValueArray({list(self._items)!r})"
+
+    def tolist(self) -> list[int | float | None]:
+        return list(self._items)
+
+    def as_array(self) -> array | None:
+        """Get the underlying typed array without copying, None if the values are kept in a list."""
+        return self._items if isinstance(self._items, array) else None
+
+
+def get_fixed_step(step: relativedelta | timedelta) -> timedelta | None:
+    """Get the step as a timedelta, None if its length depends on the date, e.g. months."""
+    if isinstance(step, timedelta):
+        return step
+    if step.years or step.months or step.leapdays or step.weekday is not None:
+        return None
+    if any(
+        getattr(step, name) is not None
+        for name in ("year", "month", "day", "hour", "minute", "second", "microsecond")
+    ):
+        return None
+
+    return timedelta(
+        days=step.days,
+        hours=step.hours,
+        minutes=step.minutes,
+        seconds=step.seconds,
+        microseconds=step.microseconds,
+    )
+
+
+class LabelGrid(Sequence):
+    """
+    Read-only sequence of `size` bucket labels, `start`, `start + step`, `start + step + step`, ...
+
+    Steps are added one by one, as `iter_datetime_range` does, so month steps never drift
+    differently from the lists they replace.
+    """
+
+    # `size` as `count` would shadow `Sequence.count`
+    __slots__ = ("start", "step", "size", "_fixed")
+
+    def __init__(self, start: datetime, step: relativedelta | timedelta, count: int):
+        """
+        Args:
+        - start (datetime): The first label.
+        - step (relativedelta | timedelta): The time delta increment, positive.
+        - count (int): Number of labels.
+        """
+        self.start = start
+        self.step = step
+        self.size = max(count, 0)
+        self._fixed = get_fixed_step(step)
+
+    @classmethod
+    def from_range(
+        cls,
+        start_datetime: datetime,
+        end_datetime: datetime,
+        delta: relativedelta | timedelta,
+    ) -> "LabelGrid":
+        """Build the grid of `iter_datetime_range(start_datetime, end_datetime, delta)` labels.
+
+        Args:
+        - start_datetime (datetime): The start datetime object.
+        - end_datetime (datetime): The end datetime object, inclusive.
+        - delta (relativedelta | timedelta): The time delta increment.
+
+        Returns:
+        - LabelGrid: The grid.
+        """
+        fixed = get_fixed_step(delta)
+        if end_datetime < start_datetime:
+            return cls(start_datetime, delta, 0)
+        if fixed is not None:
+            return cls(
+                start_datetime, delta, (end_datetime - start_datetime) // fixed + 1
+            )
+
+        count = 0
+        current = start_datetime
+        while current <= end_datetime:
+            count += 1
+            current += delta
+        return cls(start_datetime, delta, count)
+
+    def __len__(self) -> int:
+        return self.size
+
+    @overload
+    def __getitem__(self, index: int) -> datetime: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[datetime]: ...
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[position] for position in range(*index.indices(self.size))]
+
+        if index < 0:
+            index += self.size
+        if not 0 <= index < self.size:
+            raise IndexError("label index out of range")
+        if self._fixed is not None:
+            return self.start + self._fixed * index
+        return next(islice(iter(self), index, None))
+
+    def __iter__(self) -> Iterator[datetime]:
+        step = self.step if self._fixed is None else self._fixed
+        current = self.start
+        for _ in range(self.size):
+            yield current
+            current += step
+
+    def __eq__(self, other: object) -> bool:
+        if (
+            isinstance(other, LabelGrid)
+            and self._fixed is not None
+            and other._fixed is not None
+        ):
+            if self.size != other.size:
+                return False
+            return self.size == 0 or (
+                self.start == other.start
+                and (self.size == 1 or self._fixed == other._fixed)
+            )
+        if not isinstance(other, (LabelGrid, list, tuple)):
+            return NotImplemented
+        return self.size == len(other) and all(
+            left == right for left, right in zip(self, other)
+        )
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        return f"LabelGrid(start={self.start!r}, step={self.step!r}, count={self.size})"
+
+    def iter_isoformat(self) -> Iterator[str]:
+        """
+        Yields labels formatted as `datetime_to_iso(label, drop_timezone=True)` does.
+
+        For whole-second fixed steps the date is formatted once per day and every time of day once,
+        the rest of the labels are built from cached strings.
+
+        Yields:
+        - str: The next label, e.g. `2022-02-01T00:00:00`.
+        """
+        fixed = self._fixed
+        if (
+            fixed is None
+            or fixed.microseconds
+            or self.start.microsecond
+            or fixed <= timedelta(0)
+        ):
+            for label in self:
+                yield label.replace(tzinfo=None).isoformat()
+            return
+
+        start = self.start
+        step = int(fixed.total_seconds())
+        seconds = (
+            start.toordinal() * SECONDS_PER_DAY
+            + start.hour * 3600
+            + start.minute * 60
+            + start.second
+        )
+        times: dict[int, str] = {}
+        day = None
+        prefix = ""
+        for _ in range(self.size):
+            current_day, time_of_day = divmod(seconds, SECONDS_PER_DAY)
+            if current_day != day:
+                day = current_day
+                prefix = date.fromordinal(day).isoformat() + "T"
+            time = times.get(time_of_day)
+            if time is None:
+                hours, rest = divmod(time_of_day, 3600)
+                time = times[time_of_day] = f"{hours:02}:{rest // 60:02}:{rest % 60:02}"
+            yield prefix + time
+            seconds += step
+
+
+def iter_label_isoformat(labels: Sequence[datetime]) -> Iterator[str]:
+    """Yield labels formatted as `datetime_to_iso(label, drop_timezone=True)` does, see `LabelGrid.iter_isoformat`."""
+    if isinstance(labels, LabelGrid):
+        return labels.iter_isoformat()
+
+    from .dateutils import datetime_to_iso
+
+    return (datetime_to_iso(label, drop_timezone=True) for label in labels)
@@ -1,7 +1,16 @@
-from datetime import datetime, timezone
+from collections.abc import Iterator
+from datetime import datetime, timedelta, timezone
 
 from dateutil.relativedelta import relativedelta
 
+from .types import GroupSpec, GroupType
+from .exceptions import InvlidGroupError
+
+# Bins of several units are counted from these datetimes, as MongoDB `$dateTrunc` does
+BIN_REFERENCE = datetime(2000, 1, 1)
+BIN_REFERENCE_MONDAY = datetime(2000, 1, 3)
+MONTHS_PER_UNIT = {GroupType.YEAR: 12, GroupType.QUARTER: 3, GroupType.MONTH: 1}
+
 
 def parse_datetime(source: datetime | str) -> datetime:
     """
@@ -19,6 +28,24 @@ def parse_datetime(source: datetime | str) -> datetime:
     return source if isinstance(source, datetime) else datetime.fromisoformat(source)
 
 
+def to_naive_utc(source: datetime) -> datetime:
+    """
+    Converts a timezone-aware datetime object into a naive UTC one, naive ones are returned as is.
+
+    MongoDB returns naive UTC datetimes, so bucket labels and cache keys are naive as well.
+
+    Args:
+    - source (datetime): The datetime object to convert.
+
+    Returns:
+    - datetime: The naive UTC datetime object.
+    """
+    if source.tzinfo is None:
+        return source
+
+    return source.astimezone(timezone.utc).replace(tzinfo=None)
+
+
 def datetime_to_iso(source: datetime, drop_timezone: bool = False) -> str:
     """
     Converts a datetime object to an ISO 8601 formatted string.
@@ -43,6 +70,96 @@ def datetime_to_iso(source: datetime, drop_timezone: bool = False) -> str:
     return result
 
 
+def get_exclusive_end(source: datetime) -> datetime:
+    """
+    Converts an inclusive range end into an exclusive one.
+
+    MongoDB stores datetimes with millisecond precision, so `dt <= source` is the same as
+    `dt < get_exclusive_end(source)`.
+
+    Args:
+    - source (datetime): The inclusive end of the range.
+
+    Returns:
+    - datetime: The exclusive end of the range.
+    """
+    return source.replace(microsecond=source.microsecond // 1000 * 1000) + timedelta(
+        milliseconds=1
+    )
+
+
+def truncate_datetime(source: datetime, group_type: GroupType | GroupSpec) -> datetime:
+    """
+    Truncates a datetime object to the start of its bucket, the same way as MongoDB `$dateTrunc` in UTC.
+
+    Bins of several units are counted from `BIN_REFERENCE`, weeks start on Monday.
+
+    Args:
+    - source (datetime): The datetime object to truncate.
+    - group_type (GroupType | GroupSpec): The bucket size, e.g. `day` or `6-hour`.
+
+    Returns:
+    - datetime: The start of the bucket `source` belongs to.
+
+    Raises:
+    - InvlidGroupError: If the provided group type is not valid.
+    """
+    spec = GroupSpec.parse(group_type)
+    match spec.unit:
+        case GroupType.YEAR | GroupType.QUARTER | GroupType.MONTH:
+            months_step = MONTHS_PER_UNIT[spec.unit] * spec.bin_size
+            months = (source.year - BIN_REFERENCE.year) * 12 + source.month - 1
+            months -= months % months_step
+            return datetime(
+                BIN_REFERENCE.year + months // 12,
+                months % 12 + 1,
+                1,
+                tzinfo=source.tzinfo,
+            )
+        case GroupType.WEEK:
+            reference = BIN_REFERENCE_MONDAY
+            step = timedelta(weeks=spec.bin_size)
+        case GroupType.DAY:
+            reference = BIN_REFERENCE
+            step = timedelta(days=spec.bin_size)
+        case GroupType.HOUR:
+            reference = BIN_REFERENCE
+            step = timedelta(hours=spec.bin_size)
+        case GroupType.MINUTE:
+            reference = BIN_REFERENCE
+            step = timedelta(minutes=spec.bin_size)
+        case _:
+            raise InvlidGroupError(group_type)
+
+    return source - (source.replace(tzinfo=None) - reference) % step
+
+
+def iter_datetime_range(
+    start_datetime: datetime,
+    end_datetime: datetime,
+    delta: relativedelta,
+    tzinfo: timezone | None = None,
+) -> Iterator[datetime]:
+    """
+    Lazily yields datetime objects within a specified range, with a given time delta increment.
+
+    Args:
+    - start_datetime (datetime): The start datetime object.
+    - end_datetime (datetime): The end datetime object.
+    - delta (relativedelta): The time delta increment.
+    - tzinfo (timezone | None): The timezone object, if desired. Defaults to None.
+
+    Yields:
+    - datetime: The next datetime object within the specified range.
+    """
+    current_date = start_datetime
+    while current_date <= end_datetime:
+        if tzinfo:
+            current_date = current_date.replace(tzinfo=tzinfo)
+        yield current_date
+        current_date += delta
+
+
 def get_datetime_range(
     start_datetime: datetime,
     end_datetime: datetime,
@@ -64,13 +181,4 @@ def get_datetime_range(
     Raises:
     - ValueError: If the input is not a datetime object.
     """
-    result: list[datetime] = []
-
-    current_date = start_datetime
-    while current_date <= end_datetime:
-        if tzinfo:
-            current_date = current_date.replace(tzinfo=tzinfo)
-        result.append(current_date)
-        current_date += delta
-
-    return result
+    return list(iter_datetime_range(start_datetime, end_datetime, delta, tzinfo))
@@ -1,6 +1,293 @@
+"""
+MongoDB access.
+
+Clients are created lazily, one per event loop, so importing the module opens no connections and
+forked webhook workers never share sockets of the parent. Analytics reads (aggregations) may be
+routed to secondaries with `ANALYTICS_READ_PREFERENCE`, writes and change streams stay on the primary.
+
+Usage:
+    database = get_database()
+    salary = get_analytics_database().salary
+    await warm_up()
+    ...
+    close()
+"""
+
+import asyncio
+import weakref
+from dataclasses import dataclass
+from datetime import timedelta
 from os import getenv
+from time import perf_counter
+from typing import Any
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import ASCENDING, IndexModel
+from pymongo.read_preferences import (
+    Nearest,
+    Primary,
+    PrimaryPreferred,
+    ReadPreference,
+    Secondary,
+    SecondaryPreferred,
+)
+
+from .metrics import CommandMetricsListener
+from .rollup import ROLLUP_LEVELS, get_rollup_collection
+
+# `dt_1_value_1` covers the aggregation pipeline, so it never has to fetch documents
+SALARY_INDEXES: list[IndexModel] = [
+    IndexModel([("dt", ASCENDING)], name="dt_1"),
+    IndexModel([("dt", ASCENDING), ("value", ASCENDING)], name="dt_1_value_1"),
+]
+ROLLUP_INDEXES: list[IndexModel] = [
+    IndexModel([("dt", ASCENDING)], name="dt_1"),
+]
+
+AnalyticsReadPreference = (
+    Primary | PrimaryPreferred | Secondary | SecondaryPreferred | Nearest
+)
+READ_PREFERENCES: dict[
+    str,
+    type[PrimaryPreferred | Secondary | SecondaryPreferred | Nearest] | None,
+] = {
+    "primary": None,
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+# The server rejects a smaller `maxStalenessSeconds`
+MIN_MAX_STALENESS = 90
+
+
+@dataclass(frozen=True)
+class DatabaseConfig:
+    """Connection settings, `None` keeps the driver default."""
+
+    uri: str = "mongodb://localhost:27017/"
+    database: str = "testdb"
+    max_pool_size: int | None = None
+    min_pool_size: int | None = None
+    max_idle_time_ms: int | None = None
+    compressors: str | None = None
+    analytics_read_preference: str = "primary"
+    analytics_max_staleness: int = -1
+
+    def __post_init__(self) -> None:
+        if (
+            self.analytics_max_staleness != -1
+            and self.analytics_max_staleness < MIN_MAX_STALENESS
+        ):
+            raise ValueError(
+                f"ANALYTICS_MAX_STALENESS must be -1 or at least {MIN_MAX_STALENESS} seconds, "
+                f"got {self.analytics_max_staleness}"
+            )
+
+    @classmethod
+    def from_env(cls) -> "DatabaseConfig":
+        """
+        Reads the settings from environment variables.
+
+        - `DATABASE_URI`, `DATABASE_NAME`;
+        - `MONGO_MAX_POOL_SIZE`, `MONGO_MIN_POOL_SIZE`, `MONGO_MAX_IDLE_TIME_MS`;
+        - `MONGO_COMPRESSORS`, e.g. `zstd,snappy,zlib`;
+        - `ANALYTICS_READ_PREFERENCE`, e.g. `secondaryPreferred`;
+        - `ANALYTICS_MAX_STALENESS` in seconds, at least 90, `-1` for no bound.
+
+        Returns:
+        - DatabaseConfig: The settings.
+
+        Raises:
+        - ValueError: If `ANALYTICS_MAX_STALENESS` is neither `-1` nor at least 90.
+        """
+
+        def get_int(name: str) -> int | None:
+            value = getenv(name, "")
+            return int(value) if value else None
+
+        max_staleness = get_int("ANALYTICS_MAX_STALENESS")
+        return cls(
+            uri=getenv("DATABASE_URI", cls.uri),
+            database=getenv("DATABASE_NAME", cls.database),
+            max_pool_size=get_int("MONGO_MAX_POOL_SIZE"),
+            min_pool_size=get_int("MONGO_MIN_POOL_SIZE"),
+            max_idle_time_ms=get_int("MONGO_MAX_IDLE_TIME_MS"),
+            compressors=getenv("MONGO_COMPRESSORS") or None,
+            analytics_read_preference=getenv(
+                "ANALYTICS_READ_PREFERENCE", cls.analytics_read_preference
+            ),
+            analytics_max_staleness=cls.analytics_max_staleness
+            if max_staleness is None
+            else max_staleness,
+        )
+
+    def get_client_options(self) -> dict[str, Any]:
+        """Get `AsyncIOMotorClient` keyword arguments of the configured settings."""
+        options = {
+            "maxPoolSize": self.max_pool_size,
+            "minPoolSize": self.min_pool_size,
+            "maxIdleTimeMS": self.max_idle_time_ms,
+            "compressors": self.compressors,
+        }
+        return {key: value for key, value in options.items() if value is not None}
+
+    def get_analytics_read_preference(self) -> AnalyticsReadPreference:
+        """
+        Get the read preference of aggregations.
+
+        Raises:
+        - ValueError: If the read preference name is unknown.
+        """
+        try:
+            mode = READ_PREFERENCES[self.analytics_read_preference]
+        except KeyError:
+            raise ValueError(
+                f"Unknown read preference: {self.analytics_read_preference}"
+            ) from None
+        if mode is None:
+            return ReadPreference.PRIMARY
+        return mode(max_staleness=self.analytics_max_staleness)
+
+    def get_analytics_lag(self) -> timedelta | None:
+        """
+        Get how far aggregations may lag behind the primary.
+
+        Returns:
+        - timedelta | None: Zero for the primary, the maximum staleness for other read
+          preferences, None if it is not bounded.
+        """
+        if self.analytics_read_preference == "primary":
+            return timedelta(0)
+        if self.analytics_max_staleness == -1:
+            return None
+        return timedelta(seconds=self.analytics_max_staleness)
+
+
+_config: DatabaseConfig | None = None
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncIOMotorClient]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def configure(config: DatabaseConfig) -> None:
+    """Replace the settings, clients created with the previous ones are closed."""
+    global _config
+
+    close()
+    _config = config
+
+
+def get_config() -> DatabaseConfig:
+    """Get the settings, read from the environment on the first call."""
+    global _config
+
+    if _config is None:
+        _config = DatabaseConfig.from_env()
+    return _config
+
+
+def get_client() -> AsyncIOMotorClient:
+    """Get the client of the running event loop, created on the first call.
+
+    Outside of a running loop the client of the current thread's default loop is returned.
+    """
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = asyncio.get_event_loop_policy().get_event_loop()
+
+    client = _clients.get(loop)
+    if client is None:
+        config = get_config()
+        client = AsyncIOMotorClient(
+            config.uri,
+            io_loop=loop,
+            event_listeners=[CommandMetricsListener()],
+            **config.get_client_options(),
+        )
+        _clients[loop] = client
+
+    return client
+
+
+def get_database() -> AsyncIOMotorDatabase:
+    """Get the configured database, reads and writes go to the primary."""
+    return get_client()[get_config().database]
+
+
+def get_analytics_database() -> AsyncIOMotorDatabase:
+    """Get the configured database with the analytics read preference, for aggregations only."""
+    config = get_config()
+    return get_client().get_database(
+        config.database, read_preference=config.get_analytics_read_preference()
+    )
+
+
+async def health_check(timeout: float = 5.0) -> dict[str, Any]:
+    """
+    Pings the server.
+
+    Args:
+    - timeout (float): Seconds to wait for the reply. Defaults to 5.
+
+    Returns:
+    - dict[str, Any]: `ok`, `latency_ms` and `error` if the ping failed.
+    """
+    started = perf_counter()
+    try:
+        await asyncio.wait_for(get_client().admin.command("ping"), timeout)
+    except Exception as e:
+        return {"ok": False, "latency_ms": None, "error": str(e) or type(e).__name__}
+
+    return {"ok": True, "latency_ms": round((perf_counter() - started) * 1000, 3)}
+
+
+async def warm_up(connections: int | None = None) -> None:
+    """
+    Opens pooled connections before the first query, with concurrent pings.
+
+    Args:
+    - connections (int | None): Number of connections. Defaults to `min_pool_size` or 1.
+    """
+    client = get_client()
+    count = connections or get_config().min_pool_size or 1
+    await asyncio.gather(*(client.admin.command("ping") for _ in range(count)))
+
+
+def close() -> None:
+    """Close every created client, the next `get_client` call creates a new one."""
+    for client in list(_clients.values()):
+        client.close()
+    _clients.clear()
+
+
+def __getattr__(name: str) -> Any:
+    # `client` and `database` used to be created on import
+    if name == "client":
+        return get_client()
+    if name == "database":
+        return get_database()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+async def ensure_indexes(
+    database: AsyncIOMotorDatabase, collection_name: str = "salary"
+) -> list[str]:
+    """
+    Creates indexes used by the aggregation pipelines, does nothing for existing ones.
+
+    Args:
+    - database (AsyncIOMotorDatabase): The MongoDB database.
+    - collection_name (str): Name of the source collection. Defaults to `salary`.
 
-from motor.motor_asyncio import AsyncIOMotorClient
+    Returns:
+    - list[str]: Names of the ensured indexes.
+    """
+    collection = database[collection_name]
+    names: list[str] = await collection.create_indexes(SALARY_INDEXES)
+    for level in ROLLUP_LEVELS:
+        rollup = get_rollup_collection(collection, level)
+        names += await rollup.create_indexes(ROLLUP_INDEXES)
 
-client = AsyncIOMotorClient(getenv("DATABASE_URI", "mongodb://localhost:27017/"))
-database = client.testdb
+    return names
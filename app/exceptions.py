@@ -1,14 +1,48 @@
-from .types import GroupType
+from .types import GroupType, MetricType
 
 
-class InvlidGroupError(Exception):
+class InvlidGroupError(ValueError):
     """Raised when invalid group type is passed."""
 
     def __init__(self, group_type: str | None = None):
         super().__init__(
-            "Invalid group type{}. Allowed values are: {}".format(
+            "Invalid group type{}. Allowed values are: {}, optionally prefixed with a bin size, e.g. '15-minute'".format(
                 "" if group_type is None else f": '{group_type}'",
                 GroupType.values(),
             )
         )
         self.group_type = group_type
+
+
+class InvalidMetricError(ValueError):
+    """Raised when invalid metric is passed."""
+
+    def __init__(self, metric: str | None = None):
+        super().__init__(
+            "Invalid metric{}. Allowed values are: {} or a percentile, e.g. 'p95'".format(
+                "" if metric is None else f": '{metric}'",
+                [item for item in MetricType.values() if item != MetricType.PERCENTILE],
+            )
+        )
+        self.metric = metric
+
+
+class QueryPlanError(Exception):
+    """Raised when aggregation pipeline is not served by a covering index scan."""
+
+    def __init__(self, group_type: str, stages: list[str]):
+        super().__init__(
+            "Aggregation by '{}' is not covered by an index, plan stages: {}".format(
+                group_type, stages
+            )
+        )
+        self.group_type = group_type
+        self.stages = stages
+
+
+class SchedulerBusyError(Exception):
+    """Raised when scheduler queue is full."""
+
+    def __init__(self, queued: int):
+        super().__init__(f"Scheduler queue is full: {queued} requests are waiting")
+        self.queued = queued
@@ -0,0 +1,104 @@
+"""
+Verifies that aggregation pipelines are answered by a covering index scan.
+
+Usage:
+    python -m app.explain
+"""
+
+import asyncio
+from datetime import datetime
+from typing import Any
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+from .types import GroupType
+from .exceptions import QueryPlanError
+from .pipeline import get_aggregation_pipeline, get_mongo_match
+
+
+def get_plan_stages(plan: Any) -> list[str]:
+    """Collect names of all stages of an explain plan, depth first.
+
+    Args:
+    - plan (Any): Explain output or any part of it.
+
+    Returns:
+    - list[str]: Stage names, e.g. `["PROJECTION_COVERED", "IXSCAN"]`.
+    """
+    stages: list[str] = []
+    if isinstance(plan, dict):
+        if isinstance(plan.get("stage"), str):
+            stages.append(plan["stage"])
+        for key, value in plan.items():
+            if key not in ("rejectedPlans", "stage"):
+                stages += get_plan_stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            stages += get_plan_stages(item)
+
+    return stages
+
+
+async def explain_pipeline(
+    collection: AsyncIOMotorCollection, pipeline: list[dict]
+) -> dict:
+    """Get `queryPlanner` explain output of an aggregation pipeline.
+
+    Args:
+    - collection (AsyncIOMotorCollection): The MongoDB collection to query.
+    - pipeline (list[dict]): Mongo aggregation pipeline.
+
+    Returns:
+    - dict: Explain output.
+    """
+    return await collection.database.command(
+        "explain",
+        {"aggregate": collection.name, "pipeline": pipeline, "cursor": {}},
+        verbosity="queryPlanner",
+    )
+
+
+async def verify_query_plans(
+    collection: AsyncIOMotorCollection,
+    dt_from: datetime = datetime(2022, 1, 1),
+    dt_upto: datetime = datetime(2023, 1, 1),
+) -> dict[str, list[str]]:
+    """
+    Explains the aggregation pipeline of every group type and checks the winning plans.
+
+    Args:
+    - collection (AsyncIOMotorCollection): The MongoDB collection to query.
+    - dt_from (datetime): The start of the explained range, inclusive.
+    - dt_upto (datetime): The end of the explained range, exclusive.
+
+    Returns:
+    - dict[str, list[str]]: Winning plan stages keyed by group type.
+
+    Raises:
+    - QueryPlanError: If a winning plan scans the collection or fetches documents.
+    """
+    plans: dict[str, list[str]] = {}
+    for group_type in GroupType:
+        pipeline = get_aggregation_pipeline(
+            get_mongo_match(dt_from, dt_upto), group_type
+        )
+        stages = get_plan_stages(await explain_pipeline(collection, pipeline))
+        if "COLLSCAN" in stages or "FETCH" in stages or "IXSCAN" not in stages:
+            raise QueryPlanError(group_type, stages)
+        plans[group_type] = stages
+
+    return plans
+
+
+async def main() -> None:
+    from .db import ensure_indexes, get_database
+
+    database = get_database()
+
+    await ensure_indexes(database)
+    for group_type, stages in (await verify_query_plans(database.salary)).items():
+        print(f"{group_type}: {' -> '.join(stages)}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,237 @@
+"""
+Columnar exports of aggregation results, for consumers loading them into dataframes.
+
+- `csv`: `label,<column>...` rows, streamed;
+- `npz`: NumPy arrays, one per column, requires `numpy`;
+- `arrow`: Arrow IPC stream, one column per series, requires `pyarrow`.
+
+Columns are `dataset` or one per metric if the result holds several ones. Labels of `npz`
+and `arrow` exports are not stored but encoded as start, step and count, see `get_label_encoding`:
+label `i` is `start + i * step_ms` milliseconds, or `start + i * step_months` months.
+Results without a `LabelGrid` store the labels explicitly, as `labels` and `label` respectively.
+"""
+
+from collections.abc import Iterator, Sequence
+from datetime import datetime, timedelta
+from functools import cache
+from importlib.util import find_spec
+from typing import Any, BinaryIO, cast
+
+from dateutil.relativedelta import relativedelta
+
+from .compact import LabelGrid, ValueArray, get_fixed_step, iter_label_isoformat
+from .output import iter_json_fragments
+from .types import AggregationResult, ExportFormat
+
+EXPORT_FILENAMES = {
+    ExportFormat.JSON: "result.json",
+    ExportFormat.CSV: "result.csv",
+    ExportFormat.NPZ: "result.npz",
+    ExportFormat.ARROW: "result.arrow",
+}
+# Optional modules the binary formats are written with
+EXPORT_MODULES = {
+    ExportFormat.NPZ: "numpy",
+    ExportFormat.ARROW: "pyarrow",
+}
+ARROW_BATCH_SIZE = 64 * 1024
+
+
+@cache
+def get_missing_module(export_format: ExportFormat | str) -> str | None:
+    """
+    Get the module the format requires but which is not installed.
+
+    Args:
+    - export_format (ExportFormat | str): One of `ExportFormat`.
+
+    Returns:
+    - str | None: Name of the missing module, e.g. `pyarrow`, None if the format can be written.
+    """
+    module = EXPORT_MODULES.get(ExportFormat(export_format))
+    if module is None or find_spec(module) is not None:
+        return None
+    return module
+
+
+def get_columns(result: AggregationResult) -> dict[str, Sequence[int | float | None]]:
+    """Get exported columns, `dataset` duplicates the first series, so it is omitted if there are series."""
+    return dict(result.series) if result.series else {"dataset": result.dataset}
+
+
+def get_label_encoding(labels: Sequence[datetime]) -> dict[str, Any] | None:
+    """
+    Encodes labels as start, step and count.
+
+    Args:
+    - labels (Sequence[datetime]): Labels of the result.
+
+    Returns:
+    - dict[str, Any] | None: `start` (naive UTC datetime), `step_ms`, `step_months` and `count`,
+      one of the steps is 0. None if the labels are not a `LabelGrid`.
+    """
+    if not isinstance(labels, LabelGrid):
+        return None
+
+    fixed = get_fixed_step(labels.step)
+    if fixed is None:
+        # Only `relativedelta` steps are not fixed
+        step = cast(relativedelta, labels.step)
+        step_ms, step_months = 0, step.years * 12 + step.months
+    else:
+        step_ms, step_months = fixed // timedelta(milliseconds=1), 0
+
+    return {
+        "start": labels.start.replace(tzinfo=None),
+        "step_ms": step_ms,
+        "step_months": step_months,
+        "count": len(labels),
+    }
+
+
+def iter_csv_fragments(result: AggregationResult) -> Iterator[str]:
+    """
+    Incrementally encodes aggregation result as CSV, a header and a row per label.
+
+    Labels are formatted as in JSON, None values are empty fields.
+
+    Args:
+    - result (AggregationResult): The aggregation result.
+
+    Yields:
+    - str: The next line, with the line break.
+    """
+    columns = get_columns(result)
+    yield ",".join(["label", *columns]) + "\n"
+
+    for label, *values in zip(iter_label_isoformat(result.labels), *columns.values()):
+        yield (
+            ",".join(
+                [label, *("" if value is None else str(value) for value in values)]
+            )
+            + "\n"
+        )
+
+
+def write_npz(fp: BinaryIO, result: AggregationResult) -> None:
+    """
+    Writes aggregation result as compressed NumPy arrays.
+
+    Typed `ValueArray`s are converted without copying, other columns are float64 with NaN for None.
+
+    Args:
+    - fp (BinaryIO): Binary file object to write into.
+    - result (AggregationResult): The aggregation result.
+    """
+    import numpy as np
+
+    # `Any` as NumPy 2.1+ stubs would match the arrays against `allow_pickle`
+    arrays: dict[str, Any] = {}
+    for name, values in get_columns(result).items():
+        buffer = values.as_array() if isinstance(values, ValueArray) else None
+        if buffer is not None:
+            dtype = np.int64 if buffer.typecode == "q" else np.float64
+            arrays[name] = np.frombuffer(buffer, dtype=dtype)
+        else:
+            arrays[name] = np.array(values, dtype=np.float64)
+
+    encoding = get_label_encoding(result.labels)
+    if encoding is None:
+        arrays["labels"] = np.array(result.labels, dtype="datetime64[ms]")
+    else:
+        arrays["labels_start"] = np.array(encoding["start"], dtype="datetime64[ms]")
+        for key in ("step_ms", "step_months", "count"):
+            arrays[f"labels_{key}"] = np.array(encoding[key], dtype=np.int64)
+
+    np.savez_compressed(fp, **arrays)
+
+
+def write_arrow(fp: BinaryIO, result: AggregationResult) -> None:
+    """
+    Writes aggregation result as an Arrow IPC stream, in record batches of `ARROW_BATCH_SIZE` rows.
+
+    The label encoding is stored in the schema metadata as `labels_start` (ISO) and
+    `labels_step_ms`, `labels_step_months`, `labels_count`.
+
+    Args:
+    - fp (BinaryIO): Binary file object to write into.
+    - result (AggregationResult): The aggregation result.
+    """
+    import pyarrow as pa
+
+    arrays: dict[str, pa.Array] = {}
+    for name, values in get_columns(result).items():
+        buffer = values.as_array() if isinstance(values, ValueArray) else None
+        if buffer is not None:
+            arrays[name] = pa.Array.from_buffers(
+                pa.int64() if buffer.typecode == "q" else pa.float64(),
+                len(buffer),
+                [None, pa.py_buffer(buffer)],
+            )
+        else:
+            arrays[name] = pa.array(list(values), type=pa.float64())
+
+    encoding = get_label_encoding(result.labels)
+    metadata = None
+    if encoding is None:
+        arrays = {"label": pa.array(list(result.labels), pa.timestamp("ms")), **arrays}
+    else:
+        metadata = {
+            f"labels_{key}": value.isoformat() if key == "start" else str(value)
+            for key, value in encoding.items()
+        }
+
+    table = pa.table(arrays).replace_schema_metadata(metadata)
+    with pa.ipc.new_stream(fp, table.schema) as writer:
+        for batch in table.to_batches(max_chunksize=ARROW_BATCH_SIZE):
+            writer.write_batch(batch)
+
+
+def write_result(
+    fp: BinaryIO, result: AggregationResult, export_format: ExportFormat | str
+) -> None:
+    """
+    Writes aggregation result in the format, text formats are streamed as UTF-8.
+
+    Args:
+    - fp (BinaryIO): Binary file object to write into.
+    - result (AggregationResult): The aggregation result.
+    - export_format (ExportFormat | str): One of `ExportFormat`.
+
+    Raises:
+    - ValueError: If the format is not valid.
+    - ImportError: If `numpy` or `pyarrow` required by the format is not installed, see `get_missing_module`.
+    """
+    match ExportFormat(export_format):
+        case ExportFormat.JSON:
+            for fragment in iter_json_fragments(result):
+                fp.write(fragment.encode())
+        case ExportFormat.CSV:
+            for line in iter_csv_fragments(result):
+                fp.write(line.encode())
+        case ExportFormat.NPZ:
+            write_npz(fp, result)
+        case ExportFormat.ARROW:
+            write_arrow(fp, result)
+
+
+def load_npz_labels(arrays: Any) -> list[datetime]:
+    """Decode labels of a loaded `npz` export, e.g. `load_npz_labels(numpy.load(fp))`.
+
+    Args:
+    - arrays (Any): Loaded `NpzFile`.
+
+    Returns:
+    - list[datetime]: The labels.
+    """
+    if "labels" in arrays:
+        return arrays["labels"].astype("datetime64[ms]").astype(datetime).tolist()
+
+    start = arrays["labels_start"].astype("datetime64[ms]").astype(datetime).item()
+    step_months = int(arrays["labels_step_months"])
+    step: relativedelta | timedelta = (
+        relativedelta(months=step_months)
+        if step_months
+        else timedelta(milliseconds=int(arrays["labels_step_ms"]))
+    )
+    return list(LabelGrid(start, step, int(arrays["labels_count"])))
@@ -0,0 +1,345 @@
+"""
+Bulk loader of `salary` dumps.
+
+Reads `mongodump` BSON or JSONL (MongoDB extended JSON, one document per line) files, optionally
+gzipped, as a stream. `dt` and `value` are converted batch by batch in a worker thread while
+previous batches are written with concurrent unordered `insert_many` calls.
+
+Usage:
+    python -m app.loader salary.bson --drop --parallelism 8
+    python -m app.loader salary.jsonl.gz --batch-size 20000 --rollups
+"""
+
+import argparse
+import asyncio
+import gzip
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass
+from datetime import timezone
+from itertools import islice
+from time import perf_counter
+from typing import IO, Any, cast
+
+import bson
+from bson import json_util
+from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
+from pymongo.errors import BulkWriteError
+
+from .dateutils import parse_datetime
+
+FORMATS = ("bson", "jsonl")
+DUPLICATE_KEY_ERROR = 11000
+
+
+@dataclass
+class LoadStats:
+    """Used for `load_dump` result."""
+
+    rows: int = 0
+    duplicates: int = 0
+    skipped: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+
+def get_dump_format(path: str) -> str:
+    """Guess dump format by the file name, e.g. `salary.bson` or `salary.jsonl.gz`.
+
+    Args:
+    - path (str): Path of the dump.
+
+    Returns:
+    - str: One of `FORMATS`.
+
+    Raises:
+    - ValueError: If the format is unknown.
+    """
+    name = path.removesuffix(".gz")
+    for dump_format, extensions in (
+        ("bson", (".bson",)),
+        ("jsonl", (".jsonl", ".json")),
+    ):
+        if name.endswith(extensions):
+            return dump_format
+
+    raise ValueError(f"Unknown dump format: {path}")
+
+
+def open_dump(path: str) -> IO[bytes]:
+    """Open the dump for binary reading, gzipped dumps are decompressed on the fly."""
+    if path.endswith(".gz"):
+        return cast(IO[bytes], gzip.open(path, "rb"))
+    return open(path, "rb")
+
+
+def iter_documents(fp: IO[bytes], dump_format: str) -> Iterator[dict[str, Any]]:
+    """
+    Lazily decodes documents of the dump.
+
+    Args:
+    - fp (IO[bytes]): Binary file object of the dump.
+    - dump_format (str): One of `FORMATS`.
+
+    Yields:
+    - dict[str, Any]: The next document.
+    """
+    if dump_format == "bson":
+        yield from bson.decode_file_iter(fp)
+        return
+
+    for line in fp:
+        if line.strip():
+            yield json_util.loads(line)
+
+
+def convert_document(document: dict[str, Any]) -> dict[str, Any] | None:
+    """
+    Converts `dt` into a naive UTC datetime and `value` into a number, other fields are kept.
+
+    Args:
+    - document (dict[str, Any]): Decoded document, `dt` may be a datetime or an ISO string,
+      `value` may be a number or a numeric string.
+
+    Returns:
+    - dict[str, Any] | None: The converted document or None if `dt` or `value` is not valid.
+    """
+    try:
+        dt = parse_datetime(document["dt"])
+        value = document["value"]
+        if isinstance(value, str):
+            value = float(value) if any(char in value for char in ".eE") else int(value)
+        elif isinstance(value, bool) or not isinstance(value, (int, float)):
+            return None
+    except (KeyError, TypeError, ValueError):
+        return None
+
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    document["dt"] = dt
+    document["value"] = value
+    return document
+
+
+def read_batch(
+    documents: Iterator[dict[str, Any]], batch_size: int, stats: LoadStats
+) -> tuple[list[dict[str, Any]], bool]:
+    """Decode and convert the next batch, invalid documents are counted as skipped.
+
+    Returns:
+    - tuple[list[dict[str, Any]], bool]: The batch and whether the documents are exhausted.
+    """
+    batch = []
+    read = 0
+    for document in islice(documents, batch_size):
+        read += 1
+        converted = convert_document(document)
+        if converted is None:
+            stats.skipped += 1
+        else:
+            batch.append(converted)
+
+    return batch, read < batch_size
+
+
+async def insert_batch(
+    collection: AsyncIOMotorCollection, batch: list[dict[str, Any]], stats: LoadStats
+) -> None:
+    """Write the batch unordered, documents with existing `_id`s are counted as duplicates."""
+    try:
+        result = await collection.insert_many(batch, ordered=False)
+        stats.rows += len(result.inserted_ids)
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(error["code"] != DUPLICATE_KEY_ERROR for error in errors):
+            raise
+        stats.rows += e.details.get("nInserted", 0)
+        stats.duplicates += len(errors)
+
+
+async def load_documents(
+    collection: AsyncIOMotorCollection,
+    documents: Iterable[dict[str, Any]],
+    batch_size: int = 10_000,
+    parallelism: int = 4,
+    progress: Callable[[LoadStats], None] | None = None,
+) -> LoadStats:
+    """
+    Writes documents into the collection with concurrent unordered `insert_many` calls.
+
+    Batches are read in a worker thread, so decoding overlaps with the writes in flight.
+
+    Args:
+    - collection (AsyncIOMotorCollection): Target collection.
+    - documents (Iterable[dict[str, Any]]): Decoded documents, see `iter_documents`.
+    - batch_size (int): Documents per `insert_many`. Defaults to 10000.
+    - parallelism (int): Concurrent `insert_many` calls. Defaults to 4.
+    - progress (Callable[[LoadStats], None] | None): Called after every written batch. Defaults to None.
+
+    Returns:
+    - LoadStats: Numbers of written, duplicate and skipped documents.
+    """
+    started = perf_counter()
+    stats = LoadStats()
+    semaphore = asyncio.Semaphore(parallelism)
+    tasks: set[asyncio.Task] = set()
+    iterator = iter(documents)
+
+    async def insert(batch: list[dict[str, Any]]) -> None:
+        try:
+            await insert_batch(collection, batch, stats)
+        finally:
+            semaphore.release()
+        stats.elapsed = perf_counter() - started
+        if progress is not None:
+            progress(stats)
+
+    try:
+        exhausted = False
+        while not exhausted:
+            batch, exhausted = await asyncio.to_thread(
+                read_batch, iterator, batch_size, stats
+            )
+            if not batch:
+                continue
+
+            await semaphore.acquire()
+            # Fail fast instead of reading the rest of the dump
+            for done in [task for task in tasks if task.done()]:
+                tasks.discard(done)
+                done.result()
+            tasks.add(asyncio.ensure_future(insert(batch)))
+
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    stats.elapsed = perf_counter() - started
+    return stats
+
+
+async def load_dump(
+    collection: AsyncIOMotorCollection,
+    path: str,
+    dump_format: str | None = None,
+    batch_size: int = 10_000,
+    parallelism: int = 4,
+    drop: bool = False,
+    defer_indexes: bool = True,
+    rollups: bool = False,
+    progress: Callable[[LoadStats], None] | None = None,
+) -> LoadStats:
+    """
+    Loads a BSON or JSONL dump into the collection.
+
+    Args:
+    - collection (AsyncIOMotorCollection): Target collection.
+    - path (str): Path of the dump, optionally gzipped.
+    - dump_format (str | None): One of `FORMATS`. Defaults to a guess by the file name.
+    - batch_size (int): Documents per `insert_many`. Defaults to 10000.
+    - parallelism (int): Concurrent `insert_many` calls. Defaults to 4.
+    - drop (bool): Drop the collection before loading. Defaults to False.
+    - defer_indexes (bool): Build the aggregation indexes after loading instead of before. Defaults to True.
+    - rollups (bool): Rebuild the rollup collections after loading, see `app.rollup`. Defaults to False.
+    - progress (Callable[[LoadStats], None] | None): Called after every written batch. Defaults to None.
+
+    Returns:
+    - LoadStats: Numbers of written, duplicate and skipped documents, `elapsed` includes index builds.
+    """
+    from .db import ensure_indexes
+    from .rollup import refresh_rollups
+
+    started = perf_counter()
+    dump_format = dump_format or get_dump_format(path)
+    # Motor stubs type `database` of a collection as a collection
+    database = cast(AsyncIOMotorDatabase, collection.database)
+    if drop:
+        await collection.drop()
+    if not defer_indexes:
+        await ensure_indexes(database, collection.name)
+
+    with open_dump(path) as fp:
+        stats = await load_documents(
+            collection,
+            iter_documents(fp, dump_format),
+            batch_size=batch_size,
+            parallelism=parallelism,
+            progress=progress,
+        )
+
+    if defer_indexes:
+        await ensure_indexes(database, collection.name)
+    if rollups:
+        await refresh_rollups(collection)
+
+    stats.elapsed = perf_counter() - started
+    return stats
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Load a salary dump")
+    parser.add_argument("path", help="BSON or JSONL dump, optionally gzipped")
+    parser.add_argument("--format", choices=FORMATS, default=None)
+    parser.add_argument("--uri", default=None, help="Defaults to DATABASE_URI")
+    parser.add_argument("--database", default=None, help="Defaults to DATABASE_NAME")
+    parser.add_argument("--collection", default="salary")
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--parallelism", type=int, default=4)
+    parser.add_argument("--drop", action="store_true", help="Drop the collection first")
+    parser.add_argument(
+        "--no-defer-indexes",
+        dest="defer_indexes",
+        action="store_false",
+        help="Build indexes before loading",
+    )
+    parser.add_argument(
+        "--rollups", action="store_true", help="Rebuild rollups after loading"
+    )
+    return parser
+
+
+async def main() -> None:
+    from dataclasses import replace
+
+    from .db import configure, get_config, get_database
+
+    args = get_parser().parse_args()
+    config = get_config()
+    configure(
+        replace(
+            config,
+            uri=args.uri or config.uri,
+            database=args.database or config.database,
+        )
+    )
+    collection = get_database()[args.collection]
+    last_report = perf_counter()
+
+    def progress(stats: LoadStats) -> None:
+        nonlocal last_report
+        if perf_counter() - last_report >= 5:
+            last_report = perf_counter()
+            print(f"{stats.rows} rows ({stats.rows_per_second:.0f} rows/s)")
+
+    stats = await load_dump(
+        collection,
+        args.path,
+        dump_format=args.format,
+        batch_size=args.batch_size,
+        parallelism=args.parallelism,
+        drop=args.drop,
+        defer_indexes=args.defer_indexes,
+        rollups=args.rollups,
+        progress=progress,
+    )
+    print(
+        f"Loaded {stats.rows} rows in {stats.elapsed:.1f}s ({stats.rows_per_second:.0f} rows/s), "
+        f"{stats.duplicates} duplicates, {stats.skipped} skipped"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,186 +1,335 @@
-from datetime import datetime
+from collections.abc import AsyncIterator, Iterable
+from datetime import datetime, timedelta
+from functools import partial
 
-from dateutil.relativedelta import relativedelta
 from motor.motor_asyncio import AsyncIOMotorCollection
 
-from .types import AggregationResult, GroupType
-from .exceptions import InvlidGroupError
-from .dateutils import parse_datetime, get_datetime_range
+from .types import (
+    AggregationResult,
+    GroupSpec,
+    GroupType,
+    MetricSpec,
+    MetricType,
+    RangeSpec,
+)
+from .dateutils import (
+    parse_datetime,
+    get_exclusive_end,
+    iter_datetime_range,
+    truncate_datetime,
+)
+from .pipeline import (
+    DEFAULT_BATCH_SIZE,
+    get_mongo_match,
+    get_timedelta_from_group,
+    get_aggregation_pipeline,
+    get_metrics_pipeline,
+    get_union_match,
+    get_facet_pipeline,
+    aggregate_buckets,
+    aggregate_metric_buckets,
+    aggregate_facets,
+)
+from .rollup import aggregate_buckets_with_rollups
+from .cache import BucketCache, BucketsAggregator, aggregate_buckets_with_cache
+from .parallel import aggregate_buckets_in_slices
+from .series import build_dense_series, build_dense_metric_series
+from .metrics import AGGREGATION_SECONDS, get_group_label
+from .exceptions import InvalidMetricError
 
 
-def get_mongo_group(group_type: GroupType) -> dict[str, dict[str, str]]:
-    """Get mongo aggregation `$group._id` object for futher grouping.
+def parse_metrics(metrics: Iterable[MetricSpec | MetricType | str]) -> list[MetricSpec]:
+    """Parse requested metrics, dropping duplicates.
 
     Args:
-    - group_type (GroupType): Group type.
+    - metrics (Iterable[MetricSpec | MetricType | str]): Metrics, e.g. `["sum", "p95"]`.
 
     Returns:
-    - dict[str, dict[str, str]]: Mongo aggregation `$group._id` object.
+    - list[MetricSpec]: The parsed metrics in the requested order.
+
+    Raises:
+    - InvalidMetricError: If any of the metrics is not valid or no metrics are requested.
     """
-    match group_type:
-        case GroupType.YEAR:
-            return {
-                "year": {"$year": "$dt"},
-            }
-        case GroupType.MONTH:
-            return {
-                "year": {"$year": "$dt"},
-                "month": {"$month": "$dt"},
-            }
-        case GroupType.DAY:
-            return {
-                "year": {"$year": "$dt"},
-                "month": {"$month": "$dt"},
-                "day": {"$dayOfMonth": "$dt"},
-            }
-        case GroupType.HOUR:
-            return {
-                "year": {"$year": "$dt"},
-                "month": {"$month": "$dt"},
-                "day": {"$dayOfMonth": "$dt"},
-                "hour": {"$hour": "$dt"},
-            }
-        case _:
-            raise InvlidGroupError(group_type)
-
-
-def get_timedelta_from_group(group_type: GroupType) -> relativedelta:
+    specs = list(dict.fromkeys(MetricSpec.parse(metric) for metric in metrics))
+    if not specs:
+        raise InvalidMetricError()
+
+    return specs
+
+
+async def get_records_within_time_range(
+    collection: AsyncIOMotorCollection,
+    start_time: str | datetime,
+    end_time: str | datetime,
+    group_type: GroupType | GroupSpec,
+    use_rollups: bool = False,
+    cache: BucketCache | None = None,
+    slices: int = 1,
+    parallelism: int | None = None,
+    backend: BucketsAggregator | None = None,
+    seal_delay: timedelta = timedelta(0),
+) -> AggregationResult:
     """
-    Get time delta based on the provided group type.
+    This function retrieves records from a MongoDB collection within a specified time range and groups them based on a given group type.
+    It uses MongoDB aggregation pipeline stages to perform the grouping and aggregation operations.
 
     Args:
-    - group_type (GroupType): The type of grouping to perform.
+    - collection (AsyncIOMotorCollection): The MongoDB collection to query.
+    - start_time (str | datetime): The start time of the time range. Can be a string or a datetime object.
+    - end_time (str | datetime): The end time of the time range. Can be a string or a datetime object.
+    - group_type (GroupType | GroupSpec): The type of grouping to perform, e.g. `day` or `6-hour`.
+    - use_rollups (bool): Read whole periods from the rollup collections, see `app.rollup`. Defaults to False.
+    - cache (BucketCache | None): Serve sealed buckets from this cache, if set. Defaults to None.
+    - slices (int): Split the range into this many bucket-aligned slices aggregated concurrently. Defaults to 1.
+    - parallelism (int | None): Maximum number of concurrently running slices. Defaults to all of them.
+    - backend (BucketsAggregator | None): Aggregates buckets instead of MongoDB, e.g. `ColumnarStore.aggregate`,
+      `use_rollups` is ignored if set. Defaults to None.
+    - seal_delay (timedelta): Only buckets closed at least this long ago are cached, see
+      `aggregate_buckets_with_cache`. Defaults to 0.
 
     Returns:
-    - relativedelta: A relativedelta object representing the time interval for the given group type.
+    - AggregationResult: An object containing the grouped records and labels, labels are bucket starts.
 
     Raises:
     - InvlidGroupError: If the provided group type is not valid.
     """
-    match group_type:
-        case GroupType.YEAR:
-            return relativedelta(years=1)
-        case GroupType.MONTH:
-            return relativedelta(months=1)
-        case GroupType.DAY:
-            return relativedelta(days=1)
-        case GroupType.HOUR:
-            return relativedelta(hours=1)
-        case _:
-            raise InvlidGroupError(group_type)
+    start_datetime = parse_datetime(start_time)
+    end_datetime = parse_datetime(end_time)
+    delta = get_timedelta_from_group(group_type)
+    group_label = get_group_label(group_type)
 
+    if backend is not None:
+        aggregate = backend
+    elif use_rollups:
+        aggregate = aggregate_buckets_with_rollups
+    else:
+        aggregate = aggregate_buckets
+    if slices > 1:
+        aggregate = partial(
+            aggregate_buckets_in_slices,
+            slices=slices,
+            parallelism=parallelism,
+            aggregate=aggregate,
+        )
+    dt_upto = get_exclusive_end(end_datetime)
 
-async def get_records_within_time_range(
+    with AGGREGATION_SECONDS.time(stage="mongo", group_type=group_label):
+        if cache is not None:
+            buckets = await aggregate_buckets_with_cache(
+                cache,
+                collection,
+                start_datetime,
+                dt_upto,
+                group_type,
+                aggregate,
+                seal_delay,
+            )
+        else:
+            buckets = await aggregate(collection, start_datetime, dt_upto, group_type)
+
+    with AGGREGATION_SECONDS.time(stage="fill", group_type=group_label):
+        return build_dense_series(
+            buckets=buckets,
+            start_datetime=truncate_datetime(start_datetime, group_type),
+            end_datetime=end_datetime,
+            delta=delta,
+        )
+
+
+async def get_metrics_within_time_range(
     collection: AsyncIOMotorCollection,
     start_time: str | datetime,
     end_time: str | datetime,
-    group_type: GroupType,
+    group_type: GroupType | GroupSpec,
+    metrics: Iterable[MetricSpec | MetricType | str] = (MetricType.SUM,),
 ) -> AggregationResult:
     """
-    This function retrieves records from a MongoDB collection within a specified time range and groups them based on a given group type.
-    It uses MongoDB aggregation pipeline stages to perform the grouping and aggregation operations.
+    Computes several metrics per bucket, e.g. `sum`, `count`, `avg`, `min`, `max` and `p95`, in a single scan.
+
+    Rollups and the bucket cache only hold sums and counts, so the raw collection is always read.
 
     Args:
     - collection (AsyncIOMotorCollection): The MongoDB collection to query.
     - start_time (str | datetime): The start time of the time range. Can be a string or a datetime object.
     - end_time (str | datetime): The end time of the time range. Can be a string or a datetime object.
-    - group_type (GroupType): The type of grouping to perform.
+    - group_type (GroupType | GroupSpec): The type of grouping to perform, e.g. `day` or `6-hour`.
+    - metrics (Iterable[MetricSpec | MetricType | str]): Metrics to compute. Defaults to `sum`.
 
     Returns:
-    - AggregationResult: An object containing the grouped records and labels.
+    - AggregationResult: An object containing one series per metric in `series` and labels,
+      `dataset` is the series of the first metric. Empty buckets are 0 for `sum` and `count`, None otherwise.
 
     Raises:
     - InvlidGroupError: If the provided group type is not valid.
+    - InvalidMetricError: If any of the metrics is not valid or no metrics are requested.
+    - OperationFailure: If percentiles are requested from a server older than MongoDB 7.0.
     """
+    specs = parse_metrics(metrics)
+
     start_datetime = parse_datetime(start_time)
     end_datetime = parse_datetime(end_time)
+    delta = get_timedelta_from_group(group_type)
+    group_label = get_group_label(group_type)
 
-    # Pipeline
-    match_documents = {
-        "$match": {
-            "dt": {
-                "$gte": start_datetime,
-                "$lte": end_datetime,
-            }
-        }
-    }
-    group_documents = {
-        "$group": {
-            "_id": get_mongo_group(group_type),
-            "total_value": {"$sum": "$value"},
-            "count": {"$count": {}},
-        },
-    }
-    sort_documents = {
-        "$sort": {
-            "_id": 1,
-        }
-    }
-    # Adds a 'label' field to each document that contains ISO datetime string, used for labels later
-    add_label = {
-        "$project": {
-            "total_value": 1,
-            "label": {
-                "$dateFromParts": {
-                    "year": "$_id.year",
-                    "month": {"$ifNull": ["$_id.month", 1]},
-                    "day": {"$ifNull": ["$_id.day", 1]},
-                    "hour": {"$ifNull": ["$_id.hour", 0]},
-                    "minute": {"$ifNull": ["$_id.minute", 0]},
-                    "second": {"$ifNull": ["$_id.second", 0]},
-                    "millisecond": {"$ifNull": ["$_id.millisecond", 0]},
-                    "timezone": "+00:00",
-                }
-            },
-        }
-    }
-    add_dataset_and_labels = {
-        "$group": {
-            "_id": None,
-            "dataset": {
-                "$push": "$total_value",
-            },
-            "labels": {
-                "$push": "$label",
-            },
-        }
-    }
-    filter_out_id = {
-        "$project": {
-            "_id": 0,
-        }
-    }
+    with AGGREGATION_SECONDS.time(stage="mongo", group_type=group_label):
+        buckets = await aggregate_metric_buckets(
+            collection,
+            start_datetime,
+            get_exclusive_end(end_datetime),
+            group_type,
+            specs,
+        )
 
-    cursor = collection.aggregate(
-        [
-            match_documents,
-            group_documents,
-            sort_documents,
-            add_label,
-            add_dataset_and_labels,
-            filter_out_id,
-        ]
+    with AGGREGATION_SECONDS.time(stage="fill", group_type=group_label):
+        return build_dense_metric_series(
+            buckets=buckets,
+            start_datetime=truncate_datetime(start_datetime, group_type),
+            end_datetime=end_datetime,
+            delta=delta,
+            metrics=specs,
+        )
+
+
+async def get_batch_records_within_time_range(
+    collection: AsyncIOMotorCollection,
+    specs: Iterable[RangeSpec | tuple],
+) -> list[AggregationResult]:
+    """
+    Answers several range queries with a single aggregation.
+
+    A single `$match` selects the union of the ranges and a `$facet` branch groups each of them,
+    so overlapping ranges are scanned once. The whole response is a single document limited to 16 MiB,
+    rollups and the bucket cache are not used.
+
+    Args:
+    - collection (AsyncIOMotorCollection): The MongoDB collection to query.
+    - specs (Iterable[RangeSpec | tuple]): `(dt_from, dt_upto, group_type[, metrics])` of every query.
+
+    Returns:
+    - list[AggregationResult]: One result per spec, in the same order, as `get_records_within_time_range`
+      returns it or as `get_metrics_within_time_range` does if metrics are given.
+
+    Raises:
+    - InvlidGroupError: If any of the group types is not valid.
+    - InvalidMetricError: If any of the metrics is not valid.
+    """
+    queries = []
+    for spec in specs:
+        spec = RangeSpec(*spec)
+        start_datetime = parse_datetime(spec.dt_from)
+        end_datetime = parse_datetime(spec.dt_upto)
+        group_type = GroupSpec.parse(spec.group_type)
+        metrics = None if spec.metrics is None else parse_metrics(spec.metrics)
+        queries.append((start_datetime, end_datetime, group_type, metrics))
+    if not queries:
+        return []
+
+    branches: dict[str, list[dict]] = {}
+    for index, (start_datetime, end_datetime, group_type, metrics) in enumerate(
+        queries
+    ):
+        match_documents = get_mongo_match(
+            start_datetime, get_exclusive_end(end_datetime)
+        )
+        branches[str(index)] = (
+            get_aggregation_pipeline(match_documents, group_type)
+            if metrics is None
+            else get_metrics_pipeline(match_documents, group_type, metrics)
+        )
+    pipeline = get_facet_pipeline(
+        get_union_match(
+            (start_datetime, get_exclusive_end(end_datetime))
+            for start_datetime, end_datetime, _, _ in queries
+        ),
+        branches,
     )
-    grouped_records: dict = await cursor.next()
 
-    # Fill missing dates
-    dataset: list[int | float] = []
-    labels: list[datetime] = []
+    with AGGREGATION_SECONDS.time(stage="mongo", group_type="batch"):
+        facets = await aggregate_facets(collection, pipeline)
+
+    results = []
+    with AGGREGATION_SECONDS.time(stage="fill", group_type="batch"):
+        for index, (start_datetime, end_datetime, group_type, metrics) in enumerate(
+            queries
+        ):
+            rows = facets.get(str(index), [])
+            labels_from = truncate_datetime(start_datetime, group_type)
+            delta = get_timedelta_from_group(group_type)
+            if metrics is None:
+                result = build_dense_series(
+                    buckets={row["_id"]: row["total_value"] for row in rows},
+                    start_datetime=labels_from,
+                    end_datetime=end_datetime,
+                    delta=delta,
+                )
+            else:
+                result = build_dense_metric_series(
+                    buckets={
+                        row["_id"]: {
+                            str(metric): row[metric.field] for metric in metrics
+                        }
+                        for row in rows
+                    },
+                    start_datetime=labels_from,
+                    end_datetime=end_datetime,
+                    delta=delta,
+                    metrics=metrics,
+                )
+            results.append(result)
+
+    return results
+
+
+async def iter_records_within_time_range(
+    collection: AsyncIOMotorCollection,
+    start_time: str | datetime,
+    end_time: str | datetime,
+    group_type: GroupType | GroupSpec,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> AsyncIterator[tuple[datetime, int | float, int]]:
+    """
+    Streaming variant of `get_records_within_time_range`.
 
-    all_dates = get_datetime_range(
-        start_datetime=start_datetime,
-        end_datetime=end_datetime,
-        delta=get_timedelta_from_group(group_type),
-        tzinfo=None,
+    Buckets are read from the aggregation cursor batch by batch and merged with the range of
+    labels on the fly, so memory usage and the first bucket latency do not depend on the range size.
+
+    Args:
+    - collection (AsyncIOMotorCollection): The MongoDB collection to query.
+    - start_time (str | datetime): The start time of the time range. Can be a string or a datetime object.
+    - end_time (str | datetime): The end time of the time range. Can be a string or a datetime object.
+    - group_type (GroupType | GroupSpec): The type of grouping to perform, e.g. `day` or `6-hour`.
+    - batch_size (int): Number of buckets per cursor batch. Defaults to `DEFAULT_BATCH_SIZE`.
+
+    Yields:
+    - tuple[datetime, int | float, int]: `(label, total_value, count)` of every bucket, missing buckets are filled with 0.
+
+    Raises:
+    - InvlidGroupError: If the provided group type is not valid.
+    """
+    start_datetime = parse_datetime(start_time)
+    end_datetime = parse_datetime(end_time)
+    delta = get_timedelta_from_group(group_type)
+
+    cursor = collection.aggregate(
+        get_aggregation_pipeline(
+            get_mongo_match(start_datetime, get_exclusive_end(end_datetime)),
+            group_type,
+        ),
+        batchSize=batch_size,
     )
-    for date in all_dates:
-        if date in grouped_records["labels"]:
-            dataset.append(
-                grouped_records["dataset"][grouped_records["labels"].index(date)]
-            )
-            labels.append(date)
-        else:
-            dataset.append(0)
-            labels.append(date)
+    rows: AsyncIterator[dict] = aiter(cursor)
+    try:
+        row = await anext(rows, None)
+        for label in iter_datetime_range(
+            truncate_datetime(start_datetime, group_type), end_datetime, delta
+        ):
+            while row is not None and row["_id"] < label:
+                row = await anext(rows, None)
 
-    return AggregationResult(dataset=dataset, labels=labels)
+            if row is not None and row["_id"] == label:
+                yield label, row["total_value"], row["count"]
+                row = await anext(rows, None)
+            else:
+                yield label, 0, 0
+    finally:
+        await cursor.close()
@@ -0,0 +1,305 @@
+"""
+Lightweight in-process metrics exposed in the Prometheus text format.
+
+Metrics are updated from the event loop and from pymongo monitoring threads, so every update
+holds the lock of the metric. Values are per process: forked webhook workers label their samples
+with `MetricsRegistry.const_labels` and serve them on their own ports, see `app.webhook.run_webhook`.
+
+Usage:
+    AGGREGATION_SECONDS = REGISTRY.histogram("aggregation_seconds", "...", ("group_type",))
+    with AGGREGATION_SECONDS.time(group_type="day"):
+        ...
+"""
+
+import bisect
+import threading
+from abc import ABC, abstractmethod
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from time import perf_counter
+from typing import TYPE_CHECKING
+
+from pymongo import monitoring
+
+if TYPE_CHECKING:
+    from aiohttp import web
+
+    from .types import GroupSpec, GroupType
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+LabelValues = tuple[str, ...]
+
+
+def format_labels(names: tuple[str, ...], values: LabelValues, *extra: str) -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    pairs.extend(pair for pair in extra if pair)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric(ABC):
+    """Base class of metrics with a fixed set of label names."""
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.lock = threading.Lock()
+
+    def label_values(self, labels: dict[str, object]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    @abstractmethod
+    def samples(self, const_labels: str = "") -> Iterator[str]:
+        """Yield sample lines, `const_labels` (e.g. `worker="1"`) are added to every sample."""
+
+    def render(self, const_labels: str = "") -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.type}"
+        yield from self.samples(const_labels)
+
+
+class Counter(Metric):
+    """Monotonically increasing value."""
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.values: dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: object) -> None:
+        self._add(amount, labels)
+
+    def _add(self, amount: float, labels: dict[str, object]) -> None:
+        key = self.label_values(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self, const_labels: str = "") -> Iterator[str]:
+        with self.lock:
+            values = list(self.values.items())
+        for key, value in values:
+            labels = format_labels(self.labelnames, key, const_labels)
+            yield f"{self.name}{labels} {value}"
+
+
+class Gauge(Counter):
+    """Value that can go up and down."""
+
+    type = "gauge"
+
+    def set(self, value: float, **labels: object) -> None:
+        key = self.label_values(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def dec(self, amount: float = 1, **labels: object) -> None:
+        self._add(-amount, labels)
+
+    @contextmanager
+    def track_in_progress(self, **labels: object) -> Iterator[None]:
+        self._add(1, labels)
+        try:
+            yield
+        finally:
+            self._add(-1, labels)
+
+
+class Histogram(Metric):
+    """Distribution of observed values over fixed buckets."""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+        # Per label values: counts per bucket (the last one is +Inf), sum
+        self.values: dict[LabelValues, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels: object) -> None:
+        key = self.label_values(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            state[0][index] += 1
+            state[1][0] += value
+
+    @contextmanager
+    def time(self, **labels: object) -> Iterator[None]:
+        started = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(perf_counter() - started, **labels)
+
+    def samples(self, const_labels: str = "") -> Iterator[str]:
+        with self.lock:
+            values = [
+                (key, list(counts), total[0])
+                for key, (counts, total) in self.values.items()
+            ]
+        for key, counts, total in values:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                labels = format_labels(
+                    self.labelnames, key, const_labels, f'le="{bound}"'
+                )
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = format_labels(self.labelnames, key, const_labels)
+            yield f"{self.name}_sum{labels} {total}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together."""
+
+    def __init__(self) -> None:
+        self.metrics: dict[str, Metric] = {}
+        self.collectors: list[Callable[[], None]] = []
+        # Added to every sample, e.g. `{"worker": "1"}` in a forked webhook worker
+        self.const_labels: dict[str, str] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        return self.metrics.setdefault(metric.name, metric)
+
+    def counter(
+        self, name: str, documentation: str, labelnames: tuple[str, ...] = ()
+    ) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))  # type: ignore[return-value]
+
+    def gauge(
+        self, name: str, documentation: str, labelnames: tuple[str, ...] = ()
+    ) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))  # type: ignore[return-value]
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))  # type: ignore[return-value]
+
+    def on_collect(self, callback: Callable[[], None]) -> None:
+        """Register a callback refreshing gauges right before rendering."""
+        self.collectors.append(callback)
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text format."""
+        for callback in self.collectors:
+            callback()
+
+        const_labels = ",".join(
+            f'{name}="{value}"' for name, value in self.const_labels.items()
+        )
+        lines = [
+            line
+            for metric in self.metrics.values()
+            for line in metric.render(const_labels)
+        ]
+        return "\n".join(lines) + "\n"
+
+
+def get_group_label(group_type: "GroupType | GroupSpec | str") -> str:
+    """Get the `group_type` label value, the unit only, as user-chosen bin sizes would add series without bound."""
+    from .types import GroupSpec
+
+    return GroupSpec.parse(group_type).unit.value
+
+
+REGISTRY = MetricsRegistry()
+
+AGGREGATION_SECONDS = REGISTRY.histogram(
+    "aggregation_stage_seconds",
+    "Time spent in aggregation stages.",
+    ("stage", "group_type"),
+)
+MONGO_COMMANDS = REGISTRY.counter(
+    "mongo_commands_total",
+    "MongoDB round-trips by command and outcome.",
+    ("command", "status"),
+)
+MONGO_COMMAND_SECONDS = REGISTRY.histogram(
+    "mongo_command_seconds",
+    "MongoDB round-trip duration by command.",
+    ("command",),
+)
+
+
+class CommandMetricsListener(monitoring.CommandListener):
+    """Records every MongoDB round-trip (`aggregate`, `getMore`, ...) of a client."""
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        pass
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        MONGO_COMMANDS.inc(command=event.command_name, status="ok")
+        MONGO_COMMAND_SECONDS.observe(
+            event.duration_micros / 1e6, command=event.command_name
+        )
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        MONGO_COMMANDS.inc(command=event.command_name, status="error")
+        MONGO_COMMAND_SECONDS.observe(
+            event.duration_micros / 1e6, command=event.command_name
+        )
+
+
+async def metrics_handler(request: "web.Request") -> "web.Response":
+    from aiohttp import web
+
+    return web.Response(
+        body=REGISTRY.render().encode(), headers={"Content-Type": CONTENT_TYPE}
+    )
+
+
+async def start_metrics_server(
+    host: str = "127.0.0.1", port: int = 9100
+) -> "web.AppRunner":
+    """
+    Serves `GET /metrics` on a local port.
+
+    Args:
+    - host (str): Interface to listen on. Defaults to `127.0.0.1`.
+    - port (int): Port to listen on. Defaults to 9100.
+
+    Returns:
+    - web.AppRunner: The runner, call `cleanup()` to stop the server.
+    """
+    from aiohttp import web
+
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+
+    return runner
@@ -0,0 +1,118 @@
+import gzip
+import json
+from collections.abc import Callable, Iterable, Iterator
+from typing import BinaryIO
+
+from .types import AggregationResult
+from .compact import iter_label_isoformat
+
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+
+def iter_json_values(values: Iterable[int | float | None]) -> Iterator[str]:
+    """Yield comma-separated JSON values, int64 `ValueArray`s skip `json.dumps`."""
+    encode: Callable[[int | float | None], str] = json.dumps
+    if getattr(values, "typecode", None) == "q":
+        encode = str
+    for index, value in enumerate(values):
+        yield encode(value) if index == 0 else ", " + encode(value)
+
+
+def iter_json_fragments(result: AggregationResult) -> Iterator[str]:
+    """
+    Incrementally encodes aggregation result as `{"dataset": [...], "labels": [...]}` JSON,
+    a `"series": {"<metric>": [...]}` object is appended if the result holds several metrics.
+
+    Joined fragments are equal to `json.dumps(..., ensure_ascii=False)` of the whole object,
+    labels are formatted with `datetime_to_iso(label, drop_timezone=True)`.
+
+    Args:
+    - result (AggregationResult): The aggregation result.
+
+    Yields:
+    - str: The next JSON fragment.
+    """
+    yield '{"dataset": ['
+    yield from iter_json_values(result.dataset)
+
+    yield '], "labels": ['
+    # ISO labels never need escaping
+    for index, label in enumerate(iter_label_isoformat(result.labels)):
+        yield f'"{label}"' if index == 0 else f', "{label}"'
+
+    if not result.series:
+        yield "]}"
+        return
+
+    yield '], "series": {'
+    for position, (name, values) in enumerate(result.series.items()):
+        yield (
+            json.dumps(name) + ": ["
+            if position == 0
+            else ", " + json.dumps(name) + ": ["
+        )
+        yield from iter_json_values(values)
+        yield "]"
+
+    yield "}}"
+
+
+def iter_json_batch_fragments(results: Iterable[AggregationResult]) -> Iterator[str]:
+    """
+    Incrementally encodes several aggregation results as a JSON array, see `iter_json_fragments`.
+
+    Args:
+    - results (Iterable[AggregationResult]): The aggregation results.
+
+    Yields:
+    - str: The next JSON fragment.
+    """
+    yield "["
+    for index, result in enumerate(results):
+        if index:
+            yield ", "
+        yield from iter_json_fragments(result)
+
+    yield "]"
+
+
+def iter_text_chunks(
+    fragments: Iterable[str], limit: int = TELEGRAM_MESSAGE_LIMIT
+) -> Iterator[str]:
+    """
+    Packs text fragments into chunks no longer than `limit` characters.
+
+    Args:
+    - fragments (Iterable[str]): Text fragments.
+    - limit (int): Maximum chunk length. Defaults to `TELEGRAM_MESSAGE_LIMIT`.
+
+    Yields:
+    - str: The next chunk.
+    """
+    buffer: list[str] = []
+    size = 0
+    for fragment in fragments:
+        while fragment:
+            part = fragment[: limit - size]
+            fragment = fragment[len(part) :]
+            buffer.append(part)
+            size += len(part)
+            if size == limit:
+                yield "".join(buffer)
+                buffer, size = [], 0
+
+    if buffer:
+        yield "".join(buffer)
+
+
+def write_gzip(fp: BinaryIO, chunks: Iterable[str]) -> None:
+    """
+    Writes UTF-8 encoded text chunks into a gzip stream.
+
+    Args:
+    - fp (BinaryIO): Binary file object to write into.
+    - chunks (Iterable[str]): Text chunks.
+    """
+    with gzip.GzipFile(fileobj=fp, mode="wb") as archive:
+        for chunk in chunks:
+            archive.write(chunk.encode())
@@ -0,0 +1,101 @@
+import asyncio
+from datetime import datetime
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+from .types import GroupSpec, GroupType
+from .pipeline import get_timedelta_from_group, aggregate_buckets
+from .rollup import ceil_datetime
+from .cache import BucketsAggregator
+from .dateutils import iter_datetime_range
+
+
+def split_time_range(
+    dt_from: datetime, dt_upto: datetime, group_type: GroupType | GroupSpec, slices: int
+) -> list[tuple[datetime, datetime]]:
+    """
+    Split the `[dt_from, dt_upto)` range into slices aligned to bucket boundaries.
+
+    Every bucket ends up in exactly one slice, so partial results never overlap.
+
+    Args:
+    - dt_from (datetime): The start of the range, inclusive.
+    - dt_upto (datetime): The end of the range, exclusive.
+    - group_type (GroupType | GroupSpec): The type of grouping to perform, e.g. `day` or `6-hour`.
+    - slices (int): Maximum number of slices.
+
+    Returns:
+    - list[tuple[datetime, datetime]]: `(dt_from, dt_upto)` slices in time order.
+
+    Raises:
+    - InvlidGroupError: If the provided group type is not valid.
+    """
+    if dt_from >= dt_upto:
+        return []
+
+    boundaries = [
+        boundary
+        for boundary in iter_datetime_range(
+            ceil_datetime(dt_from, group_type),
+            dt_upto,
+            get_timedelta_from_group(group_type),
+        )
+        if dt_from < boundary < dt_upto
+    ]
+    edges = [dt_from, *boundaries, dt_upto]
+
+    buckets = len(edges) - 1
+    slices = max(1, min(slices, buckets))
+    indexes = [round(i * buckets / slices) for i in range(slices + 1)]
+
+    return [(edges[indexes[i]], edges[indexes[i + 1]]) for i in range(slices)]
+
+
+async def aggregate_buckets_in_slices(
+    collection: AsyncIOMotorCollection,
+    dt_from: datetime,
+    dt_upto: datetime,
+    group_type: GroupType | GroupSpec,
+    slices: int = 4,
+    parallelism: int | None = None,
+    aggregate: BucketsAggregator = aggregate_buckets,
+) -> dict[datetime, int | float]:
+    """
+    Aggregates the `[dt_from, dt_upto)` range as concurrent bucket-aligned slices.
+
+    Args:
+    - collection (AsyncIOMotorCollection): The MongoDB collection to query.
+    - dt_from (datetime): The start of the range, inclusive.
+    - dt_upto (datetime): The end of the range, exclusive.
+    - group_type (GroupType | GroupSpec): The type of grouping to perform, e.g. `day` or `6-hour`.
+    - slices (int): Maximum number of slices. Defaults to 4.
+    - parallelism (int | None): Maximum number of concurrently running slices. Defaults to all of them.
+    - aggregate (BucketsAggregator): Aggregates a single slice. Defaults to `aggregate_buckets`.
+
+    Returns:
+    - dict[datetime, int | float]: Summed values keyed by bucket label.
+
+    Raises:
+    - InvlidGroupError: If the provided group type is not valid.
+    """
+    semaphore = asyncio.Semaphore(parallelism or slices)
+
+    async def aggregate_slice(slice_from: datetime, slice_upto: datetime) -> dict:
+        async with semaphore:
+            return await aggregate(collection, slice_from, slice_upto, group_type)
+
+    partials = await asyncio.gather(
+        *(
+            aggregate_slice(slice_from, slice_upto)
+            for slice_from, slice_upto in split_time_range(
+                dt_from, dt_upto, group_type, slices
+            )
+        )
+    )
+
+    buckets: dict[datetime, int | float] = {}
+    for partial in partials:
+        for label, value in partial.items():
+            buckets[label] = buckets.get(label, 0) + value
+
+    return buckets
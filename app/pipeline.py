@@ -0,0 +1,436 @@
+from collections.abc import Iterable, Sequence
+from datetime import datetime
+from time import perf_counter
+
+from dateutil.relativedelta import relativedelta
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+from .types import GroupSpec, GroupType, MetricSpec, MetricType
+from .exceptions import InvalidMetricError, InvlidGroupError
+from .dateutils import iter_datetime_range
+from .slowlog import SLOW_QUERY_LOG
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def get_mongo_group(group_type: GroupType | GroupSpec) -> dict[str, dict]:
+    """Get mongo aggregation `$group._id` expression truncating `dt` to the start of its bucket.
+
+    Args:
+    - group_type (GroupType | GroupSpec): Group type, e.g. `day` or `6-hour`.
+
+    Returns:
+    - dict[str, dict]: Mongo aggregation `$dateTrunc` expression.
+
+    Raises:
+    - InvlidGroupError: If the provided group type is not valid.
+    """
+    spec = GroupSpec.parse(group_type)
+    date_trunc: dict = {
+        "date": "$dt",
+        "unit": spec.unit.value,
+        "binSize": spec.bin_size,
+        "timezone": "UTC",
+    }
+    if spec.unit == GroupType.WEEK:
+        date_trunc["startOfWeek"] = "monday"
+
+    return {"$dateTrunc": date_trunc}
+
+
+def get_timedelta_from_group(group_type: GroupType | GroupSpec) -> relativedelta:
+    """
+    Get time delta based on the provided group type.
+
+    Args:
+    - group_type (GroupType | GroupSpec): The type of grouping to perform, e.g. `day` or `6-hour`.
+
+    Returns:
+    - relativedelta: A relativedelta object representing the time interval for the given group type.
+
+    Raises:
+    - InvlidGroupError: If the provided group type is not valid.
+    """
+    spec = GroupSpec.parse(group_type)
+    match spec.unit:
+        case GroupType.YEAR:
+            return relativedelta(years=spec.bin_size)
+        case GroupType.QUARTER:
+            return relativedelta(months=3 * spec.bin_size)
+        case GroupType.MONTH:
+            return relativedelta(months=spec.bin_size)
+        case GroupType.WEEK:
+            return relativedelta(weeks=spec.bin_size)
+        case GroupType.DAY:
+            return relativedelta(days=spec.bin_size)
+        case GroupType.HOUR:
+            return relativedelta(hours=spec.bin_size)
+        case GroupType.MINUTE:
+            return relativedelta(minutes=spec.bin_size)
+        case _:
+            raise InvlidGroupError(group_type)
+
+
+def get_mongo_match(dt_from: datetime, dt_upto: datetime) -> dict[str, dict]:
+    """Get mongo aggregation `$match` stage for the `[dt_from, dt_upto)` range.
+
+    Args:
+    - dt_from (datetime): The start of the range, inclusive.
+    - dt_upto (datetime): The end of the range, exclusive.
+
+    Returns:
+    - dict[str, dict]: Mongo aggregation `$match` stage.
+    """
+    return {
+        "$match": {
+            "dt": {
+                "$gte": dt_from,
+                "$lt": dt_upto,
+            }
+        }
+    }
+
+
+def merge_time_ranges(
+    ranges: Iterable[tuple[datetime, datetime]],
+) -> list[tuple[datetime, datetime]]:
+    """Merge overlapping and adjacent `[dt_from, dt_upto)` ranges.
+
+    Args:
+    - ranges (Iterable[tuple[datetime, datetime]]): Ranges in any order, empty ones are dropped.
+
+    Returns:
+    - list[tuple[datetime, datetime]]: Disjoint ranges in time order.
+    """
+    merged: list[tuple[datetime, datetime]] = []
+    for dt_from, dt_upto in sorted(ranges):
+        if dt_from >= dt_upto:
+            continue
+        if merged and dt_from <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], dt_upto))
+        else:
+            merged.append((dt_from, dt_upto))
+
+    return merged
+
+
+def get_union_match(ranges: Iterable[tuple[datetime, datetime]]) -> dict[str, dict]:
+    """Get mongo aggregation `$match` stage selecting documents within any of the `[dt_from, dt_upto)` ranges.
+
+    Disjoint ranges are matched with `$or`, so documents in the gaps are not scanned.
+
+    Args:
+    - ranges (Iterable[tuple[datetime, datetime]]): Ranges in any order.
+
+    Returns:
+    - dict[str, dict]: Mongo aggregation `$match` stage.
+    """
+    merged = merge_time_ranges(ranges)
+    if not merged:
+        return {"$match": {"dt": {"$in": []}}}
+    if len(merged) == 1:
+        return get_mongo_match(*merged[0])
+
+    return {
+        "$match": {
+            "$or": [
+                get_mongo_match(dt_from, dt_upto)["$match"]
+                for dt_from, dt_upto in merged
+            ]
+        }
+    }
+
+
+def get_aggregation_pipeline(
+    match_documents: dict,
+    group_type: GroupType | GroupSpec,
+    value_field: str = "$value",
+    count_field: str | None = None,
+) -> list[dict]:
+    """Get mongo aggregation pipeline grouping matched documents into buckets.
+
+    Args:
+    - match_documents (dict): Mongo aggregation `$match` stage.
+    - group_type (GroupType | GroupSpec): The type of grouping to perform, e.g. `day` or `6-hour`.
+    - value_field (str): Field holding the value to sum. Defaults to `$value`.
+    - count_field (str | None): Field holding pre-aggregated counts, documents are counted if not set.
+
+    Returns:
+    - list[dict]: Mongo aggregation pipeline, results in one `{_id, total_value, count}` document per bucket sorted by `_id`,
+      the bucket start datetime.
+
+    Raises:
+    - InvlidGroupError: If the provided group type is not valid.
+    """
+    group_documents = {
+        "$group": {
+            "_id": get_mongo_group(group_type),
+            "total_value": {"$sum": value_field},
+            "count": {"$sum": 1 if count_field is None else count_field},
+        },
+    }
+    sort_documents = {
+        "$sort": {
+            "_id": 1,
+        }
+    }
+
+    return [
+        match_documents,
+        group_documents,
+        sort_documents,
+    ]
+
+
+def get_metric_accumulator(metric: MetricSpec, value_field: str = "$value") -> dict:
+    """Get mongo `$group` accumulator computing the metric.
+
+    Args:
+    - metric (MetricSpec): The metric.
+    - value_field (str): Field holding the value. Defaults to `$value`.
+
+    Returns:
+    - dict: Mongo aggregation accumulator, percentiles result in a single element array.
+
+    Raises:
+    - InvalidMetricError: If a percentile metric has no percentile.
+    """
+    match metric.type:
+        case MetricType.SUM:
+            return {"$sum": value_field}
+        case MetricType.COUNT:
+            return {"$sum": 1}
+        case MetricType.AVG:
+            return {"$avg": value_field}
+        case MetricType.MIN:
+            return {"$min": value_field}
+        case MetricType.MAX:
+            return {"$max": value_field}
+        case MetricType.PERCENTILE if metric.percentile is not None:
+            return {
+                "$percentile": {
+                    "input": value_field,
+                    "p": [metric.percentile / 100],
+                    "method": "approximate",
+                }
+            }
+        case _:
+            raise InvalidMetricError(str(metric))
+
+
+def get_metrics_pipeline(
+    match_documents: dict,
+    group_type: GroupType | GroupSpec,
+    metrics: Sequence[MetricSpec],
+    value_field: str = "$value",
+) -> list[dict]:
+    """Get mongo aggregation pipeline computing several metrics per bucket in a single pass.
+
+    Args:
+    - match_documents (dict): Mongo aggregation `$match` stage.
+    - group_type (GroupType | GroupSpec): The type of grouping to perform, e.g. `day` or `6-hour`.
+    - metrics (Sequence[MetricSpec]): Metrics to compute, without duplicates.
+    - value_field (str): Field holding the value. Defaults to `$value`.
+
+    Returns:
+    - list[dict]: Mongo aggregation pipeline, results in one `{_id, <metric.field>...}` document per bucket
+      sorted by `_id`, the bucket start datetime.
+
+    Raises:
+    - InvlidGroupError: If the provided group type is not valid.
+    """
+    group_documents = {
+        "$group": {
+            "_id": get_mongo_group(group_type),
+            **{
+                metric.field: get_metric_accumulator(metric, value_field)
+                for metric in metrics
+            },
+        },
+    }
+    pipeline = [match_documents, group_documents]
+
+    percentiles = [
+        metric.field for metric in metrics if metric.type == MetricType.PERCENTILE
+    ]
+    if percentiles:
+        pipeline.append(
+            {
+                "$set": {
+                    field: {"$arrayElemAt": [f"${field}", 0]} for field in percentiles
+                }
+            }
+        )
+
+    pipeline.append({"$sort": {"_id": 1}})
+    return pipeline
+
+
+def get_facet_pipeline(
+    match_documents: dict, branches: dict[str, list[dict]]
+) -> list[dict]:
+    """Get mongo aggregation pipeline running several pipelines over a single scan.
+
+    Args:
+    - match_documents (dict): Mongo aggregation `$match` stage selecting documents of all branches.
+    - branches (dict[str, list[dict]]): Pipelines keyed by output field name.
+
+    Returns:
+    - list[dict]: Mongo aggregation pipeline, results in a single document with one array per branch.
+    """
+    return [match_documents, {"$facet": branches}]
+
+
+def submit_slow_aggregation(
+    collection: AsyncIOMotorCollection,
+    pipeline: list[dict],
+    dt_from: datetime,
+    dt_upto: datetime,
+    group_type: GroupType | GroupSpec,
+    elapsed: float,
+    result_size: int,
+) -> None:
+    """Write the aggregation into the slow query log in the background."""
+    SLOW_QUERY_LOG.submit(
+        collection,
+        pipeline,
+        {
+            "dt_from": dt_from,
+            "dt_upto": dt_upto,
+            "group_type": str(group_type),
+            "bucket_count": sum(
+                1
+                for label in iter_datetime_range(
+                    dt_from, dt_upto, get_timedelta_from_group(group_type)
+                )
+                if label < dt_upto
+            ),
+        },
+        elapsed,
+        result_size,
+    )
+
+
+async def aggregate_buckets(
+    collection: AsyncIOMotorCollection,
+    dt_from: datetime,
+    dt_upto: datetime,
+    group_type: GroupType | GroupSpec,
+    value_field: str = "$value",
+    count_field: str | None = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> dict[datetime, int | float]:
+    """
+    Aggregates documents within the `[dt_from, dt_upto)` range into sparse buckets.
+
+    Args:
+    - collection (AsyncIOMotorCollection): The MongoDB collection to query.
+    - dt_from (datetime): The start of the range, inclusive.
+    - dt_upto (datetime): The end of the range, exclusive.
+    - group_type (GroupType | GroupSpec): The type of grouping to perform, e.g. `day` or `6-hour`.
+    - value_field (str): Field holding the value to sum. Defaults to `$value`.
+    - count_field (str | None): Field holding pre-aggregated counts, documents are counted if not set.
+    - batch_size (int): Number of buckets per cursor batch. Defaults to `DEFAULT_BATCH_SIZE`.
+
+    Returns:
+    - dict[datetime, int | float]: Summed values keyed by bucket label, empty buckets are omitted.
+
+    Raises:
+    - InvlidGroupError: If the provided group type is not valid.
+    """
+    pipeline = get_aggregation_pipeline(
+        get_mongo_match(dt_from, dt_upto), group_type, value_field, count_field
+    )
+
+    started = perf_counter()
+    cursor = collection.aggregate(pipeline, batchSize=batch_size)
+    buckets = {row["_id"]: row["total_value"] async for row in cursor}
+    elapsed = perf_counter() - started
+
+    if SLOW_QUERY_LOG.is_slow(elapsed):
+        submit_slow_aggregation(
+            collection, pipeline, dt_from, dt_upto, group_type, elapsed, len(buckets)
+        )
+
+    return buckets
+
+
+async def aggregate_metric_buckets(
+    collection: AsyncIOMotorCollection,
+    dt_from: datetime,
+    dt_upto: datetime,
+    group_type: GroupType | GroupSpec,
+    metrics: Sequence[MetricSpec],
+    value_field: str = "$value",
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> dict[datetime, dict[str, int | float | None]]:
+    """
+    Computes several metrics of the documents within the `[dt_from, dt_upto)` range in a single scan.
+
+    Args:
+    - collection (AsyncIOMotorCollection): The MongoDB collection to query.
+    - dt_from (datetime): The start of the range, inclusive.
+    - dt_upto (datetime): The end of the range, exclusive.
+    - group_type (GroupType | GroupSpec): The type of grouping to perform, e.g. `day` or `6-hour`.
+    - metrics (Sequence[MetricSpec]): Metrics to compute, without duplicates.
+    - value_field (str): Field holding the value. Defaults to `$value`.
+    - batch_size (int): Number of buckets per cursor batch. Defaults to `DEFAULT_BATCH_SIZE`.
+
+    Returns:
+    - dict[datetime, dict[str, int | float | None]]: Metric values keyed by bucket label and metric name,
+      empty buckets are omitted.
+
+    Raises:
+    - InvlidGroupError: If the provided group type is not valid.
+    - OperationFailure: If percentiles are requested from a server older than MongoDB 7.0.
+    """
+    pipeline = get_metrics_pipeline(
+        get_mongo_match(dt_from, dt_upto), group_type, metrics, value_field
+    )
+
+    started = perf_counter()
+    cursor = collection.aggregate(pipeline, batchSize=batch_size)
+    buckets = {
+        row["_id"]: {str(metric): row[metric.field] for metric in metrics}
+        async for row in cursor
+    }
+    elapsed = perf_counter() - started
+
+    if SLOW_QUERY_LOG.is_slow(elapsed):
+        submit_slow_aggregation(
+            collection, pipeline, dt_from, dt_upto, group_type, elapsed, len(buckets)
+        )
+
+    return buckets
+
+
+async def aggregate_facets(
+    collection: AsyncIOMotorCollection, pipeline: list[dict]
+) -> dict[str, list[dict]]:
+    """
+    Runs a `$facet` pipeline, see `get_facet_pipeline`.
+
+    The whole result is a single document, so it is limited to 16 MiB.
+
+    Args:
+    - collection (AsyncIOMotorCollection): The MongoDB collection to query.
+    - pipeline (list[dict]): Mongo aggregation pipeline ending with `$facet`.
+
+    Returns:
+    - dict[str, list[dict]]: Documents of every branch keyed by branch name.
+    """
+    started = perf_counter()
+    rows = await collection.aggregate(pipeline).to_list(1)
+    elapsed = perf_counter() - started
+
+    facets = rows[0] if rows else {}
+    if SLOW_QUERY_LOG.is_slow(elapsed):
+        SLOW_QUERY_LOG.submit(
+            collection,
+            pipeline,
+            {"facets": len(pipeline[-1]["$facet"])},
+            elapsed,
+            sum(len(branch) for branch in facets.values()),
+        )
+
+    return facets
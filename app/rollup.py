@@ -0,0 +1,277 @@
+"""
+Pre-aggregated rollup collections.
+
+For a source collection `salary` the rollups live in `salary_rollup_hour`, `salary_rollup_day`
+and `salary_rollup_month`. Every rollup document holds a single bucket:
+`{"_id": <bucket start>, "dt": <bucket start>, "total_value": ..., "count": ...}`.
+
+Usage:
+    python -m app.rollup [dt_from] [dt_upto]
+"""
+
+import asyncio
+import sys
+from datetime import datetime
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+from .types import GroupSpec, GroupType
+from .dateutils import parse_datetime, get_exclusive_end, truncate_datetime
+from .pipeline import (
+    get_mongo_group,
+    get_mongo_match,
+    get_timedelta_from_group,
+    aggregate_buckets,
+)
+
+# Coarsest first
+ROLLUP_LEVELS: tuple[GroupType, ...] = (GroupType.MONTH, GroupType.DAY, GroupType.HOUR)
+
+# Units whose buckets are unions of whole buckets of the rollup level
+ROLLUP_UNITS: dict[GroupType, frozenset[GroupType]] = {
+    GroupType.MONTH: frozenset((GroupType.YEAR, GroupType.QUARTER, GroupType.MONTH)),
+    GroupType.DAY: frozenset(
+        (
+            GroupType.YEAR,
+            GroupType.QUARTER,
+            GroupType.MONTH,
+            GroupType.WEEK,
+            GroupType.DAY,
+        )
+    ),
+    GroupType.HOUR: frozenset(
+        (
+            GroupType.YEAR,
+            GroupType.QUARTER,
+            GroupType.MONTH,
+            GroupType.WEEK,
+            GroupType.DAY,
+            GroupType.HOUR,
+        )
+    ),
+}
+
+RollupSegment = tuple[GroupType | None, datetime, datetime]
+
+
+def get_rollup_collection(
+    collection: AsyncIOMotorCollection, level: GroupType
+) -> AsyncIOMotorCollection:
+    """Get rollup collection of the given level for the source collection.
+
+    Args:
+    - collection (AsyncIOMotorCollection): The source collection.
+    - level (GroupType): Rollup level.
+
+    Returns:
+    - AsyncIOMotorCollection: The rollup collection.
+    """
+    return collection.database[f"{collection.name}_rollup_{level}"]
+
+
+def ceil_datetime(source: datetime, group_type: GroupType | GroupSpec) -> datetime:
+    """Round a datetime object up to the start of the next bucket, unless it is already aligned.
+
+    Args:
+    - source (datetime): The datetime object to round.
+    - group_type (GroupType | GroupSpec): The bucket size.
+
+    Returns:
+    - datetime: The first bucket boundary not earlier than `source`.
+    """
+    truncated = truncate_datetime(source, group_type)
+    if truncated == source:
+        return truncated
+    return truncated + get_timedelta_from_group(group_type)
+
+
+def get_rollup_levels(group_type: GroupType | GroupSpec) -> tuple[GroupType, ...]:
+    """Get rollup levels usable for the given group type, coarsest first.
+
+    A rollup can serve a group type if its buckets nest into the group type buckets.
+
+    Args:
+    - group_type (GroupType | GroupSpec): The type of grouping to perform.
+
+    Returns:
+    - tuple[GroupType, ...]: Usable rollup levels.
+
+    Raises:
+    - InvlidGroupError: If the provided group type is not valid.
+    """
+    unit = GroupSpec.parse(group_type).unit
+    return tuple(level for level in ROLLUP_LEVELS if unit in ROLLUP_UNITS[level])
+
+
+def plan_rollup_segments(
+    dt_from: datetime, dt_upto: datetime, levels: tuple[GroupType, ...]
+) -> list[RollupSegment]:
+    """
+    Split the `[dt_from, dt_upto)` range into segments served by the coarsest possible source.
+
+    Whole periods are read from the coarsest rollup, partial edges are recursively
+    split between the finer rollups and finally the raw collection.
+
+    Args:
+    - dt_from (datetime): The start of the range, inclusive.
+    - dt_upto (datetime): The end of the range, exclusive.
+    - levels (tuple[GroupType, ...]): Usable rollup levels, coarsest first.
+
+    Returns:
+    - list[RollupSegment]: `(level, dt_from, dt_upto)` segments in time order, level is None for raw documents.
+    """
+    if dt_from >= dt_upto:
+        return []
+    if not levels:
+        return [(None, dt_from, dt_upto)]
+
+    level, finer_levels = levels[0], levels[1:]
+    covered_from = ceil_datetime(dt_from, level)
+    covered_upto = truncate_datetime(dt_upto, level)
+    if covered_from >= covered_upto:
+        return plan_rollup_segments(dt_from, dt_upto, finer_levels)
+
+    return [
+        *plan_rollup_segments(dt_from, covered_from, finer_levels),
+        (level, covered_from, covered_upto),
+        *plan_rollup_segments(covered_upto, dt_upto, finer_levels),
+    ]
+
+
+async def aggregate_buckets_with_rollups(
+    collection: AsyncIOMotorCollection,
+    dt_from: datetime,
+    dt_upto: datetime,
+    group_type: GroupType | GroupSpec,
+) -> dict[datetime, int | float]:
+    """
+    Aggregates the `[dt_from, dt_upto)` range reading whole periods from the rollup collections.
+
+    Args:
+    - collection (AsyncIOMotorCollection): The source collection.
+    - dt_from (datetime): The start of the range, inclusive.
+    - dt_upto (datetime): The end of the range, exclusive.
+    - group_type (GroupType | GroupSpec): The type of grouping to perform, e.g. `day` or `6-hour`.
+
+    Returns:
+    - dict[datetime, int | float]: Summed values keyed by bucket label, empty buckets are omitted.
+
+    Raises:
+    - InvlidGroupError: If the provided group type is not valid.
+    """
+    segments = plan_rollup_segments(dt_from, dt_upto, get_rollup_levels(group_type))
+    partials = await asyncio.gather(
+        *(
+            aggregate_buckets(collection, segment_from, segment_upto, group_type)
+            if level is None
+            else aggregate_buckets(
+                get_rollup_collection(collection, level),
+                segment_from,
+                segment_upto,
+                group_type,
+                value_field="$total_value",
+                count_field="$count",
+            )
+            for level, segment_from, segment_upto in segments
+        )
+    )
+
+    buckets: dict[datetime, int | float] = {}
+    for partial in partials:
+        for label, value in partial.items():
+            buckets[label] = buckets.get(label, 0) + value
+
+    return buckets
+
+
+def get_rollup_pipeline(
+    into: str,
+    dt_from: datetime,
+    dt_upto: datetime,
+    level: GroupType,
+    value_field: str,
+    count_field: str | None,
+) -> list[dict]:
+    """Get mongo aggregation pipeline merging `[dt_from, dt_upto)` buckets into a rollup collection.
+
+    Args:
+    - into (str): Name of the rollup collection.
+    - dt_from (datetime): The start of the range, inclusive.
+    - dt_upto (datetime): The end of the range, exclusive.
+    - level (GroupType): Rollup level.
+    - value_field (str): Field holding the value to sum.
+    - count_field (str | None): Field holding pre-aggregated counts, documents are counted if not set.
+
+    Returns:
+    - list[dict]: Mongo aggregation pipeline.
+    """
+    return [
+        get_mongo_match(dt_from, dt_upto),
+        {
+            "$group": {
+                "_id": get_mongo_group(level),
+                "total_value": {"$sum": value_field},
+                "count": {"$sum": 1 if count_field is None else count_field},
+            }
+        },
+        {"$set": {"dt": "$_id"}},
+        {
+            "$merge": {
+                "into": into,
+                "on": "_id",
+                "whenMatched": "replace",
+                "whenNotMatched": "insert",
+            }
+        },
+    ]
+
+
+async def refresh_rollups(
+    collection: AsyncIOMotorCollection,
+    dt_from: datetime | None = None,
+    dt_upto: datetime | None = None,
+) -> None:
+    """
+    Rebuilds rollup buckets of the source collection.
+
+    The range is widened to whole months, so every level is rebuilt from complete periods.
+    Each level is built from the next finer one, hourly buckets are built from raw documents.
+
+    Args:
+    - collection (AsyncIOMotorCollection): The source collection.
+    - dt_from (datetime | None): The start of the range, inclusive. Defaults to the earliest document.
+    - dt_upto (datetime | None): The end of the range, inclusive. Defaults to the latest document.
+    """
+    if dt_from is None or dt_upto is None:
+        first = await collection.find_one({}, {"dt": 1}, sort=[("dt", 1)])
+        last = await collection.find_one({}, {"dt": 1}, sort=[("dt", -1)])
+        if first is None or last is None:
+            return
+        dt_from = dt_from or first["dt"]
+        dt_upto = dt_upto or last["dt"]
+
+    range_from = truncate_datetime(dt_from, GroupType.MONTH)
+    range_upto = ceil_datetime(get_exclusive_end(dt_upto), GroupType.MONTH)
+
+    source, value_field, count_field = collection, "$value", None
+    for level in reversed(ROLLUP_LEVELS):
+        rollup = get_rollup_collection(collection, level)
+        await rollup.delete_many(get_mongo_match(range_from, range_upto)["$match"])
+        await source.aggregate(
+            get_rollup_pipeline(
+                rollup.name, range_from, range_upto, level, value_field, count_field
+            )
+        ).to_list(None)
+        source, value_field, count_field = rollup, "$total_value", "$count"
+
+
+async def main(argv: list[str]) -> None:
+    from .db import get_database
+
+    dt_from = parse_datetime(argv[0]) if len(argv) > 0 else None
+    dt_upto = parse_datetime(argv[1]) if len(argv) > 1 else None
+    await refresh_rollups(get_database().salary, dt_from, dt_upto)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1:]))
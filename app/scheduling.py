@@ -0,0 +1,177 @@
+import asyncio
+from collections import OrderedDict, deque
+from collections.abc import AsyncIterator, Hashable
+from contextlib import asynccontextmanager
+from time import monotonic
+
+from .exceptions import SchedulerBusyError
+
+
+class FairScheduler:
+    """
+    Bounds concurrent requests globally and per user, with a bounded fair waiting queue.
+
+    Waiting requests are granted round-robin between users, so a single user with many
+    queued requests can not starve the others. A user queues at most `max_user_queue` requests,
+    and once the whole queue is full the newest request of the user with the most queued ones
+    is rejected in favour of a user with fewer ones, so a single user can not fill the queue either.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        per_user_limit: int = 1,
+        max_queue: int = 100,
+        max_user_queue: int = 10,
+    ) -> None:
+        self.max_concurrency = max_concurrency
+        self.per_user_limit = per_user_limit
+        self.max_queue = max_queue
+        self.max_user_queue = max_user_queue
+
+        self.running = 0
+        self.queued = 0
+        self.rejected = 0
+        self.waited = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+        self._in_flight: dict[Hashable, int] = {}
+        self._waiting: OrderedDict[Hashable, deque[asyncio.Future]] = OrderedDict()
+
+    def _can_start(self, user_id: Hashable) -> bool:
+        return (
+            self.running < self.max_concurrency
+            and self._in_flight.get(user_id, 0) < self.per_user_limit
+        )
+
+    def _start(self, user_id: Hashable) -> None:
+        self.running += 1
+        self._in_flight[user_id] = self._in_flight.get(user_id, 0) + 1
+
+    def _dispatch(self) -> None:
+        while self.running < self.max_concurrency:
+            for user_id, waiters in self._waiting.items():
+                if self._in_flight.get(user_id, 0) < self.per_user_limit:
+                    break
+            else:
+                return
+
+            waiter = waiters.popleft()
+            if waiters:
+                self._waiting.move_to_end(user_id)
+            else:
+                del self._waiting[user_id]
+
+            self.queued -= 1
+            # Cancelled while queued, its `acquire` finds it removed and takes no slot
+            if waiter.done():
+                continue
+            self._start(user_id)
+            waiter.set_result(None)
+
+    def _evict(self, user_id: Hashable) -> bool:
+        """Reject the newest queued request of the user with the most queued ones, if it has more than `user_id`."""
+        heaviest = max(self._waiting, key=lambda key: len(self._waiting[key]))
+        waiting = self._waiting.get(user_id)
+        if len(self._waiting[heaviest]) <= (len(waiting) if waiting else 0) + 1:
+            return False
+
+        waiter = self._waiting[heaviest].pop()
+        self.queued -= 1
+        if not waiter.done():
+            self.rejected += 1
+            waiter.set_exception(SchedulerBusyError(self.queued))
+        return True
+
+    async def acquire(self, user_id: Hashable) -> None:
+        """Wait for a free slot.
+
+        Args:
+        - user_id (Hashable): Requesting user.
+
+        Raises:
+        - SchedulerBusyError: If the request can not start right away and the user's or the whole
+          queue is full, or if it was queued and then rejected in favour of another user.
+        """
+        if not self._waiting and self._can_start(user_id):
+            self._start(user_id)
+            return
+
+        waiting = self._waiting.get(user_id)
+        if (waiting is not None and len(waiting) >= self.max_user_queue) or (
+            self.queued >= self.max_queue and not self._evict(user_id)
+        ):
+            self.rejected += 1
+            raise SchedulerBusyError(self.queued)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(user_id, deque()).append(waiter)
+        self.queued += 1
+        self._dispatch()
+
+        started = monotonic()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                if waiter.exception() is None:
+                    self.release(user_id)
+            else:
+                # `_dispatch` or `_evict` may have dropped the cancelled waiter already
+                waiters = self._waiting.get(user_id)
+                if waiters is not None and waiter in waiters:
+                    waiters.remove(waiter)
+                    if not waiters:
+                        del self._waiting[user_id]
+                    self.queued -= 1
+            raise
+        finally:
+            wait_time = monotonic() - started
+            self.waited += 1
+            self.wait_time_total += wait_time
+            self.wait_time_max = max(self.wait_time_max, wait_time)
+
+    def release(self, user_id: Hashable) -> None:
+        """Free the slot taken by `acquire` and grant it to the next waiting request.
+
+        Args:
+        - user_id (Hashable): User the slot was acquired for.
+        """
+        self.running -= 1
+        self._in_flight[user_id] -= 1
+        if not self._in_flight[user_id]:
+            del self._in_flight[user_id]
+
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, user_id: Hashable) -> AsyncIterator[None]:
+        """Hold a slot for the duration of the `async with` block.
+
+        Args:
+        - user_id (Hashable): Requesting user.
+
+        Raises:
+        - SchedulerBusyError: If the request can not start right away and the queue is full.
+        """
+        await self.acquire(user_id)
+        try:
+            yield
+        finally:
+            self.release(user_id)
+
+    def stats(self) -> dict[str, int | float]:
+        """Get scheduler counters, used for sizing the connection pool.
+
+        Returns:
+        - dict[str, int | float]: Running and queued requests, rejections and wait times in seconds.
+        """
+        return {
+            "running": self.running,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "waited": self.waited,
+            "wait_time_avg": self.wait_time_total / self.waited if self.waited else 0.0,
+            "wait_time_max": self.wait_time_max,
+        }
@@ -0,0 +1,126 @@
+from datetime import datetime
+from typing import Annotated
+
+from pydantic import (
+    AfterValidator,
+    BaseModel,
+    ConfigDict,
+    Field,
+    PlainValidator,
+    TypeAdapter,
+    ValidationError,
+)
+
+from .dateutils import to_naive_utc
+from .types import ExportFormat, GroupSpec, MetricSpec
+
+# Errors meaning that the input is not an aggregation query at all
+FORMAT_ERROR_TYPES = frozenset(
+    (
+        "json_invalid",
+        "json_type",
+        "model_type",
+        "model_attributes_type",
+        "missing",
+        "extra_forbidden",
+        "list_type",
+        "too_short",
+    )
+)
+# Maximum number of queries in a single message
+MAX_BATCH_SIZE = 100
+
+# Aware datetimes, e.g. `2022-09-01T00:00:00Z`, are converted, so later layers only see naive UTC ones
+NaiveUTCDatetime = Annotated[datetime, AfterValidator(to_naive_utc)]
+
+
+class AggregationQuery(BaseModel):
+    """Aggregation query sent to the bot, e.g. `{"dt_from": ..., "dt_upto": ..., "group_type": ...}`.
+
+    Optional `metrics`, e.g. `["sum", "avg", "p95"]`, requests several metrics per bucket,
+    optional `format`, e.g. `csv`, requests the result as a document in that format, see `app.export`.
+    `dt_from` and `dt_upto` with a timezone are converted to naive UTC.
+    """
+
+    model_config = ConfigDict(extra="forbid", frozen=True)
+
+    dt_from: NaiveUTCDatetime
+    dt_upto: NaiveUTCDatetime
+    group_type: Annotated[GroupSpec, PlainValidator(GroupSpec.parse)]
+    metrics: (
+        tuple[Annotated[MetricSpec, PlainValidator(MetricSpec.parse)], ...] | None
+    ) = None
+    format: ExportFormat = ExportFormat.JSON
+
+
+def decode_query(source: str | bytes) -> AggregationQuery:
+    """
+    Parses and validates aggregation query in a single pass.
+
+    Args:
+    - source (str | bytes): JSON document.
+
+    Returns:
+    - AggregationQuery: The validated query.
+
+    Raises:
+    - ValidationError: If the input is not valid JSON or not a valid query.
+    """
+    return AggregationQuery.model_validate_json(source)
+
+
+QUERY_BATCH = TypeAdapter(
+    Annotated[list[AggregationQuery], Field(min_length=1, max_length=MAX_BATCH_SIZE)]
+)
+
+
+def decode_query_batch(source: str | bytes) -> list[AggregationQuery]:
+    """
+    Parses and validates a JSON array of aggregation queries in a single pass.
+
+    Args:
+    - source (str | bytes): JSON array of `AggregationQuery` documents.
+
+    Returns:
+    - list[AggregationQuery]: The validated queries.
+
+    Raises:
+    - ValidationError: If the input is not valid JSON or any of the queries is not valid.
+    """
+    return QUERY_BATCH.validate_json(source)
+
+
+def is_batch(source: str | bytes) -> bool:
+    """Check if the input looks like a JSON array rather than a single query."""
+    return source.lstrip()[:1] in ("[", b"[")
+
+
+def is_format_error(error: ValidationError) -> bool:
+    """Check if the input is not an aggregation query at all, as opposed to a query with invalid values.
+
+    Args:
+    - error (ValidationError): Error raised by `decode_query`.
+
+    Returns:
+    - bool: True if any of the errors is a JSON or structure error.
+    """
+    return any(item["type"] in FORMAT_ERROR_TYPES for item in error.errors())
+
+
+def get_invalid_group_type(error: ValidationError) -> str | None:
+    """Get the rejected group type, if any.
+
+    Args:
+    - error (ValidationError): Error raised by `decode_query`.
+
+    Returns:
+    - str | None: The rejected group type or None if the group type is valid.
+    """
+    for item in error.errors():
+        if item["loc"][-1:] == ("group_type",) and item["type"] in (
+            "enum",
+            "value_error",
+        ):
+            return str(item["input"])
+
+    return None
@@ -0,0 +1,75 @@
+from collections.abc import Mapping, Sequence
+from datetime import datetime
+
+from dateutil.relativedelta import relativedelta
+
+from .types import AggregationResult, MetricSpec
+from .compact import LabelGrid, ValueArray
+
+
+def build_dense_series(
+    buckets: Mapping[datetime, int | float],
+    start_datetime: datetime,
+    end_datetime: datetime,
+    delta: relativedelta,
+) -> AggregationResult:
+    """
+    Builds a gap-filled series from sparse aggregated buckets.
+
+    Every date of the range is looked up in `buckets` once, so the cost is linear
+    in the number of dates instead of quadratic. Labels are kept as a `LabelGrid`
+    and values as a `ValueArray`.
+
+    Args:
+    - buckets (Mapping[datetime, int | float]): Aggregated values keyed by bucket label.
+    - start_datetime (datetime): The start datetime object.
+    - end_datetime (datetime): The end datetime object.
+    - delta (relativedelta): The time delta increment.
+
+    Returns:
+    - AggregationResult: An object containing the dense dataset and labels, missing buckets are filled with 0.
+    """
+    labels = LabelGrid.from_range(start_datetime, end_datetime, delta)
+    dataset = ValueArray([buckets.get(date, 0) for date in labels])
+
+    return AggregationResult(dataset=dataset, labels=labels)
+
+
+def build_dense_metric_series(
+    buckets: Mapping[datetime, Mapping[str, int | float | None]],
+    start_datetime: datetime,
+    end_datetime: datetime,
+    delta: relativedelta,
+    metrics: Sequence[MetricSpec],
+) -> AggregationResult:
+    """
+    Builds one gap-filled series per metric from sparse aggregated buckets.
+
+    Args:
+    - buckets (Mapping[datetime, Mapping[str, int | float | None]]): Metric values keyed by bucket label and metric name.
+    - start_datetime (datetime): The start datetime object.
+    - end_datetime (datetime): The end datetime object.
+    - delta (relativedelta): The time delta increment.
+    - metrics (Sequence[MetricSpec]): Requested metrics, at least one.
+
+    Returns:
+    - AggregationResult: An object containing the dense series and labels, missing buckets are filled with
+      `MetricSpec.fill_value`. `dataset` is the series of the first metric.
+    """
+    labels = LabelGrid.from_range(start_datetime, end_datetime, delta)
+    columns: dict[str, list[int | float | None]] = {
+        str(metric): [] for metric in metrics
+    }
+
+    for date in labels:
+        values = buckets.get(date)
+        for metric in metrics:
+            name = str(metric)
+            columns[name].append(metric.fill_value if values is None else values[name])
+
+    series: dict[str, Sequence[int | float | None]] = {
+        name: ValueArray(values) for name, values in columns.items()
+    }
+    return AggregationResult(
+        dataset=series[str(metrics[0])], labels=labels, series=series
+    )
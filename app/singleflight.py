@@ -0,0 +1,60 @@
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable
+from typing import TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls into a single execution.
+
+    Callers passing the same key while a call is in flight await the same task and receive its
+    result (or exception). Nothing is cached once the call completes.
+    """
+
+    def __init__(self) -> None:
+        self.executions = 0
+        self.coalesced = 0
+        self._calls: dict[Hashable, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Whether a call with the key is in flight, so `do` would await it instead of running `fn`."""
+        return key in self._calls
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """Run `fn` unless a call with the same key is already in flight.
+
+        Args:
+        - key (Hashable): Call identity.
+        - fn (Callable[[], Awaitable[T]]): Starts the call.
+
+        Returns:
+        - T: Result of the shared call.
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            self.executions += 1
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            self.coalesced += 1
+
+        # A cancelled caller must not cancel the call shared with the others
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict[str, int]:
+        """Get coalescing counters.
+
+        Returns:
+        - dict[str, int]: Number of calls in flight, executions and coalesced (saved) calls.
+        """
+        return {
+            "in_flight": len(self._calls),
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+        }
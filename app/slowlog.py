@@ -0,0 +1,156 @@
+"""
+Slow aggregation log.
+
+Aggregations slower than the threshold are written into a rotating JSONL file together with
+the pipeline, parameters and `explain("executionStats")` output fetched in the background.
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+from typing import Any
+
+from bson import json_util
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+logger = logging.getLogger(__name__)
+
+
+def find_key(source: Any, key: str) -> Any:
+    """Find the first value stored under `key` in nested dicts and lists, depth first.
+
+    Args:
+    - source (Any): Explain output or any part of it.
+    - key (str): Key to look for.
+
+    Returns:
+    - Any: The value or None if the key is missing.
+    """
+    if isinstance(source, dict):
+        if key in source:
+            return source[key]
+        source = list(source.values())
+    if isinstance(source, list):
+        for item in source:
+            value = find_key(item, key)
+            if value is not None:
+                return value
+
+    return None
+
+
+class SlowQueryLog:
+    """Writes slow aggregations into a rotating JSONL file, disabled until `configure` is called."""
+
+    def __init__(self) -> None:
+        self.threshold: float | None = None
+        self._logger = logging.getLogger(f"{__name__}.entries")
+        self._logger.propagate = False
+        self._logger.setLevel(logging.INFO)
+        self._tasks: set[asyncio.Task] = set()
+
+    def configure(
+        self,
+        path: str,
+        threshold: float,
+        max_bytes: int = 10 * 1024 * 1024,
+        backup_count: int = 5,
+    ) -> None:
+        """
+        Enables the log.
+
+        Args:
+        - path (str): Path of the JSONL file.
+        - threshold (float): Minimal logged aggregation time, in seconds.
+        - max_bytes (int): File size to rotate at. Defaults to 10 MiB.
+        - backup_count (int): Number of rotated files to keep. Defaults to 5.
+        """
+        for handler in self._logger.handlers:
+            handler.close()
+        self._logger.handlers = [
+            RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count)
+        ]
+        self.threshold = threshold
+
+    def is_slow(self, elapsed: float) -> bool:
+        return self.threshold is not None and elapsed >= self.threshold
+
+    def submit(
+        self,
+        collection: AsyncIOMotorCollection,
+        pipeline: list[dict],
+        params: dict[str, Any],
+        elapsed: float,
+        result_size: int,
+    ) -> None:
+        """
+        Logs the aggregation in the background, if it is slow.
+
+        Args:
+        - collection (AsyncIOMotorCollection): The queried collection.
+        - pipeline (list[dict]): The executed pipeline.
+        - params (dict[str, Any]): Query parameters, e.g. range and group type.
+        - elapsed (float): Aggregation time, in seconds.
+        - result_size (int): Number of returned documents.
+        """
+        if not self.is_slow(elapsed):
+            return
+
+        task = asyncio.ensure_future(
+            self.record(collection, pipeline, params, elapsed, result_size)
+        )
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def record(
+        self,
+        collection: AsyncIOMotorCollection,
+        pipeline: list[dict],
+        params: dict[str, Any],
+        elapsed: float,
+        result_size: int,
+    ) -> dict[str, Any]:
+        """Explain the aggregation and write the log entry.
+
+        Returns:
+        - dict[str, Any]: The written entry.
+        """
+        from .explain import get_plan_stages
+
+        entry: dict[str, Any] = {
+            "ts": datetime.now(timezone.utc),
+            "collection": collection.full_name,
+            "elapsed_ms": round(elapsed * 1000, 3),
+            "params": params,
+            "result_size": result_size,
+            "pipeline": pipeline,
+        }
+        try:
+            explain = await collection.database.command(
+                "explain",
+                {"aggregate": collection.name, "pipeline": pipeline, "cursor": {}},
+                verbosity="executionStats",
+            )
+            stats = find_key(explain, "executionStats") or {}
+            entry["explain"] = {
+                "docs_examined": stats.get("totalDocsExamined"),
+                "keys_examined": stats.get("totalKeysExamined"),
+                "execution_time_ms": stats.get("executionTimeMillis"),
+                "plan_stages": get_plan_stages(find_key(explain, "winningPlan")),
+            }
+        except Exception as e:
+            logger.warning("Failed to explain slow aggregation: %s", e)
+            entry["explain"] = {"error": str(e)}
+
+        self._logger.info(
+            json_util.dumps(entry, json_options=json_util.RELAXED_JSON_OPTIONS)
+        )
+        return entry
+
+    async def drain(self) -> None:
+        """Wait for all pending entries to be written."""
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+SLOW_QUERY_LOG = SlowQueryLog()
@@ -0,0 +1,289 @@
+"""
+Memory-mapped columnar snapshots of a collection, see `app.columnar`.
+
+File layout, little-endian, every section is 8-byte aligned:
+- header (`HEADER_FORMAT`): magic, version, flags, row count, first indexed day, indexed day count;
+- `dt` column: int64 epoch milliseconds, sorted ascending;
+- `value` column: float64;
+- optional day index: int64 row of the first `dt` of each day, followed by the row count.
+
+Usage:
+    python -m app.snapshot export salary.columns
+    python -m app.snapshot info salary.columns
+"""
+
+import asyncio
+import mmap
+import os
+import struct
+import sys
+import time
+from collections.abc import Sequence
+from datetime import datetime
+from typing import BinaryIO
+
+import numpy as np
+
+from .columnar import ColumnarStore
+
+MAGIC = b"RLTCOLS\x00"
+VERSION = 1
+HEADER_FORMAT = "<8sIIqqq"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+FLAG_INTEGER = 1
+FLAG_DAY_INDEX = 2
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+
+class SnapshotError(Exception):
+    """Raised when snapshot file is not valid."""
+
+
+def build_day_index(dt: np.ndarray) -> tuple[int, np.ndarray]:
+    """Get the row of the first `dt` of every day between the first and the last one.
+
+    Args:
+    - dt (np.ndarray): Epoch milliseconds, sorted ascending.
+
+    Returns:
+    - tuple[int, np.ndarray]: The first day (days since epoch) and `day count + 1` rows,
+      the last one is the row count.
+    """
+    if not len(dt):
+        return 0, np.zeros(1, dtype="<i8")
+
+    first_day = int(dt[0]) // DAY_MS
+    last_day = int(dt[-1]) // DAY_MS
+    day_starts = np.arange(first_day, last_day + 2, dtype=np.int64) * DAY_MS
+
+    return first_day, np.searchsorted(dt, day_starts).astype("<i8")
+
+
+class MappedColumnarStore(ColumnarStore):
+    """
+    Columnar store reading the columns straight from a memory-mapped snapshot.
+
+    Once changes are applied or the columns are replaced they no longer reference the snapshot,
+    so the mapping is closed and a snapshot replaced by a later checkpoint is not kept mapped.
+    """
+
+    def __init__(
+        self,
+        dt: np.ndarray,
+        value: np.ndarray,
+        integer: bool,
+        first_day: int,
+        day_index: np.ndarray | None,
+        buffer: mmap.mmap,
+    ):
+        super().__init__(dt, value, integer)
+        self.first_day = first_day
+        self.day_index = day_index
+        self._buffer: mmap.mmap | None = buffer
+
+    @property
+    def mapped(self) -> bool:
+        """Check if the columns are still read from the snapshot."""
+        return self._buffer is not None
+
+    def _release(self) -> None:
+        """Close the mapping, arrays still viewing it (e.g. in a running query) keep it until collected."""
+        buffer, self._buffer = self._buffer, None
+        if buffer is None:
+            return
+        try:
+            buffer.close()
+        except BufferError:
+            pass
+
+    def search(self, values: list[int] | np.ndarray) -> np.ndarray:
+        """Find rows of the first `dt` not earlier than each of the epoch milliseconds.
+
+        Only the day of each value is searched if the snapshot has a day index.
+
+        Args:
+        - values (list[int] | np.ndarray): Epoch milliseconds, ascending.
+
+        Returns:
+        - np.ndarray: Row indexes.
+        """
+        if self.day_index is None:
+            return super().search(values)
+
+        rows = []
+        for value in values:
+            day = int(value) // DAY_MS - self.first_day
+            if day < 0:
+                rows.append(0)
+            elif day >= len(self.day_index) - 1:
+                rows.append(len(self.dt))
+            else:
+                start, end = self.day_index[day], self.day_index[day + 1]
+                rows.append(start + np.searchsorted(self.dt[start:end], value))
+
+        return np.asarray(rows, dtype=np.int64)
+
+    def apply(
+        self,
+        inserted: Sequence[tuple[datetime, int | float]] = (),
+        deleted: Sequence[tuple[datetime, int | float]] = (),
+    ) -> int:
+        """Apply changes, the columns are copied into memory, the day index is dropped and the mapping is closed."""
+        if not inserted and not deleted:
+            return 0
+
+        self.day_index = None
+        missing = super().apply(inserted, deleted)
+        self._release()
+        return missing
+
+    def replace(self, other: ColumnarStore) -> None:
+        self.day_index = None
+        super().replace(other)
+        self._release()
+
+    def close(self) -> None:
+        """Drop the columns and release the mapping, the store must not be used afterwards."""
+        super().close()
+        self.day_index = None
+        self._release()
+
+
+def write_snapshot(fp: BinaryIO, store: ColumnarStore, day_index: bool = True) -> None:
+    """
+    Writes the store columns into a binary file object.
+
+    Args:
+    - fp (BinaryIO): Binary file object to write into.
+    - store (ColumnarStore): The store.
+    - day_index (bool): Append the per-day row index. Defaults to True.
+    """
+    dt = np.ascontiguousarray(store.dt, dtype="<i8")
+    value = np.ascontiguousarray(store.value, dtype="<f8")
+    first_day, index = build_day_index(dt) if day_index else (0, None)
+
+    flags = (FLAG_INTEGER if store.integer else 0) | (
+        FLAG_DAY_INDEX if index is not None else 0
+    )
+    fp.write(
+        struct.pack(
+            HEADER_FORMAT,
+            MAGIC,
+            VERSION,
+            flags,
+            len(dt),
+            first_day,
+            0 if index is None else len(index) - 1,
+        )
+    )
+    fp.write(dt.tobytes())
+    fp.write(value.tobytes())
+    if index is not None:
+        fp.write(index.tobytes())
+
+
+def save_snapshot(path: str, store: ColumnarStore, day_index: bool = True) -> None:
+    """
+    Atomically replaces the snapshot file, processes holding the old one keep reading it.
+
+    Args:
+    - path (str): Path of the snapshot file.
+    - store (ColumnarStore): The store.
+    - day_index (bool): Append the per-day row index. Defaults to True.
+    """
+    temporary = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temporary, "wb") as fp:
+            write_snapshot(fp, store, day_index)
+        os.replace(temporary, path)
+    finally:
+        if os.path.exists(temporary):
+            os.unlink(temporary)
+
+
+def get_snapshot_age(path: str) -> float:
+    """Get seconds since the snapshot file was last written.
+
+    Args:
+    - path (str): Path of the snapshot file.
+
+    Returns:
+    - float: Age of the snapshot in seconds.
+    """
+    return max(time.time() - os.path.getmtime(path), 0.0)
+
+
+def open_snapshot(path: str) -> MappedColumnarStore:
+    """
+    Opens the snapshot without copying, the columns are read from the page cache shared by all processes.
+
+    Args:
+    - path (str): Path of the snapshot file.
+
+    Returns:
+    - MappedColumnarStore: The store, `close` it to release the mapping.
+
+    Raises:
+    - SnapshotError: If the file is not a valid snapshot.
+    """
+    with open(path, "rb") as fp:
+        size = os.fstat(fp.fileno()).st_size
+        if size < HEADER_SIZE:
+            raise SnapshotError(f"{path}: file is too short")
+        buffer = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+    magic, version, flags, count, first_day, days = struct.unpack_from(
+        HEADER_FORMAT, buffer
+    )
+    index_size = (days + 1) * 8 if flags & FLAG_DAY_INDEX else 0
+    if magic != MAGIC or version != VERSION:
+        buffer.close()
+        raise SnapshotError(f"{path}: not a snapshot of version {VERSION}")
+    if size != HEADER_SIZE + count * 16 + index_size:
+        buffer.close()
+        raise SnapshotError(f"{path}: unexpected file size {size}")
+
+    dt = np.frombuffer(buffer, dtype="<i8", count=count, offset=HEADER_SIZE)
+    value = np.frombuffer(
+        buffer, dtype="<f8", count=count, offset=HEADER_SIZE + count * 8
+    )
+    day_index = (
+        np.frombuffer(
+            buffer, dtype="<i8", count=days + 1, offset=HEADER_SIZE + count * 16
+        )
+        if index_size
+        else None
+    )
+
+    return MappedColumnarStore(
+        dt, value, bool(flags & FLAG_INTEGER), first_day, day_index, buffer
+    )
+
+
+async def main(argv: list[str]) -> None:
+    if len(argv) != 2 or argv[0] not in ("export", "info"):
+        print("Usage: python -m app.snapshot export|info <path>")
+        return
+
+    command, path = argv
+    if command == "export":
+        from .db import get_database
+
+        save_snapshot(path, await ColumnarStore.load(get_database().salary))
+
+    store = open_snapshot(path)
+    print(
+        "{}: {} rows, {} values, day index: {}".format(
+            path,
+            len(store),
+            "int" if store.integer else "float",
+            "no" if store.day_index is None else f"{len(store.day_index) - 1} days",
+        )
+    )
+    store.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1:]))
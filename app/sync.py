@@ -0,0 +1,316 @@
+"""
+Incremental sync of a columnar store and the bucket cache with a collection.
+
+Changes are read from a change stream on replica sets and sharded clusters, standalone
+servers are polled for documents with `_id` greater than the watermark, so only inserts
+are seen there. Updates and deletes need the old `dt` and `value`, enable pre-images with
+`enable_pre_images` (MongoDB 6.0+), otherwise the store is reloaded when they happen,
+including events with a null pre-image, e.g. of changes made before pre-images were enabled.
+
+The resume token and the watermark are persisted in a JSON state file next to the snapshot,
+see `app.snapshot`, so a restart resumes from the snapshot instead of reloading the collection.
+"""
+
+import asyncio
+import logging
+import os
+from collections.abc import Mapping
+from datetime import datetime
+from time import monotonic
+from typing import Any
+
+from bson import json_util
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo.errors import OperationFailure
+
+from .cache import BucketCache, get_collection_key
+from .columnar import ColumnarStore, get_numeric_value
+from .snapshot import save_snapshot
+
+logger = logging.getLogger(__name__)
+
+# Server error codes meaning that change streams are unavailable or can not be resumed
+CHANGE_STREAMS_UNSUPPORTED = frozenset((40573,))
+CHANGE_STREAM_HISTORY_LOST = frozenset((280, 286))
+
+Row = tuple[datetime, int | float]
+
+
+def get_row(document: Mapping[str, Any] | None) -> Row | None:
+    """Get `(dt, value)` of the document as the store holds it, None if it has no date `dt`."""
+    if document is None or not isinstance(document.get("dt"), datetime):
+        return None
+    return document["dt"], get_numeric_value(document)
+
+
+def load_state(path: str | None) -> dict[str, Any]:
+    """Read the sync state, an empty dict if there is none.
+
+    Args:
+    - path (str | None): Path of the state file.
+
+    Returns:
+    - dict[str, Any]: `resume_token` and `watermark`, if known.
+    """
+    if path is None or not os.path.exists(path):
+        return {}
+    with open(path) as fp:
+        return json_util.loads(fp.read())
+
+
+def save_state(path: str, state: dict[str, Any]) -> None:
+    """Atomically write the sync state.
+
+    Args:
+    - path (str): Path of the state file.
+    - state (dict[str, Any]): `resume_token` and `watermark`.
+    """
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "w") as fp:
+        fp.write(json_util.dumps(state, json_options=json_util.CANONICAL_JSON_OPTIONS))
+    os.replace(temporary, path)
+
+
+async def enable_pre_images(collection: AsyncIOMotorCollection) -> None:
+    """Record document pre-images in change streams, requires MongoDB 6.0+."""
+    await collection.database.command(
+        "collMod", collection.name, changeStreamPreAndPostImages={"enabled": True}
+    )
+
+
+class CollectionSync:
+    """
+    Keeps a columnar store and the bucket cache in sync with the collection.
+
+    Usage:
+        sync = CollectionSync(database.salary, store, cache, snapshot_path="salary.columns")
+        await sync.bootstrap()  # Unless the store was opened from a snapshot with a saved state
+        task = asyncio.create_task(sync.run())
+    """
+
+    def __init__(
+        self,
+        collection: AsyncIOMotorCollection,
+        store: ColumnarStore,
+        cache: BucketCache | None = None,
+        snapshot_path: str | None = None,
+        batch_size: int = 1000,
+        poll_interval: float = 1.0,
+        checkpoint_interval: float = 60.0,
+    ):
+        """
+        Args:
+        - collection (AsyncIOMotorCollection): The source collection.
+        - store (ColumnarStore): The store to update in place.
+        - cache (BucketCache | None): Cache to invalidate changed buckets in. Defaults to None.
+        - snapshot_path (str | None): Snapshot rewritten on checkpoints, the state is saved next to it. Defaults to None.
+        - batch_size (int): Maximum number of changes applied at once. Defaults to 1000.
+        - poll_interval (float): Seconds between polls and change stream batches. Defaults to 1.
+        - checkpoint_interval (float): Minimal seconds between checkpoints. Defaults to 60.
+        """
+        self.collection = collection
+        self.store = store
+        self.cache = cache
+        self.snapshot_path = snapshot_path
+        self.state_path = (
+            None if snapshot_path is None else f"{snapshot_path}.sync.json"
+        )
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.checkpoint_interval = checkpoint_interval
+
+        state = load_state(self.state_path)
+        self.resume_token: Mapping[str, Any] | None = state.get("resume_token")
+        self.start_at_operation_time = state.get("operation_time")
+        self.watermark: Any = state.get("watermark")
+        self.applied = 0
+        self.reloads = 0
+        # Inserts of documents loaded by `bootstrap` are skipped until the stream catches up
+        self._skip_upto: Any = None
+        self._checkpointed = monotonic()
+        self._dirty = False
+
+    @property
+    def has_state(self) -> bool:
+        """Check if the sync knows where to continue from, otherwise the store has to be bootstrapped."""
+        return (
+            self.resume_token is not None
+            or self.start_at_operation_time is not None
+            or self.watermark is not None
+        )
+
+    async def bootstrap(self) -> None:
+        """
+        Reload the store and position the sync right after it.
+
+        Only documents with `_id` up to the current maximum are loaded and inserts of such
+        documents are skipped while catching up, so with monotonic `_id`s no insert is applied twice.
+        Updates and deletes racing with the load may still be.
+        """
+        ping = await self.collection.database.command("ping")
+        last = await self.collection.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+
+        self.resume_token = None
+        self.start_at_operation_time = ping.get("operationTime")
+        self.watermark = self._skip_upto = None if last is None else last["_id"]
+        query = None if self.watermark is None else {"_id": {"$lte": self.watermark}}
+        self.store.replace(await ColumnarStore.load(self.collection, query=query))
+        if self.cache is not None:
+            self.cache.invalidate(get_collection_key(self.collection))
+
+        self.reloads += 1
+        self._dirty = True
+        self.checkpoint(force=True)
+
+    def apply(self, inserted: list[Row], deleted: list[Row]) -> None:
+        """Apply changed rows to the store and drop the affected cached buckets."""
+        if not inserted and not deleted:
+            return
+
+        missing = self.store.apply(inserted, deleted)
+        if missing:
+            logger.warning("%s deleted rows were missing in the store", missing)
+
+        if self.cache is not None:
+            changed = [dt for dt, _ in inserted] + [dt for dt, _ in deleted]
+            self.cache.invalidate(
+                get_collection_key(self.collection), min(changed), max(changed)
+            )
+
+        self.applied += len(inserted) + len(deleted)
+        self._dirty = True
+
+    def checkpoint(self, force: bool = False) -> None:
+        """Save the snapshot and the state together, at most once per `checkpoint_interval`."""
+        if self.snapshot_path is None or self.state_path is None or not self._dirty:
+            return
+        if not force and monotonic() - self._checkpointed < self.checkpoint_interval:
+            return
+
+        save_snapshot(self.snapshot_path, self.store)
+        save_state(
+            self.state_path,
+            {
+                "resume_token": self.resume_token,
+                "operation_time": self.start_at_operation_time,
+                "watermark": self.watermark,
+            },
+        )
+        self._checkpointed = monotonic()
+        self._dirty = False
+
+    async def run(self) -> None:
+        """Sync until cancelled, with a change stream if the server supports it and polling otherwise."""
+        if not self.has_state:
+            await self.bootstrap()
+
+        try:
+            while True:
+                try:
+                    await self.watch()
+                except OperationFailure as e:
+                    if e.code in CHANGE_STREAMS_UNSUPPORTED:
+                        logger.info("Change streams are not supported, polling")
+                        await self.poll()
+                    elif e.code in CHANGE_STREAM_HISTORY_LOST:
+                        logger.warning("Change stream can not be resumed, reloading")
+                        await self.bootstrap()
+                    else:
+                        raise
+        finally:
+            self.checkpoint(force=True)
+
+    async def watch(self) -> None:
+        """Apply change stream events, returns if the stream is invalidated."""
+        options: dict[str, Any] = {
+            "full_document": "updateLookup",
+            "full_document_before_change": "whenAvailable",
+            "batch_size": self.batch_size,
+        }
+        if self.resume_token is not None:
+            options["resume_after"] = self.resume_token
+        elif self.start_at_operation_time is not None:
+            options["start_at_operation_time"] = self.start_at_operation_time
+
+        async with self.collection.watch(**options) as stream:
+            while stream.alive:
+                inserted: list[Row] = []
+                deleted: list[Row] = []
+                reload = False
+                while len(inserted) + len(deleted) < self.batch_size:
+                    event = await stream.try_next()
+                    if event is None:
+                        self._skip_upto = None
+                        break
+                    reload |= self.read_event(event, inserted, deleted)
+                    if reload:
+                        break
+
+                if reload:
+                    await self.bootstrap()
+                    return
+
+                self.apply(inserted, deleted)
+                if stream.resume_token is not None:
+                    self.resume_token = stream.resume_token
+                    self._dirty = self._dirty or bool(inserted or deleted)
+                self.checkpoint()
+                if not inserted and not deleted:
+                    await asyncio.sleep(self.poll_interval)
+
+    def read_event(
+        self, event: Mapping[str, Any], inserted: list[Row], deleted: list[Row]
+    ) -> bool:
+        """Collect changed rows of the event.
+
+        Returns:
+        - bool: True if the store has to be reloaded, the old document is unknown.
+        """
+        operation = event["operationType"]
+        if operation in ("drop", "rename", "dropDatabase", "invalidate"):
+            return True
+
+        if operation == "insert":
+            document = event["fullDocument"]
+            if self._skip_upto is not None and document["_id"] <= self._skip_upto:
+                return False
+            row = get_row(document)
+            if row is not None:
+                inserted.append(row)
+            return False
+
+        if operation in ("update", "replace", "delete"):
+            # `whenAvailable` sends a null pre-image if it was not recorded
+            before = event.get("fullDocumentBeforeChange")
+            if before is None:
+                return True
+            old = get_row(before)
+            new = get_row(event.get("fullDocument")) if operation != "delete" else None
+            if old != new:
+                if old is not None:
+                    deleted.append(old)
+                if new is not None:
+                    inserted.append(new)
+
+        return False
+
+    async def poll(self) -> None:
+        """Apply documents inserted after the `_id` watermark, forever."""
+        while True:
+            query = {} if self.watermark is None else {"_id": {"$gt": self.watermark}}
+            documents = await self.collection.find(
+                query,
+                {"_id": 1, "dt": 1, "value": 1},
+                sort=[("_id", 1)],
+                limit=self.batch_size,
+            ).to_list(None)
+
+            inserted = [row for row in map(get_row, documents) if row is not None]
+            if documents:
+                self.watermark = documents[-1]["_id"]
+                self._dirty = True
+            self.apply(inserted, [])
+            self.checkpoint()
+
+            if len(documents) < self.batch_size:
+                await asyncio.sleep(self.poll_interval)
@@ -1,23 +1,170 @@
-from dataclasses import dataclass
+import re
+from collections.abc import Sequence
+from dataclasses import dataclass, field
 from datetime import datetime
 from enum import StrEnum
+from typing import NamedTuple
 
+PERCENTILE_PATTERN = re.compile(r"p(\d+(?:\.\d+)?)")
 
-@dataclass(frozen=False)
+
+@dataclass(slots=True)
 class AggregationResult:
-    """Used for `get_records_within_time_range` result."""
+    """Used for `get_records_within_time_range` result.
+
+    `dataset` and `series` are usually `app.compact.ValueArray`s and `labels` is a `app.compact.LabelGrid`,
+    both compare equal to lists. `series` holds one dense series per requested metric, see
+    `get_metrics_within_time_range`.
+    """
 
-    dataset: list[int | float]
-    labels: list[datetime]
+    dataset: Sequence[int | float | None]
+    labels: Sequence[datetime]
+    series: dict[str, Sequence[int | float | None]] = field(default_factory=dict)
 
 
 class GroupType(StrEnum):
     """The type of grouping to perform."""
 
     YEAR = "year"
+    QUARTER = "quarter"
     MONTH = "month"
+    WEEK = "week"
     DAY = "day"
     HOUR = "hour"
+    MINUTE = "minute"
+
+    @classmethod
+    def values(cls) -> list[str]:
+        """Get all values of the enum."""
+        return [item.value for item in cls]
+
+
+@dataclass(frozen=True)
+class GroupSpec:
+    """Bucket of `bin_size` consecutive `unit`s, written as `unit` or `<bin_size>-<unit>`, e.g. `15-minute`."""
+
+    unit: GroupType
+    bin_size: int = 1
+
+    def __str__(self) -> str:
+        return self.unit.value if self.bin_size == 1 else f"{self.bin_size}-{self.unit}"
+
+    @classmethod
+    def parse(cls, value: "GroupSpec | GroupType | str") -> "GroupSpec":
+        """Parse group type, e.g. `day` or `6-hour`.
+
+        Args:
+        - value (GroupSpec | GroupType | str): Group type.
+
+        Returns:
+        - GroupSpec: The parsed group type.
+
+        Raises:
+        - InvlidGroupError: If the provided group type is not valid.
+        """
+        from .exceptions import InvlidGroupError
+
+        if isinstance(value, GroupSpec):
+            return value
+        if not isinstance(value, str):
+            raise InvlidGroupError(value)
+
+        bin_size, separator, unit = value.rpartition("-")
+        if separator and not bin_size.isdigit():
+            raise InvlidGroupError(value)
+        try:
+            spec = cls(GroupType(unit), int(bin_size) if bin_size else 1)
+        except ValueError:
+            raise InvlidGroupError(value) from None
+        if spec.bin_size < 1:
+            raise InvlidGroupError(value)
+
+        return spec
+
+
+class MetricType(StrEnum):
+    """The statistic computed per bucket."""
+
+    SUM = "sum"
+    COUNT = "count"
+    AVG = "avg"
+    MIN = "min"
+    MAX = "max"
+    PERCENTILE = "percentile"
+
+    @classmethod
+    def values(cls) -> list[str]:
+        """Get all values of the enum."""
+        return [item.value for item in cls]
+
+
+@dataclass(frozen=True)
+class MetricSpec:
+    """Statistic written as `sum`, `count`, `avg`, `min`, `max` or `p<percentile>`, e.g. `p95` or `p99.9`."""
+
+    type: MetricType
+    percentile: float | None = None
+
+    def __str__(self) -> str:
+        if self.type == MetricType.PERCENTILE:
+            return f"p{self.percentile:g}"
+        return self.type.value
+
+    @property
+    def field(self) -> str:
+        """Name of the `$group` output field, dots are not allowed there."""
+        return str(self).replace(".", "_")
+
+    @property
+    def fill_value(self) -> int | None:
+        """Value of empty buckets: sums and counts are 0, other statistics are undefined."""
+        return 0 if self.type in (MetricType.SUM, MetricType.COUNT) else None
+
+    @classmethod
+    def parse(cls, value: "MetricSpec | MetricType | str") -> "MetricSpec":
+        """Parse metric, e.g. `avg` or `p95`.
+
+        Args:
+        - value (MetricSpec | MetricType | str): Metric.
+
+        Returns:
+        - MetricSpec: The parsed metric.
+
+        Raises:
+        - InvalidMetricError: If the provided metric is not valid.
+        """
+        from .exceptions import InvalidMetricError
+
+        if isinstance(value, MetricSpec):
+            return value
+        if not isinstance(value, str) or value == MetricType.PERCENTILE:
+            raise InvalidMetricError(value)
+        if value in MetricType.values():
+            return cls(MetricType(value))
+
+        match = PERCENTILE_PATTERN.fullmatch(value)
+        if match is None or not 0 < float(match[1]) < 100:
+            raise InvalidMetricError(value)
+
+        return cls(MetricType.PERCENTILE, float(match[1]))
+
+
+class RangeSpec(NamedTuple):
+    """Single range of `get_batch_records_within_time_range`, metrics are optional."""
+
+    dt_from: datetime | str
+    dt_upto: datetime | str
+    group_type: "GroupType | GroupSpec | str"
+    metrics: "tuple[MetricSpec | MetricType | str, ...] | None" = None
+
+
+class ExportFormat(StrEnum):
+    """Serialization format of an aggregation result, see `app.export`."""
+
+    JSON = "json"
+    CSV = "csv"
+    NPZ = "npz"
+    ARROW = "arrow"
 
     @classmethod
     def values(cls) -> list[str]:
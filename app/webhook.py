@@ -0,0 +1,163 @@
+"""
+Webhook deployment mode of the Telegram bot.
+
+Updates are served by an aiohttp application, several worker processes can share the port.
+Metrics are kept per process, so every worker labels them with `worker` and serves them on its own port.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+from collections.abc import AsyncIterator
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+from .metrics import REGISTRY, metrics_handler, start_metrics_server
+
+HEALTH_PATH = "/health"
+METRICS_PATH = "/metrics"
+
+
+async def health(request: web.Request) -> web.Response:
+    return web.json_response({"status": "ok"})
+
+
+def create_webhook_app(
+    dp: Dispatcher,
+    bot: Bot,
+    path: str = "/webhook",
+    secret_token: str | None = None,
+    handle_in_background: bool = True,
+) -> web.Application:
+    """
+    Creates aiohttp application feeding webhook updates into the dispatcher.
+
+    Args:
+    - dp (Dispatcher): The dispatcher.
+    - bot (Bot): The bot.
+    - path (str): Webhook path. Defaults to `/webhook`.
+    - secret_token (str | None): Expected `X-Telegram-Bot-Api-Secret-Token` header. Defaults to None.
+    - handle_in_background (bool): Answer Telegram before the update is handled. Defaults to True.
+
+    Returns:
+    - web.Application: The application, also serving `HEALTH_PATH` and `METRICS_PATH`.
+    """
+    app = web.Application()
+    app.router.add_get(HEALTH_PATH, health)
+    app.router.add_get(METRICS_PATH, metrics_handler)
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=secret_token,
+        handle_in_background=handle_in_background,
+    ).register(app, path=path)
+    setup_application(app, dp, bot=bot)
+
+    return app
+
+
+def serve_webhook(
+    dp: Dispatcher,
+    bot: Bot,
+    host: str,
+    port: int,
+    path: str,
+    secret_token: str | None,
+    reuse_port: bool,
+    worker: int | None = None,
+    metrics_host: str = "127.0.0.1",
+    metrics_port: int | None = None,
+) -> None:
+    app = create_webhook_app(dp, bot, path, secret_token)
+    if worker is not None:
+        REGISTRY.const_labels["worker"] = str(worker)
+        if metrics_port is not None:
+            worker_port = metrics_port + worker
+
+            async def serve_worker_metrics(app: web.Application) -> AsyncIterator[None]:
+                runner = await start_metrics_server(metrics_host, worker_port)
+                yield
+                await runner.cleanup()
+
+            app.cleanup_ctx.append(serve_worker_metrics)
+
+    web.run_app(
+        app,
+        host=host,
+        port=port,
+        reuse_port=reuse_port,
+        print=None,
+    )
+
+
+def run_webhook(
+    dp: Dispatcher,
+    bot: Bot,
+    url: str,
+    host: str = "127.0.0.1",
+    port: int = 8080,
+    path: str = "/webhook",
+    secret_token: str | None = None,
+    workers: int = 1,
+    metrics_host: str = "127.0.0.1",
+    metrics_port: int | None = None,
+) -> None:
+    """
+    Registers the webhook and serves updates until interrupted.
+
+    With several workers `/metrics` on the shared port returns the metrics of the worker which
+    accepted the connection, so every worker labels its metrics with `worker="<index>"` and also
+    serves them on `metrics_port + index`, Prometheus should scrape all of these ports.
+
+    Args:
+    - dp (Dispatcher): The dispatcher.
+    - bot (Bot): The bot.
+    - url (str): Public base URL Telegram sends updates to, `path` is appended.
+    - host (str): Interface to listen on. Defaults to `127.0.0.1`.
+    - port (int): Port to listen on. Defaults to 8080.
+    - path (str): Webhook path. Defaults to `/webhook`.
+    - secret_token (str | None): Secret token checked on every update. Defaults to None.
+    - workers (int): Number of worker processes sharing the port. Defaults to 1.
+    - metrics_host (str): Interface the workers serve metrics on. Defaults to `127.0.0.1`.
+    - metrics_port (int | None): Metrics port of the first worker, None to serve metrics
+      on the webhook port only. Defaults to None.
+    """
+
+    async def set_webhook() -> None:
+        await bot.set_webhook(url.rstrip("/") + path, secret_token=secret_token)
+        await bot.session.close()
+
+    asyncio.run(set_webhook())
+    logging.info(
+        "Serving webhook on %s:%s%s with %s worker(s)", host, port, path, workers
+    )
+
+    if workers <= 1:
+        serve_webhook(dp, bot, host, port, path, secret_token, reuse_port=False)
+        return
+
+    # Workers inherit the dispatcher and the bot, so they have to be forked
+    context = multiprocessing.get_context("fork")
+    processes = [
+        context.Process(
+            target=serve_webhook,
+            args=(dp, bot, host, port, path, secret_token, True),
+            kwargs={
+                "worker": index,
+                "metrics_host": metrics_host,
+                "metrics_port": metrics_port,
+            },
+            daemon=True,
+        )
+        for index in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
@@ -0,0 +1,71 @@
+"""
+Startup benchmark of the entry points.
+
+Measures wall time of fresh interpreters importing the bot, the query CLI and the core
+modules with the MongoDB driver, and the cumulative import time of their heaviest modules
+(`python -X importtime`).
+
+Usage:
+    python -m benchmarks.bench_cli_startup --repeat 10
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from time import perf_counter
+
+COMMANDS = {
+    "bot (main.py)": ["-c", "import main"],
+    "cli --help": ["-m", "app", "--help"],
+    "cli + driver": ["-c", "import app.__main__, app.main, app.db"],
+}
+
+
+def run(arguments: list[str], importtime: bool = False) -> tuple[float, str]:
+    """Run a fresh interpreter, returns the wall time in seconds and stderr."""
+    environment = {**os.environ, "BOT_TOKEN": os.environ.get("BOT_TOKEN", "42:TEST")}
+    command = [
+        sys.executable,
+        *(["-X", "importtime"] if importtime else []),
+        *arguments,
+    ]
+    started = perf_counter()
+    completed = subprocess.run(
+        command, env=environment, capture_output=True, text=True, check=True
+    )
+    return perf_counter() - started, completed.stderr
+
+
+def get_heaviest_imports(stderr: str, count: int = 3) -> list[tuple[str, int]]:
+    """Get top-level packages with the largest cumulative import time, in microseconds."""
+    packages: dict[str, int] = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        if not name.startswith("  "):
+            packages[name.strip()] = int(cumulative)
+
+    return sorted(packages.items(), key=lambda item: -item[1])[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Entry point startup benchmark")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'command':>16} {'p50, ms':>9} {'min, ms':>9}  heaviest imports, ms")
+    for name, arguments in COMMANDS.items():
+        run(arguments)  # Warm up the bytecode and page caches
+        times = [run(arguments)[0] for _ in range(args.repeat)]
+        heaviest = get_heaviest_imports(run(arguments, importtime=True)[1])
+        print(
+            f"{name:>16} {statistics.median(times) * 1e3:>9.1f} {min(times) * 1e3:>9.1f}  "
+            + ", ".join(f"{module} {micros / 1e3:.1f}" for module, micros in heaviest)
+        )
+
+
+if __name__ == "__main__":
+    main()
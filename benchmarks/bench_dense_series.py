@@ -0,0 +1,60 @@
+"""
+Gap-filling benchmark.
+
+Compares the legacy list-scan gap-fill against `build_dense_series` for a growing
+number of hourly buckets. Half of the buckets are present, the rest are filled.
+
+Usage:
+    python -m benchmarks.bench_dense_series
+"""
+
+from datetime import datetime
+from timeit import timeit
+
+from dateutil.relativedelta import relativedelta
+
+from app.dateutils import get_datetime_range
+from app.series import build_dense_series
+
+DELTA = relativedelta(hours=1)
+START = datetime(2022, 1, 1)
+
+
+def legacy_fill(grouped_records: dict, start: datetime, end: datetime) -> list:
+    dataset = []
+    for date in get_datetime_range(start, end, DELTA):
+        if date in grouped_records["labels"]:
+            dataset.append(
+                grouped_records["dataset"][grouped_records["labels"].index(date)]
+            )
+        else:
+            dataset.append(0)
+    return dataset
+
+
+def main():
+    print(
+        f"{'buckets':>8} {'legacy, ms':>12} {'dense, ms':>12} {'dense, us/bucket':>17}"
+    )
+    for buckets in (500, 1_000, 2_000, 4_000, 8_000, 17_500):
+        end = START + relativedelta(hours=buckets - 1)
+        labels = get_datetime_range(START, end, DELTA)[::2]
+        grouped_records = {"labels": labels, "dataset": list(range(len(labels)))}
+        sparse = dict(zip(labels, grouped_records["dataset"]))
+
+        dense = (
+            timeit(lambda: build_dense_series(sparse, START, end, DELTA), number=3) / 3
+        )
+        legacy = (
+            timeit(lambda: legacy_fill(grouped_records, START, end), number=1)
+            if buckets <= 8_000
+            else float("nan")
+        )
+        print(
+            f"{buckets:>8} {legacy * 1e3:>12.2f} {dense * 1e3:>12.2f} "
+            f"{dense / buckets * 1e6:>17.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
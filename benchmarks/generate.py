@@ -0,0 +1,151 @@
+"""
+Synthetic `salary` data generator.
+
+Usage:
+    python -m benchmarks.generate --rows 10000000 --distribution diurnal
+"""
+
+import argparse
+import asyncio
+import math
+import random
+from collections.abc import Iterator
+from datetime import datetime, timedelta
+from time import perf_counter
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection
+
+DISTRIBUTIONS = ("uniform", "normal", "diurnal")
+
+
+def iter_datetimes(
+    rng: random.Random,
+    rows: int,
+    dt_from: datetime,
+    dt_upto: datetime,
+    distribution: str,
+) -> Iterator[datetime]:
+    """
+    Yields random datetimes within the `[dt_from, dt_upto)` range.
+
+    Args:
+    - rng (random.Random): Random number generator.
+    - rows (int): Number of datetimes.
+    - dt_from (datetime): The start of the range, inclusive.
+    - dt_upto (datetime): The end of the range, exclusive.
+    - distribution (str): `uniform`, `normal` (around the middle of the range) or `diurnal` (busy working hours).
+
+    Yields:
+    - datetime: Random datetime, truncated to seconds.
+    """
+    span = (dt_upto - dt_from).total_seconds()
+    for _ in range(rows):
+        match distribution:
+            case "uniform":
+                offset = rng.random() * span
+            case "normal":
+                offset = min(max(rng.gauss(span / 2, span / 6), 0), span - 1)
+            case "diurnal":
+                # Rejection sampling of a day-periodic density peaking at 15:00
+                while True:
+                    offset = rng.random() * span
+                    hour = (offset / 3600) % 24
+                    if rng.random() < (1 - math.cos((hour - 3) / 24 * 2 * math.pi)) / 2:
+                        break
+            case _:
+                raise ValueError(f"Unknown distribution: {distribution}")
+
+        yield dt_from + timedelta(seconds=int(offset))
+
+
+async def generate(
+    collection: AsyncIOMotorCollection,
+    rows: int,
+    dt_from: datetime,
+    dt_upto: datetime,
+    distribution: str = "uniform",
+    seed: int = 0,
+    batch_size: int = 10_000,
+    parallelism: int = 4,
+) -> float:
+    """
+    Replaces the collection contents with `rows` synthetic `{dt, value}` documents.
+
+    Args:
+    - collection (AsyncIOMotorCollection): Target collection.
+    - rows (int): Number of documents.
+    - dt_from (datetime): The start of the range, inclusive.
+    - dt_upto (datetime): The end of the range, exclusive.
+    - distribution (str): Distribution of `dt`, see `iter_datetimes`. Defaults to `uniform`.
+    - seed (int): Random seed, the same seed generates the same data. Defaults to 0.
+    - batch_size (int): Documents per `insert_many`. Defaults to 10000.
+    - parallelism (int): Concurrent `insert_many` calls. Defaults to 4.
+
+    Returns:
+    - float: Elapsed time in seconds.
+    """
+    started = perf_counter()
+    rng = random.Random(seed)
+    semaphore = asyncio.Semaphore(parallelism)
+    tasks: list[asyncio.Task] = []
+
+    async def insert(documents: list[dict]) -> None:
+        try:
+            await collection.insert_many(documents, ordered=False)
+        finally:
+            semaphore.release()
+
+    await collection.drop()
+
+    batch: list[dict] = []
+    for dt in iter_datetimes(rng, rows, dt_from, dt_upto, distribution):
+        batch.append({"dt": dt, "value": rng.randint(0, 10_000)})
+        if len(batch) == batch_size:
+            await semaphore.acquire()
+            tasks.append(asyncio.ensure_future(insert(batch)))
+            batch = []
+
+    if batch:
+        await semaphore.acquire()
+        tasks.append(asyncio.ensure_future(insert(batch)))
+    await asyncio.gather(*tasks)
+
+    return perf_counter() - started
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Generate synthetic salary data")
+    parser.add_argument("--uri", default="mongodb://localhost:27017/")
+    parser.add_argument("--database", default="benchdb")
+    parser.add_argument("--collection", default="salary")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--dt-from", type=datetime.fromisoformat, default="2020-01-01")
+    parser.add_argument("--dt-upto", type=datetime.fromisoformat, default="2023-01-01")
+    parser.add_argument("--distribution", choices=DISTRIBUTIONS, default="uniform")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--parallelism", type=int, default=4)
+    return parser
+
+
+async def main() -> None:
+    args = get_parser().parse_args()
+    collection = AsyncIOMotorClient(args.uri)[args.database][args.collection]
+
+    elapsed = await generate(
+        collection,
+        rows=args.rows,
+        dt_from=args.dt_from,
+        dt_upto=args.dt_upto,
+        distribution=args.distribution,
+        seed=args.seed,
+        batch_size=args.batch_size,
+        parallelism=args.parallelism,
+    )
+    print(
+        f"Inserted {args.rows} rows in {elapsed:.1f}s ({args.rows / elapsed:.0f} rows/s)"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
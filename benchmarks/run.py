@@ -0,0 +1,167 @@
+"""
+Aggregation path benchmark.
+
+Measures latency of `get_records_within_time_range` for every group type but minute and several range
+widths against a local mongod, broken down into the Mongo aggregation, gap-filling and JSON
+serialization. Fill the collection with `benchmarks.generate` first.
+
+Usage:
+    python -m benchmarks.run --repeat 20 --output results.json
+    python -m benchmarks.run --group-types minute --widths 1d 31d
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import sys
+from datetime import datetime, timedelta, timezone
+from time import perf_counter
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection
+
+from app.types import GroupType
+from app.dateutils import get_exclusive_end
+from app.pipeline import get_timedelta_from_group, aggregate_buckets
+from app.series import build_dense_series
+from app.output import iter_json_fragments
+
+WIDTHS: dict[str, timedelta] = {
+    "1d": timedelta(days=1),
+    "31d": timedelta(days=31),
+    "365d": timedelta(days=365),
+    "730d": timedelta(days=730),
+}
+# `minute` over the widest range is about a million buckets per query and dominates the run, opt in with --group-types
+DEFAULT_GROUP_TYPES = [item for item in GroupType if item is not GroupType.MINUTE]
+STAGES = ("mongo", "fill", "serialize", "total")
+
+
+def percentile(samples: list[float], q: float) -> float:
+    """Get the `q` quantile (0..1) of samples, linearly interpolated."""
+    ordered = sorted(samples)
+    position = (len(ordered) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+async def measure(
+    collection: AsyncIOMotorCollection,
+    dt_from: datetime,
+    dt_upto: datetime,
+    group_type: GroupType,
+) -> dict[str, float]:
+    """Run a single query, return time spent in every stage, in seconds."""
+    started = perf_counter()
+    buckets = await aggregate_buckets(
+        collection, dt_from, get_exclusive_end(dt_upto), group_type
+    )
+    aggregated = perf_counter()
+    result = build_dense_series(
+        buckets, dt_from, dt_upto, get_timedelta_from_group(group_type)
+    )
+    filled = perf_counter()
+    "".join(iter_json_fragments(result))
+    serialized = perf_counter()
+
+    return {
+        "mongo": aggregated - started,
+        "fill": filled - aggregated,
+        "serialize": serialized - filled,
+        "total": serialized - started,
+        "buckets": len(result.labels),
+    }
+
+
+async def run(
+    collection: AsyncIOMotorCollection,
+    dt_from: datetime,
+    repeat: int,
+    widths: list[str],
+    group_types: list[GroupType],
+) -> list[dict]:
+    """Benchmark every `(group_type, width)` combination, return one result per combination."""
+    results = []
+    for group_type in group_types:
+        for width in widths:
+            dt_upto = dt_from + WIDTHS[width] - timedelta(minutes=1)
+            await measure(collection, dt_from, dt_upto, group_type)  # Warm-up
+
+            samples = [
+                await measure(collection, dt_from, dt_upto, group_type)
+                for _ in range(repeat)
+            ]
+            result: dict = {
+                "group_type": str(group_type),
+                "width": width,
+                "buckets": samples[0]["buckets"],
+                "repeat": repeat,
+            }
+            for stage in STAGES:
+                timings = [sample[stage] * 1000 for sample in samples]
+                result[stage] = {
+                    "p50_ms": round(percentile(timings, 0.5), 3),
+                    "p99_ms": round(percentile(timings, 0.99), 3),
+                    "mean_ms": round(statistics.fmean(timings), 3),
+                }
+            results.append(result)
+            print(
+                "{group_type:>5} {width:>5} buckets={buckets:<6} "
+                "p50={p50:.1f}ms p99={p99:.1f}ms".format(
+                    **result,
+                    p50=result["total"]["p50_ms"],
+                    p99=result["total"]["p99_ms"],
+                ),
+                file=sys.stderr,
+            )
+
+    return results
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Benchmark the aggregation path")
+    parser.add_argument("--uri", default="mongodb://localhost:27017/")
+    parser.add_argument("--database", default="benchdb")
+    parser.add_argument("--collection", default="salary")
+    parser.add_argument("--dt-from", type=datetime.fromisoformat, default="2020-01-01")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument(
+        "--widths", nargs="+", choices=list(WIDTHS), default=list(WIDTHS)
+    )
+    parser.add_argument(
+        "--group-types",
+        nargs="+",
+        type=GroupType,
+        default=DEFAULT_GROUP_TYPES,
+        help="defaults to every group type but minute",
+    )
+    parser.add_argument("--output", help="write JSON results into this file")
+    return parser
+
+
+async def main() -> None:
+    args = get_parser().parse_args()
+    collection = AsyncIOMotorClient(args.uri)[args.database][args.collection]
+
+    report = {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "mongo": (await collection.database.command("buildInfo"))["version"],
+        "collection": collection.full_name,
+        "rows": await collection.estimated_document_count(),
+        "results": await run(
+            collection, args.dt_from, args.repeat, args.widths, args.group_types
+        ),
+    }
+
+    if args.output:
+        with open(args.output, "w") as fp:
+            json.dump(report, fp, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
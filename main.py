@@ -1,19 +1,69 @@
+import argparse
 import asyncio
 import logging
-import json
-from os import getenv
+import tempfile
+from collections.abc import Hashable
+from datetime import timedelta
+from functools import partial
+from itertools import chain
+from os import getenv, unlink
+from os.path import exists
 
-from aiogram import Bot, Dispatcher
+from typing import TYPE_CHECKING
+
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.dispatcher.flags import get_flag
 from aiogram.filters import Filter
-from aiogram.types import Message
+from aiogram.types import FSInputFile, Message, TelegramObject
 from aiogram.enums import ParseMode
 from dotenv import load_dotenv
+from pydantic import ValidationError
+
+from app import (
+    get_records_within_time_range,
+    get_metrics_within_time_range,
+    get_batch_records_within_time_range,
+)
+from app.cache import BucketCache
+from app.singleflight import SingleFlight
+from app.output import (
+    iter_json_fragments,
+    iter_json_batch_fragments,
+    iter_text_chunks,
+    write_gzip,
+)
+from app.export import (
+    EXPORT_FILENAMES,
+    get_missing_module,
+    iter_csv_fragments,
+    write_result,
+)
+from app.exceptions import SchedulerBusyError
+from app.schemas import (
+    AggregationQuery,
+    decode_query,
+    decode_query_batch,
+    is_batch,
+    get_invalid_group_type,
+    is_format_error,
+)
+from app.scheduling import FairScheduler
+from app.webhook import run_webhook
+from app.metrics import REGISTRY, start_metrics_server
+from app.slowlog import SLOW_QUERY_LOG
+from app.types import AggregationResult, ExportFormat, GroupType, RangeSpec
+from app.db import (
+    close as close_database,
+    ensure_indexes,
+    get_analytics_database,
+    get_config,
+    get_database,
+    health_check,
+    warm_up,
+)
 
-from app import get_records_within_time_range
-from app.dateutils import parse_datetime, datetime_to_iso
-from app.exceptions import InvlidGroupError
-from app.types import GroupType
-from app.db import database
+if TYPE_CHECKING:
+    from app.columnar import ColumnarStore
 
 load_dotenv()
 logging.basicConfig(level=logging.INFO)
@@ -21,54 +71,300 @@ logging.basicConfig(level=logging.INFO)
 bot = Bot(token=getenv("BOT_TOKEN", ""))
 dp = Dispatcher()
 
+USE_ROLLUPS = getenv("USE_ROLLUPS", "0") == "1"
+AGGREGATION_SLICES = int(getenv("AGGREGATION_SLICES", "1"))
+AGGREGATION_PARALLELISM = int(getenv("AGGREGATION_PARALLELISM", "0")) or None
+# `mongo` aggregates on the server, `numpy` loads the collection into memory on startup
+AGGREGATION_BACKEND = getenv("AGGREGATION_BACKEND", "mongo")
+COLUMNAR_STORE: "ColumnarStore | None" = None
+# Keep the columnar store up to date with change streams or polling, see `app.sync`
+COLUMNAR_SYNC = getenv("COLUMNAR_SYNC", "0") == "1"
+BACKGROUND_TASKS: set[asyncio.Task] = set()
+BUCKET_CACHE = BucketCache(max_size=int(getenv("BUCKET_CACHE_SIZE", "100000")))
+if getenv("SLOW_QUERY_MS"):
+    SLOW_QUERY_LOG.configure(
+        getenv("SLOW_QUERY_LOG", "slow_queries.jsonl"),
+        threshold=int(getenv("SLOW_QUERY_MS", "0")) / 1000,
+    )
+# Identical concurrent queries share a single aggregation
+QUERY_FLIGHTS = SingleFlight()
+SCHEDULER = FairScheduler(
+    max_concurrency=int(getenv("MAX_CONCURRENT_AGGREGATIONS", "8")),
+    per_user_limit=int(getenv("MAX_USER_AGGREGATIONS", "1")),
+    max_queue=int(getenv("MAX_QUEUED_AGGREGATIONS", "100")),
+    max_user_queue=int(getenv("MAX_USER_QUEUED_AGGREGATIONS", "10")),
+)
+# Results longer than this number of messages are sent as a gzipped document
+MAX_RESULT_MESSAGES = int(getenv("MAX_RESULT_MESSAGES", "5"))
 
-class JsonFilter(Filter):
-    def __init__(self) -> None:
-        pass
 
-    async def __call__(self, message: Message) -> bool:
-        try:
-            data = json.loads(str(message.text))
-            return len(data) == 3 and all(
-                key in data for key in ("dt_from", "dt_upto", "group_type")
-            )
-        except json.decoder.JSONDecodeError:
-            return False
+BOT_MESSAGES = REGISTRY.counter(
+    "bot_messages_total",
+    "Handled messages by handler and outcome.",
+    ("handler", "status"),
+)
+BOT_IN_FLIGHT = REGISTRY.gauge(
+    "bot_in_flight_requests", "Aggregation requests in flight."
+)
+BOT_STAGE_SECONDS = REGISTRY.histogram(
+    "bot_stage_seconds", "Time spent delivering results.", ("stage",)
+)
+SCHEDULER_STATS = REGISTRY.gauge(
+    "scheduler_stats",
+    "Aggregation scheduler counters, wait times in seconds.",
+    ("key",),
+)
+QUERY_FLIGHTS_STATS = REGISTRY.gauge(
+    "query_flights_stats", "Coalescing of identical concurrent queries.", ("key",)
+)
+BUCKET_CACHE_STATS = REGISTRY.gauge(
+    "bucket_cache_stats", "Sealed bucket cache counters.", ("key",)
+)
 
 
-@dp.message(JsonFilter())
-async def json_message(message: Message):
-    data = json.loads(str(message.text))
+@REGISTRY.on_collect
+def collect_stats():
+    for gauge, stats in (
+        (SCHEDULER_STATS, SCHEDULER.stats()),
+        (QUERY_FLIGHTS_STATS, QUERY_FLIGHTS.stats()),
+        (BUCKET_CACHE_STATS, BUCKET_CACHE.stats()),
+    ):
+        for key, value in stats.items():
+            gauge.set(value, key=key)
+
+
+async def answer_document(message: Message, write, filename: str):
+    """Send a document written by `write(fp)` in a worker thread."""
+    with tempfile.NamedTemporaryFile(suffix=filename, delete=False) as fp:
+        path = fp.name
+        with BOT_STAGE_SECONDS.time(stage="serialize"):
+            await asyncio.to_thread(write, fp)
 
     try:
-        output = await get_records_within_time_range(
-            collection=database.salary,
-            start_time=parse_datetime(data["dt_from"]),
-            end_time=parse_datetime(data["dt_upto"]),
-            group_type=data["group_type"],
+        with BOT_STAGE_SECONDS.time(stage="answer"):
+            await message.answer_document(FSInputFile(path, filename=filename))
+    finally:
+        unlink(path)
+
+
+async def answer_export(message: Message, result, export_format: ExportFormat):
+    """Send the result as a document in a columnar format, CSV is gzipped."""
+    if export_format == ExportFormat.CSV:
+        await answer_document(
+            message,
+            partial(write_gzip, chunks=iter_text_chunks(iter_csv_fragments(result))),
+            EXPORT_FILENAMES[export_format] + ".gz",
         )
-    except InvlidGroupError as e:
-        await message.answer(
-            "* Неверный тип группировки: '{}'.\nДоступные варианты:\n{}".format(
-                e.group_type, "\n".join([f"- {item}" for item in GroupType.values()])
-            )
+    else:
+        await answer_document(
+            message,
+            partial(write_result, result=result, export_format=export_format),
+            EXPORT_FILENAMES[export_format],
+        )
+
+
+async def answer_chunked(message: Message, fragments, filename: str):
+    """Send small results inline, medium ones as sequential messages and large ones as a document."""
+    chunks = iter_text_chunks(fragments)
+
+    buffered: list[str] = []
+    overflow = False
+    with BOT_STAGE_SECONDS.time(stage="serialize"):
+        for chunk in chunks:
+            buffered.append(chunk)
+            if len(buffered) > MAX_RESULT_MESSAGES:
+                overflow = True
+                break
+
+    if overflow:
+        await answer_document(
+            message, partial(write_gzip, chunks=chain(buffered, chunks)), filename
         )
         return
-    except Exception as e:
-        await message.answer("* Ошибка: `{}`".format(e))
-        return
 
-    result = {
-        "dataset": output.dataset,
-        "labels": [
-            datetime_to_iso(label, drop_timezone=True) for label in output.labels
+    with BOT_STAGE_SECONDS.time(stage="answer"):
+        for chunk in buffered:
+            await message.answer(chunk)
+
+
+def get_flight_key(
+    query: AggregationQuery | None = None,
+    queries: list[AggregationQuery] | None = None,
+) -> Hashable | None:
+    """Get the `QUERY_FLIGHTS` key of the decoded query, None if nothing is aggregated."""
+    if queries is not None:
+        return tuple(queries)
+    if query is not None:
+        # Queries differing only in the format share the aggregation
+        return query.model_copy(update={"format": ExportFormat.JSON})
+    return None
+
+
+class SchedulingMiddleware(BaseMiddleware):
+    """
+    Runs handlers flagged with `aggregation` through the fair scheduler.
+
+    Queries coalesced with an identical one in flight only await its result, so they take no slot.
+    """
+
+    def __init__(self, scheduler: FairScheduler, flights: SingleFlight) -> None:
+        self.scheduler = scheduler
+        self.flights = flights
+
+    async def __call__(self, handler, event: TelegramObject, data: dict):
+        if not isinstance(event, Message) or not get_flag(data, "aggregation"):
+            return await handler(event, data)
+
+        key = get_flight_key(data.get("query"), data.get("queries"))
+        if key is not None and key in self.flights:
+            return await handler(event, data)
+
+        user_id = event.from_user.id if event.from_user else event.chat.id
+        try:
+            await self.scheduler.acquire(user_id)
+        except SchedulerBusyError:
+            BOT_MESSAGES.inc(handler="query", status="rejected")
+            await event.answer("* Сервер перегружен, попробуйте позже.")
+            return
+
+        try:
+            return await handler(event, data)
+        finally:
+            self.scheduler.release(user_id)
+
+
+dp.message.middleware(SchedulingMiddleware(SCHEDULER, QUERY_FLIGHTS))
+
+
+class QueryFilter(Filter):
+    """Decodes the message into `query`, a JSON array into `queries`, or `query_error` if it has invalid values."""
+
+    async def __call__(self, message: Message) -> bool | dict:
+        text = message.text or ""
+        try:
+            if is_batch(text):
+                return {"queries": decode_query_batch(text)}
+            return {"query": decode_query(text)}
+        except ValidationError as e:
+            if is_format_error(e):
+                return False
+            return {"query_error": e}
+
+
+async def aggregate_query(query: AggregationQuery) -> AggregationResult:
+    """Aggregate a single query with the configured backend, rollups, cache and slicing."""
+    collection = get_analytics_database().salary
+    if query.metrics is not None:
+        return await get_metrics_within_time_range(
+            collection=collection,
+            start_time=query.dt_from,
+            end_time=query.dt_upto,
+            group_type=query.group_type,
+            metrics=query.metrics,
+        )
+
+    # Secondaries may lag, so buckets are only cached once every read sees them closed
+    lag = (
+        timedelta(0) if COLUMNAR_STORE is not None else get_config().get_analytics_lag()
+    )
+    return await get_records_within_time_range(
+        collection=collection,
+        start_time=query.dt_from,
+        end_time=query.dt_upto,
+        group_type=query.group_type,
+        use_rollups=USE_ROLLUPS,
+        cache=None if lag is None else BUCKET_CACHE,
+        slices=AGGREGATION_SLICES,
+        parallelism=AGGREGATION_PARALLELISM,
+        backend=None if COLUMNAR_STORE is None else COLUMNAR_STORE.aggregate,
+        seal_delay=lag or timedelta(0),
+    )
+
+
+async def aggregate_queries(queries: list[AggregationQuery]) -> list[AggregationResult]:
+    """Aggregate a batch of queries with a single `$facet` aggregation."""
+    return await get_batch_records_within_time_range(
+        collection=get_analytics_database().salary,
+        specs=[
+            RangeSpec(item.dt_from, item.dt_upto, item.group_type, item.metrics)
+            for item in queries
         ],
-    }
-    await message.answer(json.dumps(result, ensure_ascii=False))
+    )
+
+
+@dp.message(QueryFilter(), flags={"aggregation": True})
+async def json_message(
+    message: Message,
+    query: AggregationQuery | None = None,
+    queries: list[AggregationQuery] | None = None,
+    query_error: ValidationError | None = None,
+):
+    if query_error is not None:
+        group_type = get_invalid_group_type(query_error)
+        if group_type is not None:
+            await message.answer(
+                "* Неверный тип группировки: '{}'.\nДоступные варианты:\n{}\n"
+                "Интервал из нескольких единиц задаётся как '<число>-<единица>', например '15-minute'.".format(
+                    group_type, "\n".join([f"- {item}" for item in GroupType.values()])
+                )
+            )
+        else:
+            await message.answer(
+                "* Неверные значения: {}".format(
+                    ", ".join(
+                        ".".join(str(part) for part in item["loc"]) or "batch"
+                        for item in query_error.errors()
+                    )
+                )
+            )
+        BOT_MESSAGES.inc(handler="query", status="invalid")
+        return
 
+    if queries is not None and any(
+        item.format != ExportFormat.JSON for item in queries
+    ):
+        await message.answer("* Формат ответа задаётся только для одиночных запросов.")
+        BOT_MESSAGES.inc(handler="query", status="invalid")
+        return
+
+    if query is not None and (missing := get_missing_module(query.format)):
+        await message.answer(
+            f"* Формат '{query.format}' недоступен: на сервере не установлен {missing}."
+        )
+        BOT_MESSAGES.inc(handler="query", status="invalid")
+        return
 
-@dp.message(~JsonFilter())
+    with BOT_IN_FLIGHT.track_in_progress():
+        try:
+            if queries is not None:
+                results = await QUERY_FLIGHTS.do(
+                    get_flight_key(queries=queries),
+                    partial(aggregate_queries, queries),
+                )
+                fragments = iter_json_batch_fragments(results)
+            elif query is not None:
+                output = await QUERY_FLIGHTS.do(
+                    get_flight_key(query), partial(aggregate_query, query)
+                )
+                if query.format != ExportFormat.JSON:
+                    await answer_export(message, output, query.format)
+                    BOT_MESSAGES.inc(handler="query", status="ok")
+                    return
+                fragments = iter_json_fragments(output)
+            else:
+                return
+        except Exception as e:
+            BOT_MESSAGES.inc(handler="query", status="error")
+            await message.answer("* Ошибка: `{}`".format(e))
+            return
+
+        await answer_chunked(message, fragments, "result.json.gz")
+        BOT_MESSAGES.inc(handler="query", status="ok")
+
+
+@dp.message()
 async def non_json_message(message: Message):
+    BOT_MESSAGES.inc(handler="example", status="ok")
     example = '{"dt_from": "2022-10-01T00:00:00", "dt_upto": "2022-11-30T23:59:00", "group_type": "day"}'
     await message.answer(
         f"* Неверный формат входных данных.\n\n<b>Пример</b>:\n<pre>{example}</pre>",
@@ -76,9 +372,123 @@ async def non_json_message(message: Message):
     )
 
 
-async def main():
+@dp.startup()
+async def on_startup():
+    global COLUMNAR_STORE
+
+    await warm_up()
+    logging.info("MongoDB health: %s", await health_check())
+    database = get_database()
+    await ensure_indexes(database)
+    if AGGREGATION_BACKEND == "numpy":
+        from app.columnar import ColumnarStore
+        from app.snapshot import get_snapshot_age, open_snapshot, save_snapshot
+
+        # Workers and restarts share the page-cached snapshot instead of reading MongoDB
+        snapshot = getenv("COLUMNAR_SNAPSHOT", "")
+        snapshot_max_age = float(getenv("COLUMNAR_SNAPSHOT_MAX_AGE", "0"))
+        if COLUMNAR_SYNC:
+            from pymongo.errors import OperationFailure
+
+            from app.sync import CollectionSync, enable_pre_images
+
+            # Without pre-images every update or delete reloads the whole store
+            try:
+                await enable_pre_images(database.salary)
+            except OperationFailure as e:
+                logging.warning(
+                    "Pre-images are not enabled, updates and deletes reload the columnar store: %s",
+                    e,
+                )
+
+            sync = CollectionSync(
+                database.salary, ColumnarStore.empty(), BUCKET_CACHE, snapshot or None
+            )
+            if sync.has_state and snapshot and exists(snapshot):
+                # The mapped store closes the mapping once the first change is applied
+                sync.store = open_snapshot(snapshot)
+            else:
+                await sync.bootstrap()
+            COLUMNAR_STORE = sync.store
+            BACKGROUND_TASKS.add(asyncio.create_task(sync.run()))
+        elif (
+            snapshot
+            and exists(snapshot)
+            and (not snapshot_max_age or get_snapshot_age(snapshot) <= snapshot_max_age)
+        ):
+            logging.info(
+                "Serving columnar snapshot %s written %.0fs ago without sync",
+                snapshot,
+                get_snapshot_age(snapshot),
+            )
+            COLUMNAR_STORE = open_snapshot(snapshot)
+        else:
+            if snapshot and exists(snapshot):
+                logging.warning(
+                    "Columnar snapshot %s is older than %ss, reloading it from MongoDB",
+                    snapshot,
+                    snapshot_max_age,
+                )
+            COLUMNAR_STORE = await ColumnarStore.load(database.salary)
+            if snapshot:
+                save_snapshot(snapshot, COLUMNAR_STORE)
+                COLUMNAR_STORE = open_snapshot(snapshot)
+        logging.info("Loaded %s documents into the columnar store", len(COLUMNAR_STORE))
+
+
+@dp.shutdown()
+async def on_shutdown() -> None:
+    for task in BACKGROUND_TASKS:
+        task.cancel()
+    await asyncio.gather(*BACKGROUND_TASKS, return_exceptions=True)
+    if COLUMNAR_STORE is not None:
+        COLUMNAR_STORE.close()
+    close_database()
+
+
+async def run_polling():
+    metrics_port = getenv("METRICS_PORT", "9100")
+    if metrics_port:
+        await start_metrics_server(
+            getenv("METRICS_HOST", "127.0.0.1"), int(metrics_port)
+        )
     await dp.start_polling(bot)
 
 
+def main():
+    parser = argparse.ArgumentParser(description="RLT salary aggregation bot")
+    parser.add_argument(
+        "--webhook",
+        action="store_true",
+        default=getenv("BOT_MODE", "polling") == "webhook",
+        help="serve updates through a webhook instead of long polling",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(getenv("WEBHOOK_WORKERS", "1")),
+        help="number of webhook worker processes",
+    )
+    args = parser.parse_args()
+    metrics_port = getenv("METRICS_PORT", "9100")
+
+    if not args.webhook:
+        asyncio.run(run_polling())
+        return
+
+    run_webhook(
+        dp,
+        bot,
+        url=getenv("WEBHOOK_URL", ""),
+        host=getenv("WEBHOOK_HOST", "127.0.0.1"),
+        port=int(getenv("WEBHOOK_PORT", "8080")),
+        path=getenv("WEBHOOK_PATH", "/webhook"),
+        secret_token=getenv("WEBHOOK_SECRET") or None,
+        workers=args.workers,
+        metrics_host=getenv("METRICS_HOST", "127.0.0.1"),
+        metrics_port=int(metrics_port) if metrics_port else None,
+    )
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    main()
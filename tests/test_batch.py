@@ -0,0 +1,98 @@
+import unittest
+from datetime import datetime
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.main import get_batch_records_within_time_range
+from app.pipeline import get_union_match, merge_time_ranges
+
+from .shared import process_input
+
+
+class UnionMatchTestCase(unittest.TestCase):
+    def test_merges_overlapping_ranges(self):
+        self.assertEqual(
+            merge_time_ranges(
+                [
+                    (datetime(2022, 10, 1), datetime(2022, 11, 1)),
+                    (datetime(2022, 2, 1), datetime(2022, 2, 2)),
+                    (datetime(2022, 9, 1), datetime(2022, 10, 15)),
+                    (datetime(2022, 11, 1), datetime(2022, 12, 1)),
+                    (datetime(2022, 5, 1), datetime(2022, 5, 1)),
+                ]
+            ),
+            [
+                (datetime(2022, 2, 1), datetime(2022, 2, 2)),
+                (datetime(2022, 9, 1), datetime(2022, 12, 1)),
+            ],
+        )
+
+    def test_single_range(self):
+        self.assertEqual(
+            get_union_match(
+                [
+                    (datetime(2022, 9, 1), datetime(2022, 10, 1)),
+                    (datetime(2022, 9, 15), datetime(2022, 11, 1)),
+                ]
+            ),
+            {
+                "$match": {
+                    "dt": {"$gte": datetime(2022, 9, 1), "$lt": datetime(2022, 11, 1)}
+                }
+            },
+        )
+
+    def test_disjoint_ranges(self):
+        match = get_union_match(
+            [
+                (datetime(2022, 2, 1), datetime(2022, 2, 2)),
+                (datetime(2022, 9, 1), datetime(2022, 10, 1)),
+            ]
+        )
+
+        self.assertEqual(len(match["$match"]["$or"]), 2)
+
+
+class BatchTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        client = AsyncIOMotorClient("mongodb://localhost:27017/")
+        self.database = client.testdb
+        self.collection = self.database.salary
+
+    async def test_matches_single_queries(self):
+        inputs = [
+            {
+                "dt_from": "2022-09-01T00:00:00",
+                "dt_upto": "2022-12-31T23:59:00",
+                "group_type": "month",
+            },
+            {
+                "dt_from": "2022-10-01T00:00:00",
+                "dt_upto": "2022-11-30T23:59:00",
+                "group_type": "day",
+            },
+            {
+                "dt_from": "2022-02-01T00:00:00",
+                "dt_upto": "2022-02-02T00:00:00",
+                "group_type": "hour",
+            },
+        ]
+
+        results = await get_batch_records_within_time_range(
+            self.collection,
+            [(item["dt_from"], item["dt_upto"], item["group_type"]) for item in inputs],
+        )
+
+        for input_data, result in zip(inputs, results):
+            expected_result = await process_input(self.collection, input_data)
+            self.assertEqual(result.dataset, expected_result["dataset"])
+            self.assertEqual(len(result.labels), len(expected_result["labels"]))
+
+    async def test_empty_batch(self):
+        self.assertEqual(
+            await get_batch_records_within_time_range(self.collection, []), []
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,30 @@
+import os
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+os.environ.setdefault("BOT_TOKEN", "42:TEST")
+
+import main  # noqa: E402
+from app.columnar import ColumnarStore  # noqa: E402
+
+
+class ShutdownTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_in_memory_store_is_closed(self):
+        store = ColumnarStore(
+            np.array([0, 1], dtype=np.int64), np.array([1.0, 2.0]), integer=False
+        )
+
+        with (
+            patch.object(main, "COLUMNAR_STORE", store),
+            patch.object(main, "close_database") as close_database,
+        ):
+            await main.on_shutdown()
+
+        self.assertEqual(len(store), 0)
+        close_database.assert_called_once_with()
+
+
+if __name__ == "__main__":
+    unittest.main()
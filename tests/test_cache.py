@@ -0,0 +1,121 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+
+from dateutil.relativedelta import relativedelta
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.types import GroupType
+from app.cache import BucketCache, aggregate_buckets_with_cache
+
+
+class BucketCacheTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        client = AsyncIOMotorClient("mongodb://localhost:27017/")
+        self.collection = client.testdb.salary
+        self.cache = BucketCache(max_size=10)
+        self.spans: list[tuple[datetime, datetime]] = []
+
+    async def aggregate(self, collection, dt_from, dt_upto, group_type):
+        self.spans.append((dt_from, dt_upto))
+        return {
+            datetime(2022, month, 1): month
+            for month in range(9, 13)
+            if datetime(2022, month, 1) < dt_upto
+            and dt_from < datetime(2022, month, 1) + relativedelta(months=1)
+        }
+
+    async def query(self, dt_from: datetime, dt_upto: datetime):
+        return await aggregate_buckets_with_cache(
+            self.cache,
+            self.collection,
+            dt_from,
+            dt_upto,
+            GroupType.MONTH,
+            self.aggregate,
+        )
+
+    async def test_sealed_buckets_are_cached(self):
+        first = await self.query(datetime(2022, 9, 1), datetime(2023, 1, 1))
+        second = await self.query(datetime(2022, 9, 1), datetime(2023, 1, 1))
+
+        self.assertEqual(first, second)
+        self.assertEqual(self.spans, [(datetime(2022, 9, 1), datetime(2023, 1, 1))])
+        self.assertEqual(self.cache.stats(), {"size": 4, "hits": 4, "misses": 4})
+
+    async def test_partial_bucket_is_not_cached(self):
+        await self.query(datetime(2022, 9, 1), datetime(2022, 12, 15))
+        await self.query(datetime(2022, 9, 1), datetime(2022, 12, 15))
+
+        self.assertEqual(
+            self.spans,
+            [
+                (datetime(2022, 9, 1), datetime(2022, 12, 15)),
+                (datetime(2022, 12, 1), datetime(2022, 12, 15)),
+            ],
+        )
+
+    async def test_unaligned_start(self):
+        first = await self.query(datetime(2022, 9, 15, 12), datetime(2023, 1, 1))
+        second = await self.query(datetime(2022, 9, 20), datetime(2023, 1, 1))
+
+        self.assertEqual(first, second)
+        self.assertEqual(
+            self.spans,
+            [
+                (datetime(2022, 9, 15, 12), datetime(2023, 1, 1)),
+                (datetime(2022, 9, 20), datetime(2022, 10, 1)),
+            ],
+        )
+        self.assertEqual(self.cache.stats()["size"], 3)
+
+    async def test_aware_range(self):
+        moscow = timezone(timedelta(hours=3))
+        aware = await self.query(
+            datetime(2022, 9, 1, tzinfo=timezone.utc),
+            datetime(2023, 1, 1, 3, tzinfo=moscow),
+        )
+        naive = await self.query(datetime(2022, 9, 1), datetime(2023, 1, 1))
+
+        self.assertEqual(aware, naive)
+        self.assertEqual(self.spans, [(datetime(2022, 9, 1), datetime(2023, 1, 1))])
+        self.assertEqual(self.cache.stats(), {"size": 4, "hits": 4, "misses": 4})
+
+    async def test_seal_delay(self):
+        hour = datetime.now(timezone.utc).replace(
+            tzinfo=None, minute=0, second=0, microsecond=0
+        )
+
+        await aggregate_buckets_with_cache(
+            self.cache,
+            self.collection,
+            hour - timedelta(hours=3),
+            hour,
+            GroupType.HOUR,
+            self.aggregate,
+            seal_delay=timedelta(hours=2),
+        )
+
+        self.assertEqual(self.cache.stats()["size"], 1)
+
+    async def test_invalidate(self):
+        await self.query(datetime(2022, 9, 1), datetime(2023, 1, 1))
+
+        dropped = self.cache.invalidate(
+            self.collection.full_name, datetime(2022, 10, 15), datetime(2022, 10, 16)
+        )
+        await self.query(datetime(2022, 9, 1), datetime(2023, 1, 1))
+
+        self.assertEqual(dropped, 1)
+        self.assertEqual(self.spans[-1], (datetime(2022, 10, 1), datetime(2022, 11, 1)))
+
+    def test_lru_eviction(self):
+        cache = BucketCache(max_size=2)
+        for day in (1, 2, 3):
+            cache.put(("testdb.salary", "day", datetime(2022, 1, day)), day)
+
+        self.assertIsNone(cache.get(("testdb.salary", "day", datetime(2022, 1, 1))))
+        self.assertEqual(cache.get(("testdb.salary", "day", datetime(2022, 1, 3))), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import asyncio
+import json
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+from app.__main__ import iter_results, parse_range_spec
+from app.types import GroupSpec, GroupType, MetricSpec, MetricType, RangeSpec
+
+
+def make_query(day: int, group_type: str = "hour") -> str:
+    return json.dumps(
+        {
+            "dt_from": f"2022-09-{day:02}T00:00:00",
+            "dt_upto": f"2022-09-{day:02}T23:59:00",
+            "group_type": group_type,
+        }
+    )
+
+
+class CliTestCase(unittest.TestCase):
+    def test_parse_range_spec(self):
+        self.assertEqual(
+            parse_range_spec(
+                '{"dt_from": "2022-09-01T00:00:00", "dt_upto": "2022-09-30T23:59:00", '
+                '"group_type": "6-hour", "metrics": ["sum", "p95"]}'
+            ),
+            RangeSpec(
+                datetime(2022, 9, 1),
+                datetime(2022, 9, 30, 23, 59),
+                GroupSpec(GroupType.HOUR, 6),
+                (MetricSpec(MetricType.SUM), MetricSpec(MetricType.PERCENTILE, 95)),
+            ),
+        )
+
+    def test_parse_range_spec_errors(self):
+        for source in (
+            "[]",
+            '{"dt_from": "2022-09-01T00:00:00"}',
+            make_query(1)[:-1] + ', "extra": 1}',
+            make_query(1, "weekk"),
+            make_query(1)[:-1] + ', "metrics": "sum"}',
+            make_query(1)[:-1] + ', "format": "csv"}',
+        ):
+            with self.subTest(source=source), self.assertRaises(ValueError):
+                parse_range_spec(source)
+
+    def test_results_keep_input_order(self):
+        running = 0
+        max_running = 0
+
+        async def run_query(spec, collection, use_rollups=False):
+            nonlocal running, max_running
+            running += 1
+            max_running = max(max_running, running)
+            # Later queries finish first
+            await asyncio.sleep((31 - spec.dt_from.day) / 1000)
+            running -= 1
+            return str(spec.dt_from.day)
+
+        async def collect(lines):
+            return [item async for item in iter_results(lines, workers=3)]
+
+        lines = [make_query(day) for day in range(1, 11)]
+        lines.insert(5, "not a query")
+        with patch("app.__main__.run_query", run_query):
+            results = asyncio.run(collect(lines))
+
+        self.assertEqual(
+            [line for ok, line in results if ok], [str(day) for day in range(1, 11)]
+        )
+        self.assertFalse(results[5][0])
+        self.assertIn("error", json.loads(results[5][1]))
+        self.assertEqual(max_running, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import random
+import unittest
+from datetime import datetime, timedelta
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.main import get_records_within_time_range
+from app.columnar import ColumnarStore
+from app.dateutils import truncate_datetime
+
+
+def aggregate_reference(documents, dt_from, dt_upto, group_type):
+    buckets = {}
+    for dt, value in documents:
+        if dt_from <= dt < dt_upto:
+            label = truncate_datetime(dt, group_type)
+            buckets[label] = buckets.get(label, 0) + value
+    return buckets
+
+
+class ColumnarStoreTestCase(unittest.TestCase):
+    def setUp(self):
+        generator = random.Random(1)
+        start = datetime(2022, 1, 1)
+        self.documents = [
+            (
+                start + timedelta(minutes=generator.randrange(60 * 24 * 365)),
+                generator.randrange(10_000),
+            )
+            for _ in range(5_000)
+        ]
+        self.store = ColumnarStore.from_documents(*zip(*self.documents))
+
+    def test_matches_reference(self):
+        for dt_from, dt_upto, group_type in (
+            (datetime(2022, 1, 1), datetime(2023, 1, 1), "month"),
+            (datetime(2022, 3, 15, 7, 30), datetime(2022, 5, 2), "day"),
+            (datetime(2022, 2, 1), datetime(2022, 2, 3, 0, 0, 0, 1000), "hour"),
+            (datetime(2022, 6, 1), datetime(2022, 6, 8), "6-hour"),
+            (datetime(2022, 1, 1), datetime(2023, 1, 1), "week"),
+        ):
+            self.assertEqual(
+                self.store.aggregate_buckets(dt_from, dt_upto, group_type),
+                aggregate_reference(self.documents, dt_from, dt_upto, group_type),
+                group_type,
+            )
+
+    def test_empty_range(self):
+        self.assertEqual(
+            self.store.aggregate_buckets(
+                datetime(1990, 1, 1), datetime(1990, 2, 1), "day"
+            ),
+            {},
+        )
+
+    def test_float_values(self):
+        store = ColumnarStore.from_documents(
+            [datetime(2022, 1, 1, 1), datetime(2022, 1, 1, 2)], [1, 0.5]
+        )
+
+        self.assertEqual(
+            store.aggregate_buckets(datetime(2022, 1, 1), datetime(2022, 1, 2), "day"),
+            {datetime(2022, 1, 1): 1.5},
+        )
+
+
+class ColumnarParityTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        client = AsyncIOMotorClient("mongodb://localhost:27017/")
+        self.database = client.testdb
+        self.collection = self.database.salary
+
+    async def test_matches_mongo(self):
+        store = await ColumnarStore.load(self.collection)
+
+        for input_data in (
+            ("2022-09-01T00:00:00", "2022-12-31T23:59:00", "month"),
+            ("2022-10-01T00:00:00", "2022-11-30T23:59:00", "day"),
+            ("2022-02-01T00:00:00", "2022-02-02T00:00:00", "hour"),
+        ):
+            self.assertEqual(
+                await get_records_within_time_range(
+                    self.collection, *input_data, backend=store.aggregate
+                ),
+                await get_records_within_time_range(self.collection, *input_data),
+                input_data,
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
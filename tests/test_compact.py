@@ -0,0 +1,115 @@
+import unittest
+from datetime import datetime, timedelta
+
+from dateutil.relativedelta import relativedelta
+
+from app.compact import LabelGrid, ValueArray
+from app.dateutils import datetime_to_iso, get_datetime_range
+
+
+class ValueArrayTestCase(unittest.TestCase):
+    def test_storage(self):
+        self.assertEqual(ValueArray([1, 0, 3]).typecode, "q")
+        self.assertEqual(ValueArray([1.5, 0.0]).typecode, "d")
+        self.assertIsNone(ValueArray([1.5, 0]).typecode)
+        self.assertIsNone(ValueArray([None, 1]).typecode)
+        self.assertIsNone(ValueArray([2**70]).typecode)
+
+    def test_equal_to_lists(self):
+        values = ValueArray([0, 10, 0, 30])
+
+        self.assertEqual(values, [0, 10, 0, 30])
+        self.assertEqual([0, 10, 0, 30], values)
+        self.assertNotEqual(values, [0, 10, 0])
+        self.assertEqual(values[1:3], [10, 0])
+        self.assertEqual(values[-1], 30)
+
+    def test_values_are_kept(self):
+        values = [0, 1.5, None]
+
+        self.assertEqual(
+            [type(value) for value in ValueArray(values)], [int, float, type(None)]
+        )
+
+
+class LabelGridTestCase(unittest.TestCase):
+    def assert_matches_range(self, start, end, delta):
+        expected = get_datetime_range(start, end, delta)
+        grid = LabelGrid.from_range(start, end, delta)
+
+        self.assertEqual(len(grid), len(expected))
+        self.assertEqual(grid, expected)
+        self.assertEqual(list(grid), expected)
+        self.assertEqual(
+            list(grid.iter_isoformat()),
+            [datetime_to_iso(label, drop_timezone=True) for label in expected],
+        )
+        if expected:
+            self.assertEqual(grid[-1], expected[-1])
+            self.assertEqual(grid[len(expected) // 2], expected[len(expected) // 2])
+
+    def test_fixed_steps(self):
+        for delta in (
+            relativedelta(minutes=15),
+            relativedelta(hours=1),
+            relativedelta(hours=6),
+            relativedelta(days=1),
+            relativedelta(weeks=1),
+        ):
+            with self.subTest(delta=delta):
+                self.assert_matches_range(
+                    datetime(2022, 2, 27, 13, 45), datetime(2022, 3, 15), delta
+                )
+
+    def test_month_steps_are_cumulative(self):
+        # Jan 31 -> Feb 28 -> Mar 28, not Mar 31
+        self.assert_matches_range(
+            datetime(2022, 1, 31), datetime(2022, 12, 31), relativedelta(months=1)
+        )
+        self.assert_matches_range(
+            datetime(2020, 1, 1), datetime(2023, 6, 1), relativedelta(months=3)
+        )
+
+    def test_microseconds(self):
+        self.assert_matches_range(
+            datetime(2022, 1, 1, 0, 0, 0, 500),
+            datetime(2022, 1, 1, 3),
+            relativedelta(hours=1),
+        )
+
+    def test_empty(self):
+        grid = LabelGrid.from_range(
+            datetime(2022, 2, 1), datetime(2022, 1, 1), relativedelta(days=1)
+        )
+
+        self.assertEqual(grid, [])
+        self.assertEqual(list(grid.iter_isoformat()), [])
+        with self.assertRaises(IndexError):
+            grid[0]
+
+    def test_grids_equal_by_labels(self):
+        start = datetime(2022, 1, 1)
+
+        self.assertEqual(
+            LabelGrid(start, relativedelta(hours=24), 3),
+            LabelGrid(start, timedelta(days=1), 3),
+        )
+        self.assertEqual(
+            LabelGrid(start, relativedelta(hours=1), 1),
+            LabelGrid(start, relativedelta(days=1), 1),
+        )
+        self.assertNotEqual(
+            LabelGrid(start, relativedelta(hours=1), 2),
+            LabelGrid(start, relativedelta(days=1), 2),
+        )
+
+    def test_sequence_methods(self):
+        grid = LabelGrid(datetime(2022, 1, 1), timedelta(days=1), 3)
+
+        self.assertEqual(grid.size, 3)
+        self.assertEqual(grid.count(datetime(2022, 1, 2)), 1)
+        self.assertEqual(grid.index(datetime(2022, 1, 3)), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
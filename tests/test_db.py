@@ -0,0 +1,99 @@
+import asyncio
+import os
+import unittest
+from datetime import timedelta
+from unittest.mock import patch
+
+from pymongo.read_preferences import ReadPreference
+
+import app.db as db
+from app.db import DatabaseConfig
+
+
+class DatabaseConfigTestCase(unittest.TestCase):
+    def test_from_env(self):
+        environ = {
+            "DATABASE_URI": "mongodb://db:27017/",
+            "DATABASE_NAME": "salaries",
+            "MONGO_MAX_POOL_SIZE": "20",
+            "MONGO_MIN_POOL_SIZE": "",
+            "MONGO_COMPRESSORS": "zlib",
+            "ANALYTICS_READ_PREFERENCE": "secondaryPreferred",
+            "ANALYTICS_MAX_STALENESS": "120",
+        }
+        with patch.dict(os.environ, environ):
+            config = DatabaseConfig.from_env()
+
+        self.assertEqual(config.uri, "mongodb://db:27017/")
+        self.assertEqual(config.database, "salaries")
+        self.assertEqual(
+            config.get_client_options(), {"maxPoolSize": 20, "compressors": "zlib"}
+        )
+        mode = config.get_analytics_read_preference()
+        self.assertEqual(mode.mode, ReadPreference.SECONDARY_PREFERRED.mode)
+        self.assertEqual(mode.max_staleness, 120)
+
+    def test_read_preference(self):
+        self.assertIs(
+            DatabaseConfig().get_analytics_read_preference(), ReadPreference.PRIMARY
+        )
+        with self.assertRaises(ValueError):
+            DatabaseConfig(
+                analytics_read_preference="secondaries"
+            ).get_analytics_read_preference()
+
+    def test_max_staleness(self):
+        with patch.dict(os.environ, {"ANALYTICS_MAX_STALENESS": "0"}):
+            with self.assertRaises(ValueError):
+                DatabaseConfig.from_env()
+        with self.assertRaises(ValueError):
+            DatabaseConfig(analytics_max_staleness=89)
+
+        self.assertEqual(DatabaseConfig().get_analytics_lag(), timedelta(0))
+        self.assertIsNone(
+            DatabaseConfig(analytics_read_preference="secondary").get_analytics_lag()
+        )
+        config = DatabaseConfig(
+            analytics_read_preference="nearest", analytics_max_staleness=120
+        )
+        self.assertEqual(config.get_analytics_lag(), timedelta(seconds=120))
+        self.assertEqual(config.get_analytics_read_preference().max_staleness, 120)
+
+
+class ClientTestCase(unittest.TestCase):
+    def setUp(self):
+        db.configure(DatabaseConfig(database="salaries", max_pool_size=7))
+        self.addCleanup(db.configure, DatabaseConfig.from_env())
+
+    def test_client_per_event_loop(self):
+        async def get_clients():
+            return db.get_client(), db.get_client()
+
+        first, same = asyncio.run(get_clients())
+        second, _ = asyncio.run(get_clients())
+
+        self.assertIs(first, same)
+        self.assertIsNot(first, second)
+        self.assertEqual(first.options.pool_options.max_pool_size, 7)
+
+    def test_databases(self):
+        async def get_databases():
+            return db.get_database(), db.get_analytics_database(), db.database
+
+        database, analytics, legacy = asyncio.run(get_databases())
+
+        self.assertEqual(database.name, "salaries")
+        self.assertEqual(analytics.name, "salaries")
+        self.assertEqual(legacy, database)
+
+    def test_close(self):
+        async def close():
+            client = db.get_client()
+            db.close()
+            return client is db.get_client()
+
+        self.assertFalse(asyncio.run(close()))
+
+
+if __name__ == "__main__":
+    unittest.main()
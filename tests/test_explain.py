@@ -0,0 +1,44 @@
+import unittest
+
+from app.explain import get_plan_stages
+
+
+class PlanStagesTestCase(unittest.TestCase):
+    def test_covered_plan(self):
+        explain = {
+            "queryPlanner": {
+                "winningPlan": {
+                    "queryPlan": {
+                        "stage": "GROUP",
+                        "inputStage": {
+                            "stage": "PROJECTION_COVERED",
+                            "inputStage": {
+                                "stage": "IXSCAN",
+                                "indexName": "dt_1_value_1",
+                            },
+                        },
+                    }
+                },
+                "rejectedPlans": [
+                    {"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}}
+                ],
+            }
+        }
+
+        self.assertEqual(
+            get_plan_stages(explain), ["GROUP", "PROJECTION_COVERED", "IXSCAN"]
+        )
+
+    def test_pipeline_explain(self):
+        explain = {
+            "stages": [
+                {"$cursor": {"queryPlanner": {"winningPlan": {"stage": "COLLSCAN"}}}},
+                {"$group": {"_id": None}},
+            ]
+        }
+
+        self.assertEqual(get_plan_stages(explain), ["COLLSCAN"])
+
+
+if __name__ == "__main__":
+    unittest.main()
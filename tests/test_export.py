@@ -0,0 +1,127 @@
+import csv
+import io
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+from dateutil.relativedelta import relativedelta
+
+from app.export import (
+    get_label_encoding,
+    get_missing_module,
+    iter_csv_fragments,
+    load_npz_labels,
+    write_result,
+)
+from app.output import iter_json_fragments
+from app.series import build_dense_metric_series, build_dense_series
+from app.types import AggregationResult, ExportFormat, MetricSpec
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # type: ignore[assignment]
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+
+class ExportTestCase(unittest.TestCase):
+    def setUp(self):
+        self.result = build_dense_series(
+            buckets={datetime(2022, 2, 1, 1): 10, datetime(2022, 2, 1, 3): 30},
+            start_datetime=datetime(2022, 2, 1),
+            end_datetime=datetime(2022, 2, 1, 3, 59),
+            delta=relativedelta(hours=1),
+        )
+        self.metrics_result = build_dense_metric_series(
+            buckets={datetime(2022, 3, 1): {"sum": 3, "p95": 2.5}},
+            start_datetime=datetime(2022, 1, 1),
+            end_datetime=datetime(2022, 5, 1),
+            delta=relativedelta(months=1),
+            metrics=[MetricSpec.parse("sum"), MetricSpec.parse("p95")],
+        )
+
+    def export(self, result: AggregationResult, export_format: ExportFormat):
+        fp = io.BytesIO()
+        write_result(fp, result, export_format)
+        fp.seek(0)
+        return fp
+
+    def test_label_encoding(self):
+        self.assertEqual(
+            get_label_encoding(self.result.labels),
+            {
+                "start": datetime(2022, 2, 1),
+                "step_ms": 3_600_000,
+                "step_months": 0,
+                "count": 4,
+            },
+        )
+        self.assertEqual(
+            get_label_encoding(self.metrics_result.labels)["step_months"], 1
+        )
+        self.assertIsNone(get_label_encoding([datetime(2022, 2, 1)]))
+
+    def test_json(self):
+        self.assertEqual(
+            self.export(self.result, ExportFormat.JSON).read().decode(),
+            "".join(iter_json_fragments(self.result)),
+        )
+
+    def test_csv(self):
+        rows = list(csv.reader(iter_csv_fragments(self.metrics_result)))
+
+        self.assertEqual(rows[0], ["label", "sum", "p95"])
+        self.assertEqual(rows[3], ["2022-03-01T00:00:00", "3", "2.5"])
+        self.assertEqual(rows[4], ["2022-04-01T00:00:00", "0", ""])
+        self.assertEqual(len(rows), 6)
+
+    def test_invalid_format(self):
+        with self.assertRaises(ValueError):
+            write_result(io.BytesIO(), self.result, "xlsx")
+
+    def test_missing_module(self):
+        get_missing_module.cache_clear()
+        self.addCleanup(get_missing_module.cache_clear)
+
+        with patch("app.export.find_spec", return_value=None):
+            self.assertEqual(get_missing_module(ExportFormat.ARROW), "pyarrow")
+            self.assertEqual(get_missing_module("npz"), "numpy")
+            self.assertIsNone(get_missing_module(ExportFormat.CSV))
+
+    @unittest.skipIf(np is None, "numpy is not installed")
+    def test_npz(self):
+        for result in (
+            self.result,
+            self.metrics_result,
+            AggregationResult([1, 2], [datetime(2022, 1, 1), datetime(2022, 1, 5)]),
+        ):
+            arrays = np.load(self.export(result, ExportFormat.NPZ))
+
+            self.assertEqual(load_npz_labels(arrays), list(result.labels))
+            for name, values in (result.series or {"dataset": result.dataset}).items():
+                np.testing.assert_array_equal(
+                    arrays[name], np.array(values, dtype=np.float64)
+                )
+        self.assertEqual(
+            np.load(self.export(self.result, ExportFormat.NPZ))["dataset"].dtype,
+            np.int64,
+        )
+
+    @unittest.skipIf(pa is None, "pyarrow is not installed")
+    def test_arrow(self):
+        table = pa.ipc.open_stream(
+            self.export(self.metrics_result, ExportFormat.ARROW)
+        ).read_all()
+
+        self.assertEqual(table.column_names, ["sum", "p95"])
+        self.assertEqual(table.column("sum").to_pylist(), [0, 0, 3, 0, 0])
+        self.assertEqual(table.column("p95").to_pylist(), [None, None, 2.5, None, None])
+        self.assertEqual(table.schema.metadata[b"labels_step_months"], b"1")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+from datetime import datetime
+
+from dateutil.relativedelta import relativedelta
+
+from app.types import GroupSpec, GroupType
+from app.exceptions import InvlidGroupError
+from app.dateutils import truncate_datetime
+from app.pipeline import get_mongo_group, get_timedelta_from_group
+
+
+class GroupSpecTestCase(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual(GroupSpec.parse("day"), GroupSpec(GroupType.DAY))
+        self.assertEqual(GroupSpec.parse("15-minute"), GroupSpec(GroupType.MINUTE, 15))
+        self.assertEqual(str(GroupSpec.parse("15-minute")), "15-minute")
+        self.assertEqual(str(GroupSpec.parse("1-day")), "day")
+
+    def test_parse_invalid(self):
+        for value in ("century", "0-hour", "-day", "x-day", "6-", None):
+            with self.assertRaises(InvlidGroupError):
+                GroupSpec.parse(value)
+
+    def test_mongo_group(self):
+        self.assertEqual(
+            get_mongo_group("2-week"),
+            {
+                "$dateTrunc": {
+                    "date": "$dt",
+                    "unit": "week",
+                    "binSize": 2,
+                    "timezone": "UTC",
+                    "startOfWeek": "monday",
+                }
+            },
+        )
+
+    def test_timedelta(self):
+        self.assertEqual(get_timedelta_from_group("quarter"), relativedelta(months=3))
+        self.assertEqual(get_timedelta_from_group("6-hour"), relativedelta(hours=6))
+
+
+class TruncateDatetimeTestCase(unittest.TestCase):
+    def test_truncate(self):
+        source = datetime(2024, 5, 17, 13, 47, 12, 5)
+        expected = {
+            "year": datetime(2024, 1, 1),
+            "quarter": datetime(2024, 4, 1),
+            "2-month": datetime(2024, 5, 1),
+            "week": datetime(2024, 5, 13),
+            "2-week": datetime(2024, 5, 6),
+            "day": datetime(2024, 5, 17),
+            "6-hour": datetime(2024, 5, 17, 12),
+            "15-minute": datetime(2024, 5, 17, 13, 45),
+        }
+
+        for group_type, truncated in expected.items():
+            self.assertEqual(
+                truncate_datetime(source, group_type), truncated, group_type
+            )
+
+    def test_bins_before_reference(self):
+        self.assertEqual(
+            truncate_datetime(datetime(1999, 12, 31, 23), "5-hour"),
+            datetime(1999, 12, 31, 19),
+        )
+        self.assertEqual(
+            truncate_datetime(datetime(1999, 11, 15), "quarter"), datetime(1999, 10, 1)
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+import asyncio
+import gzip
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+import bson
+from bson import ObjectId, json_util
+from pymongo.errors import BulkWriteError
+
+from app.loader import (
+    convert_document,
+    get_dump_format,
+    iter_documents,
+    load_documents,
+    open_dump,
+)
+
+
+class FakeInsertResult:
+    def __init__(self, inserted_ids: list):
+        self.inserted_ids = inserted_ids
+
+
+class FakeCollection:
+    """Collection stub rejecting documents with already inserted `_id`s, as a unique index does."""
+
+    def __init__(self):
+        self.documents: dict = {}
+
+    async def insert_many(self, documents: list[dict], ordered: bool = True):
+        await asyncio.sleep(0)
+        inserted, errors = [], []
+        for index, document in enumerate(documents):
+            if document["_id"] in self.documents:
+                errors.append({"index": index, "code": 11000})
+            else:
+                self.documents[document["_id"]] = document
+                inserted.append(document["_id"])
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "nInserted": len(inserted)})
+        return FakeInsertResult(inserted)
+
+
+class LoaderTestCase(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.documents = [
+            {"_id": ObjectId(), "dt": datetime(2022, 1, 1, hour), "value": hour * 10}
+            for hour in range(24)
+        ]
+
+    def test_get_dump_format(self):
+        self.assertEqual(get_dump_format("salary.bson"), "bson")
+        self.assertEqual(get_dump_format("salary.bson.gz"), "bson")
+        self.assertEqual(get_dump_format("salary.jsonl"), "jsonl")
+        with self.assertRaises(ValueError):
+            get_dump_format("salary.csv")
+
+    def test_convert_document(self):
+        self.assertEqual(
+            convert_document({"dt": "2022-01-01T03:00:00+03:00", "value": "15"}),
+            {"dt": datetime(2022, 1, 1), "value": 15},
+        )
+        self.assertEqual(
+            convert_document({"dt": datetime(2022, 1, 1), "value": "1.5"})["value"],
+            1.5,
+        )
+        self.assertIsNone(convert_document({"dt": "yesterday", "value": 1}))
+        self.assertIsNone(convert_document({"dt": datetime(2022, 1, 1)}))
+        self.assertIsNone(convert_document({"dt": datetime(2022, 1, 1), "value": None}))
+
+    def test_iter_bson_documents(self):
+        path = os.path.join(self.directory, "salary.bson.gz")
+        with gzip.open(path, "wb") as fp:
+            for document in self.documents:
+                fp.write(bson.encode(document))
+
+        with open_dump(path) as fp:
+            self.assertEqual(list(iter_documents(fp, "bson")), self.documents)
+
+    def test_iter_jsonl_documents(self):
+        path = os.path.join(self.directory, "salary.jsonl")
+        with open(path, "w") as fp:
+            for document in self.documents:
+                fp.write(json_util.dumps(document) + "\n\n")
+
+        with open_dump(path) as fp:
+            self.assertEqual(list(iter_documents(fp, "jsonl")), self.documents)
+
+    def test_load_documents(self):
+        collection = FakeCollection()
+        documents = [*self.documents, {"dt": "invalid", "value": 1}, self.documents[0]]
+
+        stats = asyncio.run(
+            load_documents(collection, documents, batch_size=5, parallelism=3)
+        )
+
+        self.assertEqual(stats.rows, len(self.documents))
+        self.assertEqual(stats.duplicates, 1)
+        self.assertEqual(stats.skipped, 1)
+        self.assertEqual(len(collection.documents), len(self.documents))
+
+    def test_load_documents_raises_write_errors(self):
+        class FailingCollection:
+            async def insert_many(self, documents, ordered=True):
+                raise BulkWriteError({"writeErrors": [{"index": 0, "code": 121}]})
+
+        with self.assertRaises(BulkWriteError):
+            asyncio.run(load_documents(FailingCollection(), self.documents))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+from datetime import datetime
+
+from app.types import MetricSpec, MetricType
+from app.exceptions import InvalidMetricError
+from app.pipeline import get_metrics_pipeline, get_mongo_match
+
+
+class MetricSpecTestCase(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual(MetricSpec.parse("avg"), MetricSpec(MetricType.AVG))
+        self.assertEqual(
+            MetricSpec.parse("p99.9"), MetricSpec(MetricType.PERCENTILE, 99.9)
+        )
+        self.assertEqual(str(MetricSpec.parse("p95")), "p95")
+        self.assertEqual(MetricSpec.parse("p99.9").field, "p99_9")
+
+    def test_parse_invalid(self):
+        for value in ("median", "percentile", "p0", "p100", "p-5", "p 5", None):
+            with self.assertRaises(InvalidMetricError):
+                MetricSpec.parse(value)
+
+
+class MetricsPipelineTestCase(unittest.TestCase):
+    def test_single_group_stage(self):
+        metrics = [MetricSpec.parse(metric) for metric in ("sum", "count", "p50")]
+        pipeline = get_metrics_pipeline(
+            get_mongo_match(datetime(2022, 1, 1), datetime(2022, 2, 1)), "day", metrics
+        )
+
+        self.assertEqual(pipeline[1]["$group"]["sum"], {"$sum": "$value"})
+        self.assertEqual(pipeline[1]["$group"]["count"], {"$sum": 1})
+        self.assertEqual(
+            pipeline[1]["$group"]["p50"],
+            {"$percentile": {"input": "$value", "p": [0.5], "method": "approximate"}},
+        )
+        self.assertEqual(pipeline[2], {"$set": {"p50": {"$arrayElemAt": ["$p50", 0]}}})
+        self.assertEqual(pipeline[-1], {"$sort": {"_id": 1}})
+
+    def test_no_percentiles(self):
+        metrics = [MetricSpec.parse(metric) for metric in ("min", "max")]
+        pipeline = get_metrics_pipeline(
+            get_mongo_match(datetime(2022, 1, 1), datetime(2022, 2, 1)), "day", metrics
+        )
+
+        self.assertEqual(
+            [next(iter(stage)) for stage in pipeline], ["$match", "$group", "$sort"]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import threading
+import unittest
+
+from app.metrics import Metric, MetricsRegistry, get_group_label
+from app.types import GroupSpec, GroupType
+
+
+class MetricsRegistryTestCase(unittest.TestCase):
+    def test_counter_and_gauge(self):
+        registry = MetricsRegistry()
+        messages = registry.counter("messages_total", "Messages.", ("status",))
+        in_flight = registry.gauge("in_flight", "In flight.")
+
+        messages.inc(status="ok")
+        messages.inc(2, status="ok")
+        with in_flight.track_in_progress():
+            rendered = registry.render()
+
+        self.assertIn('messages_total{status="ok"} 3', rendered)
+        self.assertIn("# TYPE messages_total counter", rendered)
+        self.assertIn("in_flight 1", rendered)
+        self.assertIn("in_flight 0", registry.render())
+
+    def test_histogram(self):
+        registry = MetricsRegistry()
+        latency = registry.histogram(
+            "latency_seconds", "Latency.", ("stage",), (0.1, 1.0)
+        )
+
+        for value in (0.05, 0.5, 5.0):
+            latency.observe(value, stage="mongo")
+        rendered = registry.render().splitlines()
+
+        self.assertIn('latency_seconds_bucket{stage="mongo",le="0.1"} 1', rendered)
+        self.assertIn('latency_seconds_bucket{stage="mongo",le="1.0"} 2', rendered)
+        self.assertIn('latency_seconds_bucket{stage="mongo",le="+Inf"} 3', rendered)
+        self.assertIn('latency_seconds_count{stage="mongo"} 3', rendered)
+        self.assertIn('latency_seconds_sum{stage="mongo"} 5.55', rendered)
+
+    def test_collectors(self):
+        registry = MetricsRegistry()
+        queued = registry.gauge("queued", "Queued.")
+        registry.on_collect(lambda: queued.set(7))
+
+        self.assertIn("queued 7", registry.render())
+
+    def test_const_labels(self):
+        registry = MetricsRegistry()
+        messages = registry.counter("messages_total", "Messages.", ("status",))
+        latency = registry.histogram("latency_seconds", "Latency.", (), (1.0,))
+        registry.const_labels["worker"] = "2"
+
+        messages.inc(status="ok")
+        latency.observe(0.5)
+        rendered = registry.render().splitlines()
+
+        self.assertIn('messages_total{status="ok",worker="2"} 1', rendered)
+        self.assertIn('latency_seconds_bucket{worker="2",le="1.0"} 1', rendered)
+        self.assertIn('latency_seconds_count{worker="2"} 1', rendered)
+
+    def test_metric_requires_samples(self):
+        class Incomplete(Metric):
+            pass
+
+        with self.assertRaises(TypeError):
+            Incomplete("incomplete", "Incomplete.")
+
+    def test_group_label_is_the_unit(self):
+        self.assertEqual(get_group_label("day"), "day")
+        self.assertEqual(get_group_label("15-minute"), "minute")
+        self.assertEqual(get_group_label(GroupSpec(GroupType.HOUR, 6)), "hour")
+
+    def test_concurrent_updates(self):
+        registry = MetricsRegistry()
+        commands = registry.counter("commands_total", "Commands.")
+        latency = registry.histogram("latency_seconds", "Latency.")
+
+        def record():
+            for _ in range(10_000):
+                commands.inc()
+                latency.observe(0.01)
+
+        threads = [threading.Thread(target=record) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        rendered = registry.render().splitlines()
+
+        self.assertIn("commands_total 40000", rendered)
+        self.assertIn("latency_seconds_count 40000", rendered)
+
+
+if __name__ == "__main__":
+    unittest.main()
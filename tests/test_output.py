@@ -0,0 +1,82 @@
+import gzip
+import io
+import json
+import unittest
+from datetime import datetime
+
+from app.types import AggregationResult
+from app.output import (
+    iter_json_fragments,
+    iter_json_batch_fragments,
+    iter_text_chunks,
+    write_gzip,
+)
+
+
+class OutputTestCase(unittest.TestCase):
+    def setUp(self):
+        self.result = AggregationResult(
+            dataset=[8177, 0, 4868.5],
+            labels=[datetime(2022, 2, 1, hour) for hour in range(3)],
+        )
+        self.expected = json.dumps(
+            {
+                "dataset": [8177, 0, 4868.5],
+                "labels": [
+                    "2022-02-01T00:00:00",
+                    "2022-02-01T01:00:00",
+                    "2022-02-01T02:00:00",
+                ],
+            },
+            ensure_ascii=False,
+        )
+
+    def test_fragments_match_json_dumps(self):
+        self.assertEqual("".join(iter_json_fragments(self.result)), self.expected)
+
+    def test_empty_result(self):
+        result = AggregationResult(dataset=[], labels=[])
+
+        self.assertEqual(
+            "".join(iter_json_fragments(result)), '{"dataset": [], "labels": []}'
+        )
+
+    def test_series(self):
+        result = AggregationResult(
+            dataset=[1, 0],
+            labels=[datetime(2022, 2, 1), datetime(2022, 2, 2)],
+            series={"sum": [1, 0], "p95": [0.5, None]},
+        )
+
+        self.assertEqual(
+            "".join(iter_json_fragments(result)),
+            json.dumps(
+                {
+                    "dataset": [1, 0],
+                    "labels": ["2022-02-01T00:00:00", "2022-02-02T00:00:00"],
+                    "series": {"sum": [1, 0], "p95": [0.5, None]},
+                }
+            ),
+        )
+
+    def test_batch(self):
+        self.assertEqual(
+            "".join(iter_json_batch_fragments([self.result, self.result])),
+            f"[{self.expected}, {self.expected}]",
+        )
+
+    def test_chunks_respect_limit(self):
+        chunks = list(iter_text_chunks(iter_json_fragments(self.result), limit=16))
+
+        self.assertTrue(all(len(chunk) <= 16 for chunk in chunks))
+        self.assertEqual("".join(chunks), self.expected)
+
+    def test_gzip(self):
+        fp = io.BytesIO()
+        write_gzip(fp, iter_text_chunks(iter_json_fragments(self.result), limit=16))
+
+        self.assertEqual(gzip.decompress(fp.getvalue()).decode(), self.expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
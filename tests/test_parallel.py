@@ -0,0 +1,57 @@
+import unittest
+from datetime import datetime
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.types import GroupType
+from app.parallel import split_time_range, aggregate_buckets_in_slices
+
+
+class SplitTimeRangeTestCase(unittest.IsolatedAsyncioTestCase):
+    def test_slices_are_bucket_aligned(self):
+        slices = split_time_range(
+            datetime(2022, 9, 15), datetime(2023, 1, 1), GroupType.MONTH, 2
+        )
+
+        self.assertEqual(
+            slices,
+            [
+                (datetime(2022, 9, 15), datetime(2022, 11, 1)),
+                (datetime(2022, 11, 1), datetime(2023, 1, 1)),
+            ],
+        )
+
+    def test_slices_are_limited_by_buckets(self):
+        slices = split_time_range(
+            datetime(2022, 2, 1), datetime(2022, 2, 1, 2), GroupType.HOUR, 8
+        )
+
+        self.assertEqual(
+            slices,
+            [
+                (datetime(2022, 2, 1, 0), datetime(2022, 2, 1, 1)),
+                (datetime(2022, 2, 1, 1), datetime(2022, 2, 1, 2)),
+            ],
+        )
+
+    async def test_partials_are_merged(self):
+        collection = AsyncIOMotorClient("mongodb://localhost:27017/").testdb.salary
+
+        async def aggregate(collection, dt_from, dt_upto, group_type):
+            return {dt_from: 1}
+
+        buckets = await aggregate_buckets_in_slices(
+            collection,
+            datetime(2022, 1, 1),
+            datetime(2022, 1, 5),
+            GroupType.DAY,
+            slices=4,
+            parallelism=2,
+            aggregate=aggregate,
+        )
+
+        self.assertEqual(buckets, {datetime(2022, 1, day): 1 for day in range(1, 5)})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+from datetime import datetime
+
+from app.types import GroupType
+from app.rollup import get_rollup_levels, plan_rollup_segments
+
+
+class RollupPlanTestCase(unittest.TestCase):
+    def test_levels(self):
+        self.assertEqual(
+            get_rollup_levels(GroupType.YEAR),
+            (GroupType.MONTH, GroupType.DAY, GroupType.HOUR),
+        )
+        self.assertEqual(get_rollup_levels(GroupType.HOUR), (GroupType.HOUR,))
+        self.assertEqual(
+            get_rollup_levels(GroupType.WEEK), (GroupType.DAY, GroupType.HOUR)
+        )
+        self.assertEqual(get_rollup_levels("6-hour"), (GroupType.HOUR,))
+        self.assertEqual(get_rollup_levels("15-minute"), ())
+
+    def test_whole_months(self):
+        segments = plan_rollup_segments(
+            datetime(2022, 9, 1),
+            datetime(2023, 1, 1),
+            get_rollup_levels(GroupType.MONTH),
+        )
+
+        self.assertEqual(
+            segments, [(GroupType.MONTH, datetime(2022, 9, 1), datetime(2023, 1, 1))]
+        )
+
+    def test_partial_edges(self):
+        segments = plan_rollup_segments(
+            datetime(2022, 9, 1),
+            datetime(2022, 12, 31, 23, 59, 0, 1000),
+            get_rollup_levels(GroupType.MONTH),
+        )
+
+        self.assertEqual(
+            segments,
+            [
+                (GroupType.MONTH, datetime(2022, 9, 1), datetime(2022, 12, 1)),
+                (GroupType.DAY, datetime(2022, 12, 1), datetime(2022, 12, 31)),
+                (GroupType.HOUR, datetime(2022, 12, 31), datetime(2022, 12, 31, 23)),
+                (
+                    None,
+                    datetime(2022, 12, 31, 23),
+                    datetime(2022, 12, 31, 23, 59, 0, 1000),
+                ),
+            ],
+        )
+
+    def test_short_range_is_raw(self):
+        segments = plan_rollup_segments(
+            datetime(2022, 2, 1, 10, 15),
+            datetime(2022, 2, 1, 10, 45),
+            get_rollup_levels(GroupType.HOUR),
+        )
+
+        self.assertEqual(
+            segments,
+            [(None, datetime(2022, 2, 1, 10, 15), datetime(2022, 2, 1, 10, 45))],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,166 @@
+import asyncio
+import unittest
+
+from app.exceptions import SchedulerBusyError
+from app.scheduling import FairScheduler
+
+
+class FairSchedulerTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_per_user_limit(self):
+        scheduler = FairScheduler(max_concurrency=4, per_user_limit=1, max_queue=10)
+        order: list[str] = []
+
+        async def request(user_id: int, name: str):
+            async with scheduler.slot(user_id):
+                order.append(name)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(request(1, "a1"), request(1, "a2"), request(2, "b1"))
+
+        self.assertEqual(order, ["a1", "b1", "a2"])
+        self.assertEqual(scheduler.stats()["running"], 0)
+        self.assertEqual(scheduler.stats()["queued"], 0)
+
+    async def test_round_robin_between_users(self):
+        scheduler = FairScheduler(max_concurrency=1, per_user_limit=1, max_queue=10)
+        order: list[str] = []
+
+        async def request(user_id: int, name: str):
+            async with scheduler.slot(user_id):
+                order.append(name)
+                await asyncio.sleep(0)
+
+        await asyncio.gather(
+            request(1, "a1"),
+            request(1, "a2"),
+            request(1, "a3"),
+            request(2, "b1"),
+            request(3, "c1"),
+        )
+
+        self.assertEqual(order, ["a1", "a2", "b1", "c1", "a3"])
+
+    async def test_busy_when_queue_is_full(self):
+        scheduler = FairScheduler(max_concurrency=1, per_user_limit=1, max_queue=1)
+        await scheduler.acquire(1)
+        waiting = asyncio.ensure_future(scheduler.acquire(2))
+        await asyncio.sleep(0)
+
+        with self.assertRaises(SchedulerBusyError):
+            await scheduler.acquire(3)
+
+        scheduler.release(1)
+        await waiting
+        scheduler.release(2)
+        self.assertEqual(scheduler.stats()["rejected"], 1)
+
+    async def test_busy_when_user_queue_is_full(self):
+        scheduler = FairScheduler(
+            max_concurrency=1, per_user_limit=1, max_queue=10, max_user_queue=2
+        )
+        await scheduler.acquire(1)
+        waiting = [asyncio.ensure_future(scheduler.acquire(1)) for _ in range(2)]
+        await asyncio.sleep(0)
+
+        with self.assertRaises(SchedulerBusyError):
+            await scheduler.acquire(1)
+        other = asyncio.ensure_future(scheduler.acquire(2))
+        await asyncio.sleep(0)
+
+        self.assertEqual(scheduler.stats()["queued"], 3)
+        for task in [*waiting, other]:
+            task.cancel()
+        await asyncio.gather(*waiting, other, return_exceptions=True)
+        scheduler.release(1)
+
+    async def test_heaviest_user_is_rejected_when_queue_is_full(self):
+        scheduler = FairScheduler(max_concurrency=1, per_user_limit=1, max_queue=3)
+        await scheduler.acquire(1)
+        flood = [asyncio.ensure_future(scheduler.acquire(1)) for _ in range(3)]
+        await asyncio.sleep(0)
+
+        other = asyncio.ensure_future(scheduler.acquire(2))
+        await asyncio.sleep(0)
+
+        with self.assertRaises(SchedulerBusyError):
+            await flood[2]
+        self.assertFalse(flood[0].done())
+        self.assertEqual(scheduler.stats()["queued"], 3)
+
+        scheduler.release(1)
+        await flood[0]
+        scheduler.release(1)
+        await other
+        scheduler.release(2)
+        await flood[1]
+        scheduler.release(1)
+        self.assertEqual(scheduler.stats()["running"], 0)
+        self.assertEqual(scheduler.stats()["rejected"], 1)
+
+    async def test_cancelled_waiter_leaves_queue(self):
+        scheduler = FairScheduler(max_concurrency=1, per_user_limit=1, max_queue=1)
+        await scheduler.acquire(1)
+        waiting = asyncio.ensure_future(scheduler.acquire(2))
+        await asyncio.sleep(0)
+
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        scheduler.release(1)
+
+        self.assertEqual(scheduler.stats()["queued"], 0)
+        self.assertEqual(scheduler.stats()["running"], 0)
+
+    async def test_release_after_waiter_is_cancelled(self):
+        scheduler = FairScheduler(max_concurrency=1, per_user_limit=1, max_queue=10)
+        await scheduler.acquire(1)
+        waiting = asyncio.ensure_future(scheduler.acquire(2))
+        await asyncio.sleep(0)
+
+        # The slot is freed before the cancelled request gets to run
+        waiting.cancel()
+        scheduler.release(1)
+        await asyncio.gather(waiting, return_exceptions=True)
+
+        self.assertTrue(waiting.cancelled())
+        self.assertEqual(scheduler.stats()["queued"], 0)
+        self.assertEqual(scheduler.stats()["running"], 0)
+        await asyncio.wait_for(scheduler.acquire(3), 1)
+        scheduler.release(3)
+
+    async def test_granted_slot_is_returned_when_cancelled(self):
+        scheduler = FairScheduler(max_concurrency=1, per_user_limit=1, max_queue=10)
+        await scheduler.acquire(1)
+        waiting = asyncio.ensure_future(scheduler.acquire(2))
+        await asyncio.sleep(0)
+
+        # The slot is granted before the request gets to run
+        scheduler.release(1)
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+
+        self.assertEqual(scheduler.stats()["running"], 0)
+
+    async def test_evict_skips_cancelled_waiter(self):
+        scheduler = FairScheduler(max_concurrency=1, per_user_limit=1, max_queue=2)
+        await scheduler.acquire(1)
+        flood = [asyncio.ensure_future(scheduler.acquire(1)) for _ in range(2)]
+        await asyncio.sleep(0)
+
+        # The new request evicts the cancelled one before it gets to run
+        other = asyncio.ensure_future(scheduler.acquire(2))
+        flood[1].cancel()
+        await asyncio.gather(flood[1], return_exceptions=True)
+
+        self.assertTrue(flood[1].cancelled())
+        self.assertEqual(scheduler.stats()["rejected"], 0)
+        self.assertEqual(scheduler.stats()["queued"], 2)
+        for user_id in (1, 1):
+            scheduler.release(user_id)
+            await asyncio.sleep(0)
+        await other
+        scheduler.release(2)
+        self.assertEqual(scheduler.stats()["running"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+import unittest
+from datetime import datetime
+
+from pydantic import ValidationError
+
+from app.types import ExportFormat, GroupSpec, GroupType
+from app.schemas import (
+    decode_query,
+    decode_query_batch,
+    get_invalid_group_type,
+    is_batch,
+    is_format_error,
+)
+
+
+class DecodeQueryTestCase(unittest.TestCase):
+    def test_valid_query(self):
+        query = decode_query(
+            '{"dt_from": "2022-09-01T00:00:00", "dt_upto": "2022-12-31T23:59:00", "group_type": "month"}'
+        )
+
+        self.assertEqual(query.dt_from, datetime(2022, 9, 1))
+        self.assertEqual(query.dt_upto, datetime(2022, 12, 31, 23, 59))
+        self.assertEqual(query.group_type, GroupSpec(GroupType.MONTH))
+
+    def test_aware_datetimes_are_naive_utc(self):
+        query = decode_query(
+            '{"dt_from": "2022-09-01T00:00:00Z", "dt_upto": "2022-12-31T23:59:00+03:00", "group_type": "month"}'
+        )
+
+        self.assertEqual(query.dt_from, datetime(2022, 9, 1))
+        self.assertIsNone(query.dt_from.tzinfo)
+        self.assertEqual(query.dt_upto, datetime(2022, 12, 31, 20, 59))
+        self.assertIsNone(query.dt_upto.tzinfo)
+
+    def test_bin_size(self):
+        query = decode_query(
+            '{"dt_from": "2022-09-01T00:00:00", "dt_upto": "2022-09-02T00:00:00", "group_type": "6-hour"}'
+        )
+
+        self.assertEqual(query.group_type, GroupSpec(GroupType.HOUR, 6))
+
+    def test_export_format(self):
+        source = '{"dt_from": "2022-09-01T00:00:00", "dt_upto": "2022-09-02T00:00:00", "group_type": "day"'
+
+        self.assertEqual(decode_query(source + "}").format, ExportFormat.JSON)
+        self.assertEqual(
+            decode_query(source + ', "format": "csv"}').format, ExportFormat.CSV
+        )
+        with self.assertRaises(ValidationError) as context:
+            decode_query(source + ', "format": "xlsx"}')
+        self.assertFalse(is_format_error(context.exception))
+        self.assertIsNone(get_invalid_group_type(context.exception))
+
+    def test_format_errors(self):
+        for source in (
+            "hello",
+            "[1, 2, 3]",
+            '{"dt_from": "2022-09-01T00:00:00"}',
+            '{"dt_from": "2022-09-01T00:00:00", "dt_upto": "2022-12-31T23:59:00", "group_type": "month", "x": 1}',
+        ):
+            with self.assertRaises(ValidationError) as context:
+                decode_query(source)
+            self.assertTrue(is_format_error(context.exception), source)
+
+    def test_invalid_values(self):
+        with self.assertRaises(ValidationError) as context:
+            decode_query(
+                '{"dt_from": "2022-09-01T00:00:00", "dt_upto": "not a date", "group_type": "century"}'
+            )
+
+        self.assertFalse(is_format_error(context.exception))
+        self.assertEqual(get_invalid_group_type(context.exception), "century")
+
+
+class DecodeQueryBatchTestCase(unittest.TestCase):
+    def test_valid_batch(self):
+        source = '[{"dt_from": "2022-09-01T00:00:00", "dt_upto": "2022-12-31T23:59:00", "group_type": "month"}, {"dt_from": "2022-10-01T00:00:00", "dt_upto": "2022-11-30T23:59:00", "group_type": "day"}]'
+
+        queries = decode_query_batch(source)
+
+        self.assertTrue(is_batch(" " + source))
+        self.assertEqual([str(query.group_type) for query in queries], ["month", "day"])
+
+    def test_format_errors(self):
+        for source in ("[]", "[1, 2, 3]", "[{}]"):
+            with self.assertRaises(ValidationError) as context:
+                decode_query_batch(source)
+            self.assertTrue(is_format_error(context.exception), source)
+
+    def test_invalid_group_type(self):
+        with self.assertRaises(ValidationError) as context:
+            decode_query_batch(
+                '[{"dt_from": "2022-09-01T00:00:00", "dt_upto": "2022-12-31T23:59:00", "group_type": "century"}]'
+            )
+
+        self.assertFalse(is_format_error(context.exception))
+        self.assertEqual(get_invalid_group_type(context.exception), "century")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+from datetime import datetime
+
+from dateutil.relativedelta import relativedelta
+
+from app.types import MetricSpec
+from app.series import build_dense_series, build_dense_metric_series
+
+
+class DenseSeriesTestCase(unittest.TestCase):
+    def test_fills_missing_buckets(self):
+        result = build_dense_series(
+            buckets={datetime(2022, 2, 1, 1): 10, datetime(2022, 2, 1, 3): 30},
+            start_datetime=datetime(2022, 2, 1),
+            end_datetime=datetime(2022, 2, 1, 3, 59),
+            delta=relativedelta(hours=1),
+        )
+
+        self.assertEqual(result.dataset, [0, 10, 0, 30])
+        self.assertEqual(
+            result.labels,
+            [
+                datetime(2022, 2, 1, 0),
+                datetime(2022, 2, 1, 1),
+                datetime(2022, 2, 1, 2),
+                datetime(2022, 2, 1, 3),
+            ],
+        )
+
+    def test_ignores_buckets_outside_range(self):
+        result = build_dense_series(
+            buckets={datetime(2021, 12, 1): 1, datetime(2022, 1, 1): 2},
+            start_datetime=datetime(2022, 1, 1),
+            end_datetime=datetime(2022, 2, 1),
+            delta=relativedelta(months=1),
+        )
+
+        self.assertEqual(result.dataset, [2, 0])
+
+
+class DenseMetricSeriesTestCase(unittest.TestCase):
+    def test_fills_missing_buckets_per_metric(self):
+        metrics = [MetricSpec.parse(metric) for metric in ("count", "avg", "p95")]
+        result = build_dense_metric_series(
+            buckets={datetime(2022, 2, 1, 1): {"count": 2, "avg": 5.5, "p95": 9}},
+            start_datetime=datetime(2022, 2, 1),
+            end_datetime=datetime(2022, 2, 1, 2),
+            delta=relativedelta(hours=1),
+            metrics=metrics,
+        )
+
+        self.assertEqual(
+            result.series,
+            {"count": [0, 2, 0], "avg": [None, 5.5, None], "p95": [None, 9, None]},
+        )
+        self.assertEqual(result.dataset, [0, 2, 0])
+        self.assertEqual(len(result.labels), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import asyncio
+import unittest
+
+from app.singleflight import SingleFlight
+
+
+class SingleFlightTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_identical_calls_are_coalesced(self):
+        flights = SingleFlight()
+        calls = 0
+
+        async def query():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return [1, 2, 3]
+
+        results = await asyncio.gather(*(flights.do("key", query) for _ in range(5)))
+
+        self.assertEqual(results, [[1, 2, 3]] * 5)
+        self.assertEqual(calls, 1)
+        self.assertEqual(
+            flights.stats(), {"in_flight": 0, "executions": 1, "coalesced": 4}
+        )
+
+    async def test_contains_calls_in_flight(self):
+        flights = SingleFlight()
+        started = asyncio.Event()
+
+        async def query():
+            started.set()
+            await asyncio.sleep(0.01)
+
+        task = asyncio.ensure_future(flights.do("key", query))
+        await started.wait()
+
+        self.assertIn("key", flights)
+        await task
+        self.assertNotIn("key", flights)
+
+    async def test_completed_calls_are_not_cached(self):
+        flights = SingleFlight()
+
+        async def query():
+            return object()
+
+        first = await flights.do("key", query)
+        second = await flights.do("key", query)
+
+        self.assertIsNot(first, second)
+
+    async def test_exception_is_shared(self):
+        flights = SingleFlight()
+
+        async def query():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        results = await asyncio.gather(
+            flights.do("key", query), flights.do("key", query), return_exceptions=True
+        )
+
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+
+    async def test_cancelled_caller_does_not_cancel_others(self):
+        flights = SingleFlight()
+
+        async def query():
+            await asyncio.sleep(0.01)
+            return 42
+
+        first = asyncio.ensure_future(flights.do("key", query))
+        second = asyncio.ensure_future(flights.do("key", query))
+        await asyncio.sleep(0)
+        first.cancel()
+
+        self.assertEqual(await second, 42)
+
+
+if __name__ == "__main__":
+    unittest.main()
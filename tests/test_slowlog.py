@@ -0,0 +1,67 @@
+import json
+import tempfile
+import unittest
+from datetime import datetime
+from pathlib import Path
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.slowlog import SlowQueryLog, find_key
+
+
+class SlowQueryLogTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        client = AsyncIOMotorClient(
+            "mongodb://localhost:27017/", serverSelectionTimeoutMS=100
+        )
+        self.collection = client.testdb.salary
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = Path(self.directory.name) / "slow.jsonl"
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    async def test_fast_queries_are_skipped(self):
+        log = SlowQueryLog()
+        log.configure(str(self.path), threshold=1.0)
+
+        log.submit(self.collection, [], {}, elapsed=0.5, result_size=0)
+        await log.drain()
+
+        self.assertFalse(self.path.exists() and self.path.read_text())
+
+    async def test_slow_query_is_written(self):
+        log = SlowQueryLog()
+        log.configure(str(self.path), threshold=1.0)
+        pipeline = [{"$match": {"dt": {"$gte": datetime(2022, 9, 1)}}}]
+
+        log.submit(
+            self.collection, pipeline, {"group_type": "day"}, elapsed=1.5, result_size=3
+        )
+        await log.drain()
+
+        entry = json.loads(self.path.read_text().splitlines()[0])
+        self.assertEqual(entry["collection"], "testdb.salary")
+        self.assertEqual(entry["elapsed_ms"], 1500)
+        self.assertEqual(entry["params"], {"group_type": "day"})
+        self.assertEqual(entry["result_size"], 3)
+        self.assertEqual(
+            entry["pipeline"][0]["$match"]["dt"]["$gte"],
+            {"$date": "2022-09-01T00:00:00Z"},
+        )
+        self.assertIn("explain", entry)
+
+    def test_find_key(self):
+        explain = {
+            "stages": [
+                {"$cursor": {"executionStats": {"totalDocsExamined": 10}}},
+                {"$group": {}},
+            ]
+        }
+
+        self.assertEqual(find_key(explain, "executionStats"), {"totalDocsExamined": 10})
+        self.assertIsNone(find_key(explain, "winningPlan"))
+
+
+if __name__ == "__main__":
+    unittest.main()
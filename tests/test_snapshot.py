@@ -0,0 +1,103 @@
+import os
+import random
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from app.columnar import ColumnarStore
+from app.snapshot import (
+    SnapshotError,
+    get_snapshot_age,
+    open_snapshot,
+    save_snapshot,
+)
+
+
+class SnapshotTestCase(unittest.TestCase):
+    def setUp(self):
+        generator = random.Random(1)
+        start = datetime(2022, 1, 1)
+        self.store = ColumnarStore.from_documents(
+            [
+                start + timedelta(minutes=generator.randrange(60 * 24 * 90))
+                for _ in range(2_000)
+            ],
+            [generator.randrange(10_000) for _ in range(2_000)],
+        )
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "salary.columns")
+
+    def open(self, day_index: bool):
+        save_snapshot(self.path, self.store, day_index=day_index)
+        store = open_snapshot(self.path)
+        self.addCleanup(store.close)
+        return store
+
+    def test_roundtrip(self):
+        for day_index in (True, False):
+            store = self.open(day_index)
+
+            np.testing.assert_array_equal(store.dt, self.store.dt)
+            np.testing.assert_array_equal(store.value, self.store.value)
+            self.assertTrue(store.integer)
+            self.assertEqual(store.day_index is not None, day_index)
+
+    def test_queries_match_memory(self):
+        store = self.open(day_index=True)
+
+        for dt_from, dt_upto, group_type in (
+            (datetime(2021, 12, 1), datetime(2022, 6, 1), "month"),
+            (datetime(2022, 1, 10, 13, 7), datetime(2022, 2, 3, 5), "day"),
+            (datetime(2022, 3, 1), datetime(2022, 3, 2), "15-minute"),
+        ):
+            self.assertEqual(
+                store.aggregate_buckets(dt_from, dt_upto, group_type),
+                self.store.aggregate_buckets(dt_from, dt_upto, group_type),
+            )
+
+    def test_mapping_is_closed_after_changes(self):
+        for change in ("apply", "replace"):
+            store = self.open(day_index=True)
+            self.assertTrue(store.mapped)
+
+            if change == "apply":
+                store.apply(inserted=[(datetime(2022, 2, 1), 1)])
+                expected = ColumnarStore(
+                    self.store.dt.copy(), self.store.value.copy(), self.store.integer
+                )
+                expected.apply(inserted=[(datetime(2022, 2, 1), 1)])
+            else:
+                store.replace(self.store)
+                expected = self.store
+
+            self.assertFalse(store.mapped)
+            self.assertEqual(
+                store.aggregate_buckets(
+                    datetime(2022, 1, 1), datetime(2022, 4, 1), "month"
+                ),
+                expected.aggregate_buckets(
+                    datetime(2022, 1, 1), datetime(2022, 4, 1), "month"
+                ),
+            )
+
+    def test_snapshot_age(self):
+        save_snapshot(self.path, self.store)
+        os.utime(
+            self.path, (os.path.getatime(self.path), os.path.getmtime(self.path) - 60)
+        )
+
+        self.assertGreaterEqual(get_snapshot_age(self.path), 60)
+
+    def test_invalid_file(self):
+        with open(self.path, "wb") as fp:
+            fp.write(b"not a snapshot" * 10)
+
+        with self.assertRaises(SnapshotError):
+            open_snapshot(self.path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.main import iter_records_within_time_range
+from app.dateutils import datetime_to_iso
+
+from .shared import process_input
+
+
+class StreamTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        client = AsyncIOMotorClient("mongodb://localhost:27017/")
+        self.database = client.testdb
+        self.collection = self.database.salary
+
+    async def test_matches_records(self):
+        input_data = {
+            "dt_from": "2022-10-01T00:00:00",
+            "dt_upto": "2022-11-30T23:59:00",
+            "group_type": "day",
+        }
+        expected_result = await process_input(self.collection, input_data)
+
+        rows = [
+            row
+            async for row in iter_records_within_time_range(
+                self.collection,
+                input_data["dt_from"],
+                input_data["dt_upto"],
+                input_data["group_type"],
+                batch_size=7,
+            )
+        ]
+
+        self.assertEqual(
+            {
+                "dataset": [total_value for _, total_value, _ in rows],
+                "labels": [
+                    datetime_to_iso(label, drop_timezone=True) for label, _, _ in rows
+                ],
+            },
+            expected_result,
+        )
+
+    async def test_empty_range(self):
+        rows = [
+            row
+            async for row in iter_records_within_time_range(
+                self.collection, "1990-01-01T00:00:00", "1990-01-01T02:00:00", "hour"
+            )
+        ]
+
+        self.assertEqual([row[1:] for row in rows], [(0, 0), (0, 0), (0, 0)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+from bson import ObjectId, Timestamp
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.cache import BucketCache
+from app.columnar import ColumnarStore
+from app.snapshot import open_snapshot
+from app.sync import CollectionSync
+
+
+class ColumnarApplyTestCase(unittest.TestCase):
+    def test_insert_and_delete(self):
+        store = ColumnarStore.from_documents(
+            [datetime(2022, 1, 1, 1), datetime(2022, 1, 1, 2), datetime(2022, 1, 2)],
+            [10, 20, 30],
+        )
+
+        missing = store.apply(
+            inserted=[(datetime(2022, 1, 1, 3), 5), (datetime(2022, 1, 1), 1)],
+            deleted=[(datetime(2022, 1, 1, 2), 20), (datetime(2022, 1, 1, 2), 20)],
+        )
+
+        self.assertEqual(missing, 1)
+        self.assertEqual(
+            store.aggregate_buckets(datetime(2022, 1, 1), datetime(2022, 1, 3), "day"),
+            {datetime(2022, 1, 1): 16, datetime(2022, 1, 2): 30},
+        )
+        self.assertEqual(list(store.dt), sorted(store.dt))
+
+
+class CollectionSyncTestCase(unittest.TestCase):
+    def setUp(self):
+        client = AsyncIOMotorClient("mongodb://localhost:27017/")
+        self.collection = client.testdb.salary
+        self.cache = BucketCache()
+        self.store = ColumnarStore.from_documents([datetime(2022, 1, 1, 1)], [10])
+        self.sync = CollectionSync(self.collection, self.store, self.cache)
+
+    def read(self, *events):
+        inserted, deleted = [], []
+        reload = False
+        for event in events:
+            reload |= self.sync.read_event(event, inserted, deleted)
+        return inserted, deleted, reload
+
+    def test_events(self):
+        old = {"_id": ObjectId(), "dt": datetime(2022, 1, 1, 1), "value": 10}
+        new = {**old, "value": 15}
+
+        self.assertEqual(
+            self.read(
+                {"operationType": "insert", "fullDocument": {**old, "_id": ObjectId()}},
+                {
+                    "operationType": "update",
+                    "fullDocumentBeforeChange": old,
+                    "fullDocument": new,
+                },
+                {"operationType": "delete", "fullDocumentBeforeChange": new},
+            ),
+            (
+                [(datetime(2022, 1, 1, 1), 10), (datetime(2022, 1, 1, 1), 15)],
+                [(datetime(2022, 1, 1, 1), 10), (datetime(2022, 1, 1, 1), 15)],
+                False,
+            ),
+        )
+
+    def test_unknown_old_document_reloads(self):
+        _, _, reload = self.read({"operationType": "delete", "documentKey": {}})
+
+        self.assertTrue(reload)
+
+    def test_null_old_document_reloads(self):
+        _, _, reload = self.read(
+            {
+                "operationType": "update",
+                "fullDocumentBeforeChange": None,
+                "fullDocument": {
+                    "_id": ObjectId(),
+                    "dt": datetime(2022, 1, 1),
+                    "value": 1,
+                },
+            }
+        )
+
+        self.assertTrue(reload)
+
+    def test_apply_invalidates_cache(self):
+        key = (self.collection.full_name, "day", datetime(2022, 1, 1))
+        other = (self.collection.full_name, "day", datetime(2022, 2, 1))
+        self.cache.put(key, 10)
+        self.cache.put(other, 20)
+
+        self.sync.apply([(datetime(2022, 1, 1, 5), 7)], [])
+
+        self.assertIsNone(self.cache.get(key))
+        self.assertEqual(self.cache.get(other), 20)
+        self.assertEqual(len(self.store), 2)
+
+    def test_checkpoint_roundtrip(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "salary.columns")
+        sync = CollectionSync(self.collection, self.store, snapshot_path=path)
+        sync.resume_token = {"_data": "8263"}
+        sync.start_at_operation_time = Timestamp(1700000000, 1)
+        sync.apply([(datetime(2022, 1, 1, 5), 7)], [])
+        sync.checkpoint(force=True)
+
+        restored = CollectionSync(
+            self.collection, ColumnarStore.empty(), snapshot_path=path
+        )
+        snapshot = open_snapshot(path)
+        self.addCleanup(snapshot.close)
+
+        self.assertTrue(restored.has_state)
+        self.assertEqual(restored.resume_token, {"_data": "8263"})
+        self.assertEqual(restored.start_at_operation_time, Timestamp(1700000000, 1))
+        self.assertEqual(len(snapshot), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Message
+from aiohttp.test_utils import TestClient, TestServer
+
+from app.webhook import HEALTH_PATH, METRICS_PATH, create_webhook_app
+
+
+class WebhookTestCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.messages: list[str] = []
+        dp = Dispatcher()
+
+        @dp.message()
+        async def record_message(message: Message):
+            self.messages.append(str(message.text))
+
+        app = create_webhook_app(
+            dp,
+            Bot(token="42:TEST"),
+            secret_token="secret",
+            handle_in_background=False,
+        )
+        self.client = TestClient(TestServer(app))
+        await self.client.start_server()
+
+    async def asyncTearDown(self):
+        await self.client.close()
+
+    async def test_health(self):
+        response = await self.client.get(HEALTH_PATH)
+
+        self.assertEqual(response.status, 200)
+        self.assertEqual(await response.json(), {"status": "ok"})
+
+    async def test_metrics(self):
+        response = await self.client.get(METRICS_PATH)
+
+        self.assertEqual(response.status, 200)
+        self.assertIn(
+            "# TYPE aggregation_stage_seconds histogram", await response.text()
+        )
+
+    async def test_update_is_dispatched(self):
+        update = {
+            "update_id": 1,
+            "message": {
+                "message_id": 1,
+                "date": 1700000000,
+                "chat": {"id": 1, "type": "private"},
+                "from": {"id": 1, "is_bot": False, "first_name": "Test"},
+                "text": '{"dt_from": "2022-09-01T00:00:00"}',
+            },
+        }
+
+        response = await self.client.post(
+            "/webhook",
+            json=update,
+            headers={"X-Telegram-Bot-Api-Secret-Token": "secret"},
+        )
+
+        self.assertEqual(response.status, 200)
+        self.assertEqual(self.messages, ['{"dt_from": "2022-09-01T00:00:00"}'])
+
+    async def test_secret_token_is_checked(self):
+        response = await self.client.post("/webhook", json={"update_id": 1})
+
+        self.assertEqual(response.status, 401)
+        self.assertEqual(self.messages, [])
+
+
+if __name__ == "__main__":
+    unittest.main()